@@ -0,0 +1,37 @@
+"""
+Настройка pytest. Пакет moviepy в корне репозитория - заглушка для запуска без MoviePy;
+если MoviePy установлен, тесты используют его, а заглушка остается запасным вариантом.
+"""
+import os
+import sys
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _import_installed_moviepy() -> None:
+    saved_path = sys.path[:]
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != _ROOT]
+    try:
+        import moviepy  # noqa: F401
+    except ImportError:
+        pass
+    finally:
+        sys.path[:] = saved_path
+
+
+_import_installed_moviepy()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _log_to_temp_dir(tmp_path_factory):
+    """Записи лога, сделанные тестами, пишутся во временную папку, а не в logs/ репозитория"""
+    import logger_setup
+
+    log_dir = logger_setup.LOG_DIR
+    logger_setup.LOG_DIR = tmp_path_factory.mktemp("logs")
+    logger_setup.setup_logger()
+    yield
+    logger_setup.LOG_DIR = log_dir
+    logger_setup.setup_logger()
@@ -4,13 +4,167 @@ google_sheets_manager.py - Модуль для работы с Google Sheets в
 Обеспечивает интеграцию с Google Sheets для загрузки данных проектов
 """
 
+import asyncio
+import json
 import os
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from types import MappingProxyType
+from typing import Optional, Dict, List, Any, Tuple, Mapping
 import gspread
 from google.oauth2.service_account import Credentials
 from logger_setup import logger
 
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+# Дисковый кэш данных таблицы для разработки: VIDEOCREATOR_SHEETS_CACHE=<TTL в секундах>.
+# Не задано или 0 - кэш выключен
+SHEETS_CACHE_ENV = "VIDEOCREATOR_SHEETS_CACHE"
+SHEETS_CACHE_FILE = Path.home() / ".cache" / "videocreator" / "themes.json"
+# Чтение-изменение-запись общего файла кэша из нескольких потоков (например, холодный load_many)
+_sheets_cache_lock = threading.Lock()
+
+# Размер блока строк при подсчете тем в test_google_sheets_connection
+_THEMES_SCAN_CHUNK_ROWS = 100
+
+
+@lru_cache(maxsize=4)
+def _authorize(service_account_file: str) -> gspread.Client:
+    """
+    Авторизованный клиент gspread для файла сервисного аккаунта. Ключ читается и парсится
+    один раз, а клиент (и его HTTP-сессия) переиспользуется всеми GoogleSheetsManager
+    """
+    creds = Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+    return gspread.authorize(creds)
+
+
+@lru_cache(maxsize=32)
+def _list_dir(folder: str, mtime_ns: int) -> Mapping[str, str]:
+    """
+    Файлы папки: имя в NFC -> имя на диске. mtime_ns папки входит в ключ кэша и инвалидирует его.
+    macOS может хранить имена в NFD ("й" в "Водолей" - две кодовые точки), а темы приходят в NFC
+    """
+    with os.scandir(folder) as entries:
+        return MappingProxyType({unicodedata.normalize('NFC', entry.name): entry.name
+                                 for entry in entries if entry.is_file()})
+
+
+def _get_dir_filenames(folder: Path) -> Mapping[str, str]:
+    """Получить (кэшированный) список файлов папки одним os.scandir"""
+    try:
+        mtime_ns = os.stat(folder).st_mtime_ns
+    except OSError:
+        return MappingProxyType({})
+    return _list_dir(str(folder), mtime_ns)
+
+
+def _find_in_folder(folder: Path, candidates: Tuple[str, ...]) -> Optional[Path]:
+    """
+    Первый существующий файл из вариантов имени (в порядке приоритета)
+    """
+    # Ищем файл по списку файлов папки вместо stat на каждый вариант
+    existing_files = _get_dir_filenames(folder)
+    for filename in candidates:
+        disk_name = existing_files.get(unicodedata.normalize('NFC', filename))
+        if disk_name is not None:
+            return folder / disk_name
+    # Точного совпадения нет: на ФС без учета регистра (по умолчанию macOS и Windows)
+    # файл все равно может существовать - проверяем варианты через stat, как раньше
+    for filename in candidates:
+        path = folder / filename
+        if path.is_file():
+            return path
+    return None
+
+
+def _get_sheets_cache_ttl() -> float:
+    """TTL дискового кэша в секундах (0 - кэш выключен)"""
+    try:
+        return max(0.0, float(os.environ.get(SHEETS_CACHE_ENV, "0")))
+    except ValueError:
+        return 0.0
+
+
+def _read_sheets_cache_file() -> Dict[str, Any]:
+    try:
+        with open(SHEETS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_sheets_cache(key: str) -> Optional[Any]:
+    """Вернуть данные из дискового кэша, если кэш включен и запись не старше TTL"""
+    ttl = _get_sheets_cache_ttl()
+    if ttl <= 0:
+        return None
+    entry = _read_sheets_cache_file().get(key)
+    if not isinstance(entry, dict) or time.time() - entry.get('ts', 0) > ttl:
+        return None
+    logger.debug(f"Данные '{key}' взяты из дискового кэша {SHEETS_CACHE_FILE}")
+    return entry.get('data')
+
+
+def _write_sheets_cache(key: str, data: Any) -> None:
+    """Сохранить данные в дисковый кэш (если он включен)"""
+    if _get_sheets_cache_ttl() <= 0:
+        return
+    with _sheets_cache_lock:
+        cache = _read_sheets_cache_file()
+        cache[key] = {'ts': time.time(), 'data': data}
+        temp_file = None
+        try:
+            SHEETS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            # Через временный файл с уникальным именем и os.replace: параллельное чтение
+            # не увидит наполовину записанный JSON, а другой процесс не пишет в тот же временный файл
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=SHEETS_CACHE_FILE.parent,
+                                             prefix=f"{SHEETS_CACHE_FILE.stem}.", suffix=".tmp", delete=False) as f:
+                temp_file = f.name
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(temp_file, SHEETS_CACHE_FILE)
+            temp_file = None
+        except OSError as e:
+            logger.warning(f"Не удалось записать дисковый кэш Google Sheets {SHEETS_CACHE_FILE}: {e}")
+        finally:
+            if temp_file is not None:
+                try: os.remove(temp_file)
+                except OSError: pass
+
+
+# Пробелы и дефисы в названии темы заменяются на '_' в безопасном имени файла
+_SAFE_FILENAME_TABLE = str.maketrans({' ': '_', '-': '_'})
+
+
+@lru_cache(maxsize=256)
+def _audio_candidates(theme: str) -> Tuple[str, ...]:
+    """Варианты имени аудиофайла для темы (в порядке приоритета)"""
+    # Создаем безопасное имя файла (заменяем пробелы и спецсимволы)
+    safe_filename = theme.translate(_SAFE_FILENAME_TABLE)
+    # dict.fromkeys убирает совпадающие варианты, сохраняя порядок приоритета
+    return tuple(dict.fromkeys((
+        f"{theme}.mp3",
+        f"{safe_filename}.mp3",
+        f"{theme.lower()}.mp3",
+        f"{safe_filename.lower()}.mp3"
+    )))
+
+
+@lru_cache(maxsize=256)
+def _template_candidates(theme: str) -> Tuple[str, ...]:
+    """Варианты имени файла шаблона для темы (в порядке приоритета)"""
+    safe_filename = theme.translate(_SAFE_FILENAME_TABLE).lower()
+    return tuple(dict.fromkeys((
+        f"{safe_filename}.json",
+        f"{theme.lower()}.json",
+        f"{theme}.json"
+    )))
+
 
 class GoogleSheetsManager:
     """Менеджер для работы с Google Sheets"""
@@ -29,6 +183,8 @@ class GoogleSheetsManager:
         self.sheet_name = sheet_name
         self.client = None
         self.sheet = None
+        # Индекс тем: название -> (номер строки, текст). Заполняется лениво одним batchGet
+        self._themes_cache: Optional[Dict[str, Tuple[int, str]]] = None
         
     def connect(self) -> bool:
         """
@@ -37,15 +193,17 @@ class GoogleSheetsManager:
         Returns:
             True если подключение успешно, False в противном случае
         """
+        if self.sheet is not None:
+            # Уже подключены - повторный handshake не нужен
+            return True
+            
         try:
             if not os.path.exists(self.service_account_file):
                 logger.error(f"Файл сервисного аккаунта не найден: {self.service_account_file}")
                 return False
                 
             logger.info("Подключение к Google Sheets...")
-            SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-            creds = Credentials.from_service_account_file(self.service_account_file, scopes=SCOPES)
-            self.client = gspread.authorize(creds)
+            self.client = _authorize(self.service_account_file)
             self.sheet = self.client.open_by_key(self.spreadsheet_id).worksheet(self.sheet_name)
             logger.info("Успешно подключено к Google Sheets")
             return True
@@ -54,6 +212,64 @@ class GoogleSheetsManager:
             logger.error(f"Ошибка подключения к Google Sheets: {e}", exc_info=True)
             return False
     
+    def close(self) -> None:
+        """
+        Сбросить подключение (следующий connect() подключится заново)
+        """
+        self.client = None
+        self.sheet = None
+        self.reset_themes_index()
+    
+    def reset_themes_index(self) -> None:
+        """
+        Сбросить индекс тем в памяти: следующий запрос перечитает таблицу (или дисковый кэш)
+        """
+        self._themes_cache = None
+    
+    def _cache_key(self, kind: str) -> str:
+        return f"{self.spreadsheet_id}:{self.sheet_name}:{kind}"
+    
+    def _get_themes_index(self) -> Dict[str, Tuple[int, str]]:
+        """
+        Получить индекс тем, загрузив колонки A и B одним запросом values.batchGet
+        
+        Returns:
+            Словарь {тема: (номер строки, текст)}
+        """
+        if self._themes_cache is not None:
+            return self._themes_cache
+        
+        cached_index = _read_sheets_cache(self._cache_key('index'))
+        if isinstance(cached_index, dict):
+            self._themes_cache = {theme: (row, text) for theme, (row, text) in cached_index.items()}
+            return self._themes_cache
+        
+        # Колонка B читается с заголовка: по ней видно, есть ли в таблице вторая колонка вообще
+        ranges = [f"'{self.sheet_name}'!A2:A", f"'{self.sheet_name}'!B1:B"]
+        response = self.sheet.spreadsheet.values_batch_get(ranges, params={'majorDimension': 'COLUMNS'})
+        columns = []
+        for value_range in response.get('valueRanges', []):
+            values = value_range.get('values') or [[]]
+            columns.append(values[0])
+        themes_column = columns[0] if columns else []
+        texts_column = columns[1][1:] if len(columns) > 1 else []
+        
+        index: Dict[str, Tuple[int, str]] = {}
+        # Как и при поиске по get_all_values(): в таблице без второй колонки (все строки короче двух ячеек)
+        # темы не находятся; иначе недостающий текст строки - пустая строка
+        if len(columns) > 1 and columns[1]:
+            for offset, value in enumerate(themes_column):
+                theme_name = str(value).strip()
+                if not theme_name or theme_name in index:
+                    continue
+                text = str(texts_column[offset]).strip() if offset < len(texts_column) else ""
+                index[theme_name] = (offset + 2, text)  # Данные начинаются со второй строки
+        
+        self._themes_cache = index
+        _write_sheets_cache(self._cache_key('index'), index)
+        logger.debug(f"Индекс тем загружен: {len(index)} записей")
+        return index
+    
     def get_all_themes(self) -> List[str]:
         """
         Получить список всех доступных тем (знаков зодиака и др.)
@@ -65,18 +281,33 @@ class GoogleSheetsManager:
             logger.error("Нет подключения к Google Sheets")
             return []
             
+        # Список тем перечитывается - индекс тем тоже перечитаем при следующем запросе
+        self.reset_themes_index()
+            
+        cached_themes = _read_sheets_cache(self._cache_key('themes'))
+        if isinstance(cached_themes, list):
+            logger.info(f"Найдено тем (из кэша): {len(cached_themes)}")
+            return cached_themes
+            
         try:
-            # Получаем все значения из первой колонки (A)
-            all_values = self.sheet.col_values(1)
+            # Получаем значения колонки A без заголовка; неформатированные значения
+            # избавляют сервер от форматирования каждой ячейки
+            response = self.sheet.spreadsheet.values_get(
+                f"'{self.sheet_name}'!A2:A",
+                params={'valueRenderOption': 'UNFORMATTED_VALUE', 'majorDimension': 'COLUMNS'}
+            )
+            all_values = (response.get('values') or [[]])[0]
             
-            # Фильтруем пустые значения и заголовок
+            # Фильтруем пустые значения
             themes = []
-            for idx, value in enumerate(all_values[1:], start=1):  # Пропускаем заголовок
+            for value in all_values:
+                value = str(value)
                 if value.strip():
                     themes.append(value.strip())
                 else:
                     break  # Прекращаем при первой пустой ячейке
                     
+            _write_sheets_cache(self._cache_key('themes'), themes)
             logger.info(f"Найдено тем: {len(themes)}")
             return themes
             
@@ -101,35 +332,33 @@ class GoogleSheetsManager:
         try:
             logger.info(f"Поиск данных для темы: {theme}")
             
-            # Получаем все данные таблицы
-            all_data = self.sheet.get_all_values()
+            entry = self._get_themes_index().get(theme)
+            if entry is None:
+                logger.warning(f"Данные для темы '{theme}' не найдены")
+                return None
             
-            # Ищем строку с нужной темой
-            for row_idx, row in enumerate(all_data[1:], start=2):  # Пропускаем заголовок
-                if len(row) >= 2 and row[0].strip() == theme:
-                    data = {
-                        'theme': row[0].strip(),
-                        'title': row[0].strip(),  # Используем название темы как заголовок
-                        'text': row[1].strip() if len(row) > 1 else "",
-                        'row_number': row_idx
-                    }
-                    logger.info(f"Найдены данные для темы '{theme}': {len(data['text'])} символов текста")
-                    return data
-            
-            logger.warning(f"Данные для темы '{theme}' не найдены")
-            return None
+            row_number, text = entry
+            data = {
+                'theme': theme,
+                'title': theme,  # Используем название темы как заголовок
+                'text': text,
+                'row_number': row_number
+            }
+            logger.info(f"Найдены данные для темы '{theme}': {len(data['text'])} символов текста")
+            return data
             
         except Exception as e:
             logger.error(f"Ошибка получения данных темы '{theme}': {e}", exc_info=True)
             return None
     
-    def update_theme_text(self, theme: str, new_text: str) -> bool:
+    def update_theme_text(self, theme: str, new_text: str, row_number: Optional[int] = None) -> bool:
         """
         Обновить текст для темы в Google Sheets
         
         Args:
             theme: Название темы
             new_text: Новый текст
+            row_number: Номер строки темы, если уже известен (иначе берется из индекса тем)
             
         Returns:
             True если обновление успешно, False в противном случае
@@ -139,14 +368,26 @@ class GoogleSheetsManager:
             return False
             
         try:
-            # Сначала получаем данные темы чтобы узнать номер строки
-            theme_data = self.get_theme_data(theme)
-            if not theme_data:
-                logger.error(f"Не найдена тема '{theme}' для обновления")
-                return False
+            if row_number is None:
+                # Номер строки берем из индекса тем (без повторной загрузки листа)
+                entry = self._get_themes_index().get(theme)
+                if entry is None:
+                    logger.error(f"Не найдена тема '{theme}' для обновления")
+                    return False
+                row_number = entry[0]
+            elif self._themes_cache is not None:
+                # Переданный номер строки сверяем с загруженным индексом: чужая строка испортила бы
+                # и таблицу, и индекс (вместе с дисковым кэшем)
+                entry = self._themes_cache.get(theme)
+                if entry is None or entry[0] != row_number:
+                    logger.error(f"Строка {row_number} не соответствует теме '{theme}' "
+                                 f"(по индексу: {entry[0] if entry else 'тема не найдена'})")
+                    return False
             
-            row_number = theme_data['row_number']
             self.sheet.update_cell(row_number, 2, new_text)  # Колонка B (текст)
+            if self._themes_cache is not None:
+                self._themes_cache[theme] = (row_number, new_text.strip())
+                _write_sheets_cache(self._cache_key('index'), self._themes_cache)
             
             logger.info(f"Текст для темы '{theme}' успешно обновлен")
             return True
@@ -154,6 +395,50 @@ class GoogleSheetsManager:
         except Exception as e:
             logger.error(f"Ошибка обновления текста для темы '{theme}': {e}", exc_info=True)
             return False
+    
+    def update_theme_texts(self, texts_by_theme: Dict[str, str]) -> bool:
+        """
+        Обновить тексты сразу для нескольких тем одним запросом batchUpdate
+        
+        Args:
+            texts_by_theme: Словарь {тема: новый текст}
+            
+        Returns:
+            True если все найденные темы обновлены, False в противном случае
+        """
+        if not self.sheet:
+            logger.error("Нет подключения к Google Sheets")
+            return False
+        
+        if not texts_by_theme:
+            return True
+            
+        try:
+            themes_index = self._get_themes_index()
+            updates = []
+            for theme, new_text in texts_by_theme.items():
+                entry = themes_index.get(theme)
+                if entry is None:
+                    logger.error(f"Не найдена тема '{theme}' для обновления")
+                    continue
+                updates.append((theme, entry[0], new_text))
+            
+            if not updates:
+                return False
+            
+            data = [{'range': f"B{row_number}", 'values': [[new_text]]} for _, row_number, new_text in updates]
+            self.sheet.batch_update(data, value_input_option='RAW')
+            
+            for theme, row_number, new_text in updates:
+                themes_index[theme] = (row_number, new_text.strip())
+            _write_sheets_cache(self._cache_key('index'), themes_index)
+            
+            logger.info(f"Тексты обновлены одним запросом для тем: {len(updates)} из {len(texts_by_theme)}")
+            return len(updates) == len(texts_by_theme)
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетного обновления текстов тем: {e}", exc_info=True)
+            return False
 
 
 class ProjectDataManager:
@@ -184,23 +469,10 @@ class ProjectDataManager:
         Returns:
             Путь к аудиофайлу или None
         """
-        # Создаем безопасное имя файла (заменяем пробелы и спецсимволы)
-        safe_filename = theme.replace(' ', '_').replace('-', '_')
-        
-        # Варианты имен файлов для поиска
-        possible_names = [
-            f"{theme}.mp3",
-            f"{safe_filename}.mp3",
-            f"{theme.lower()}.mp3",
-            f"{safe_filename.lower()}.mp3"
-        ]
-        
-        # Ищем файл
-        for filename in possible_names:
-            audio_path = self.audio_folder / filename
-            if audio_path.exists():
-                logger.info(f"Найден аудиофайл для темы '{theme}': {audio_path}")
-                return str(audio_path)
+        audio_path = _find_in_folder(self.audio_folder, _audio_candidates(theme))
+        if audio_path is not None:
+            logger.info(f"Найден аудиофайл для темы '{theme}': {audio_path}")
+            return str(audio_path)
         
         logger.warning(f"Аудиофайл для темы '{theme}' не найден в папке {self.audio_folder}")
         return None
@@ -215,36 +487,53 @@ class ProjectDataManager:
         Returns:
             Путь к файлу шаблона или None
         """
-        # Создаем безопасное имя файла
-        safe_filename = theme.replace(' ', '_').replace('-', '_').lower()
-        
-        # Варианты имен файлов для поиска
-        possible_names = [
-            f"{safe_filename}.json",
-            f"{theme.lower()}.json",
-            f"{theme}.json"
-        ]
-        
-        # Ищем файл
-        for filename in possible_names:
-            template_path = self.templates_folder / filename
-            if template_path.exists():
-                logger.info(f"Найден шаблон для темы '{theme}': {template_path}")
-                return str(template_path)
+        template_path = _find_in_folder(self.templates_folder, _template_candidates(theme))
+        if template_path is not None:
+            logger.info(f"Найден шаблон для темы '{theme}': {template_path}")
+            return str(template_path)
         
         logger.warning(f"Шаблон для темы '{theme}' не найден в папке {self.templates_folder}")
         return None
     
-    def load_project_data(self, theme: str) -> Dict[str, Any]:
+    async def find_audio_file_async(self, theme: str) -> Optional[str]:
+        """
+        Асинхронный вариант find_audio_file: работа с файловой системой выполняется
+        в отдельном потоке и не блокирует цикл событий
         """
-        Загрузить все данные проекта для темы
+        return await asyncio.to_thread(self.find_audio_file, theme)
+    
+    async def find_template_file_async(self, theme: str) -> Optional[str]:
+        """
+        Асинхронный вариант find_template_file: работа с файловой системой выполняется
+        в отдельном потоке и не блокирует цикл событий
+        """
+        return await asyncio.to_thread(self.find_template_file, theme)
+    
+    def _load_text_data(self, theme: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Получить текстовые данные темы из Google Sheets
+        
+        Returns:
+            Кортеж (данные темы или None, текст ошибки или None)
+        """
+        if not self.sheets_manager.connect():
+            return None, "Не удалось подключиться к Google Sheets"
+        text_data = self.sheets_manager.get_theme_data(theme)
+        if not text_data:
+            return None, f"Текстовые данные для темы '{theme}' не найдены в Google Sheets"
+        return text_data, None
+    
+    def _collect_project_data(
+        self, theme: str, text_result: Tuple[Optional[Dict[str, Any]], Optional[str]],
+        audio_path: Optional[str], template_path: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Собрать словарь данных проекта из результатов загрузки текста и поиска файлов
         
-        Args:
-            theme: Название темы
-            
         Returns:
             Словарь с данными проекта
         """
+        text_data, text_error = text_result
         result = {
             'success': False,
             'theme': theme,
@@ -254,25 +543,19 @@ class ProjectDataManager:
             'errors': []
         }
         
-        # Получаем текстовые данные из Google Sheets
-        if self.sheets_manager.connect():
-            text_data = self.sheets_manager.get_theme_data(theme)
-            if text_data:
-                result['text_data'] = text_data
-            else:
-                result['errors'].append(f"Текстовые данные для темы '{theme}' не найдены в Google Sheets")
+        # Текстовые данные из Google Sheets
+        if text_data:
+            result['text_data'] = text_data
         else:
-            result['errors'].append("Не удалось подключиться к Google Sheets")
+            result['errors'].append(text_error)
         
-        # Ищем аудиофайл
-        audio_path = self.find_audio_file(theme)
+        # Аудиофайл
         if audio_path:
             result['audio_path'] = audio_path
         else:
             result['errors'].append(f"Аудиофайл для темы '{theme}' не найден")
         
-        # Ищем шаблон
-        template_path = self.find_template_file(theme)
+        # Шаблон
         if template_path:
             result['template_path'] = template_path
         else:
@@ -288,12 +571,110 @@ class ProjectDataManager:
             logger.error(f"Не удалось загрузить все необходимые данные для темы '{theme}'")
         
         return result
+    
+    async def load_project_data_async(self, theme: str) -> Dict[str, Any]:
+        """
+        Загрузить все данные проекта для темы, выполняя запрос к Google Sheets
+        и поиск аудиофайла/шаблона параллельно (для вызова из цикла событий)
+        
+        Args:
+            theme: Название темы
+            
+        Returns:
+            Словарь с данными проекта
+        """
+        # Текст темы мог измениться в таблице с прошлой загрузки
+        self.sheets_manager.reset_themes_index()
+        # gspread и файловая система синхронные - выполняем их в потоках одновременно
+        text_result, audio_path, template_path = await asyncio.gather(
+            asyncio.to_thread(self._load_text_data, theme),
+            self.find_audio_file_async(theme),
+            self.find_template_file_async(theme)
+        )
+        return self._collect_project_data(theme, text_result, audio_path, template_path)
+    
+    def _submit_project_loads(self, executor: ThreadPoolExecutor, theme: str) -> Tuple[Any, Any, Any]:
+        """Поставить в пул запрос текста темы и поиск аудиофайла и шаблона"""
+        return (executor.submit(self._load_text_data, theme),
+                executor.submit(self.find_audio_file, theme),
+                executor.submit(self.find_template_file, theme))
+    
+    def load_project_data(self, theme: str) -> Dict[str, Any]:
+        """
+        Загрузить все данные проекта для темы. Запрос к Google Sheets и поиск
+        аудиофайла/шаблона выполняются одновременно в небольшом пуле потоков
+        
+        Args:
+            theme: Название темы
+            
+        Returns:
+            Словарь с данными проекта
+        """
+        # Текст темы мог измениться в таблице с прошлой загрузки
+        self.sheets_manager.reset_themes_index()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = self._submit_project_loads(executor, theme)
+            return self._collect_project_data(theme, *(future.result() for future in futures))
+    
+    def load_many(self, themes: List[str], max_workers: int = 8) -> Dict[str, Dict[str, Any]]:
+        """
+        Загрузить данные проектов для нескольких тем параллельно
+        
+        Args:
+            themes: Список тем
+            max_workers: Максимальное количество потоков
+            
+        Returns:
+            Словарь {тема: данные проекта}
+        """
+        if not themes:
+            return {}
+        
+        # Подключаемся и загружаем свежий индекс тем один раз до запуска потоков,
+        # чтобы потоки не выполняли одинаковые запросы одновременно
+        self.sheets_manager.reset_themes_index()
+        index_error = None
+        if not self.sheets_manager.connect():
+            index_error = "Не удалось подключиться к Google Sheets"
+        else:
+            try:
+                self.sheets_manager._get_themes_index()
+            except Exception as e:
+                logger.error(f"Ошибка загрузки индекса тем: {e}", exc_info=True)
+                index_error = f"Не удалось загрузить данные тем из Google Sheets: {e}"
+        
+        # Все запросы всех тем идут в один общий пул (без вложенных пулов на каждую тему)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if index_error is None:
+                futures = {theme: self._submit_project_loads(executor, theme) for theme in themes}
+                return {theme: self._collect_project_data(theme, *(future.result() for future in theme_futures))
+                        for theme, theme_futures in futures.items()}
+            
+            # Без индекса тем текст не загрузить: запрос не повторяется в каждом потоке, ищутся только файлы
+            futures = {theme: (executor.submit(self.find_audio_file, theme), executor.submit(self.find_template_file, theme))
+                       for theme in themes}
+            return {theme: self._collect_project_data(theme, (None, index_error), *(future.result() for future in theme_futures))
+                    for theme, theme_futures in futures.items()}
+
+
+# Подключенные менеджеры, переиспользуемые между вызовами вспомогательных функций
+_sheets_managers: Dict[Tuple[str, str, str], GoogleSheetsManager] = {}
+
+
+def _get_sheets_manager(service_account_file: str, spreadsheet_id: str, sheet_name: str) -> GoogleSheetsManager:
+    """Вернуть общий GoogleSheetsManager для таблицы/листа (создается один раз)"""
+    key = (service_account_file, spreadsheet_id, sheet_name)
+    manager = _sheets_managers.get(key)
+    if manager is None:
+        manager = GoogleSheetsManager(service_account_file, spreadsheet_id, sheet_name)
+        _sheets_managers[key] = manager
+    return manager
 
 
 # Вспомогательные функции для быстрого доступа
 def get_available_themes(service_account_file: str, spreadsheet_id: str, sheet_name: str = "Лист1") -> List[str]:
     """Получить список доступных тем из Google Sheets"""
-    manager = GoogleSheetsManager(service_account_file, spreadsheet_id, sheet_name)
+    manager = _get_sheets_manager(service_account_file, spreadsheet_id, sheet_name)
     if manager.connect():
         return manager.get_all_themes()
     return []
@@ -303,7 +684,7 @@ def load_theme_project(theme: str, service_account_file: str, spreadsheet_id: st
                       sheet_name: str = "Лист1", audio_folder: str = "output", 
                       templates_folder: str = "saved_templates") -> Dict[str, Any]:
     """Загрузить полные данные проекта для темы"""
-    sheets_manager = GoogleSheetsManager(service_account_file, spreadsheet_id, sheet_name)
+    sheets_manager = _get_sheets_manager(service_account_file, spreadsheet_id, sheet_name)
     project_manager = ProjectDataManager(sheets_manager, audio_folder, templates_folder)
     return project_manager.load_project_data(theme)
 
@@ -317,22 +698,32 @@ def test_google_sheets_connection(service_account_file: str, spreadsheet_id: str
         "error": None
     }
     try:
-        import gspread
-        from google.oauth2.service_account import Credentials
-        SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-        creds = Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
-        client = gspread.authorize(creds)
+        client = _authorize(service_account_file)
         spreadsheet = client.open_by_key(spreadsheet_id)
         sheet = spreadsheet.worksheet("Лист1")
         result["spreadsheet_title"] = spreadsheet.title
         result["sheet_title"] = sheet.title
-        themes_column = sheet.col_values(1)
+        # Колонка A читается блоками до первой пустой ячейки, а не целиком через col_values
         themes_count = 0
-        for value in themes_column[1:]:
-            if value.strip():
-                themes_count += 1
-            else:
+        start_row = 2  # Первая строка - заголовок
+        while True:
+            end_row = start_row + _THEMES_SCAN_CHUNK_ROWS - 1
+            response = spreadsheet.values_get(
+                f"'{sheet.title}'!A{start_row}:A{end_row}",
+                params={'valueRenderOption': 'UNFORMATTED_VALUE', 'majorDimension': 'COLUMNS'}
+            )
+            chunk = (response.get('values') or [[]])[0]
+            reached_empty = False
+            for value in chunk:
+                if str(value).strip():
+                    themes_count += 1
+                else:
+                    reached_empty = True
+                    break
+            # Sheets отбрасывает пустой хвост диапазона: неполный блок означает конец данных
+            if reached_empty or len(chunk) < _THEMES_SCAN_CHUNK_ROWS:
                 break
+            start_row = end_row + 1
         result["themes_count"] = themes_count
         result["connected"] = True
     except Exception as e:
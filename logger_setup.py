@@ -4,9 +4,18 @@ logger_setup.py - Модуль для настройки логирования
 ЭТАП 4: Логирование процесса
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from pathlib import Path
+from typing import Dict
+
+# Не собираем в записи лога сведения о потоке/процессе - они нигде не выводятся
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 
 LOG_DIR_NAME = "logs"
 LOG_FILE_NAME = "videocreator.log"
@@ -19,19 +28,43 @@ except NameError:
 
 LOG_DIR = BASE_DIR / LOG_DIR_NAME
 
+# Фоновые слушатели очередей логов (по имени логгера): запись на диск выполняется вне вызывающего потока
+_queue_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+class DeferredFileHandler(logging.FileHandler):
+    """
+    FileHandler с delay=True: директория логов создается и файл открывается при первой записи,
+    а не при импорте модуля. После открытия каждая запись сразу пишется в файл.
+    """
+
+    def __init__(self, log_file_path: Path, formatter: logging.Formatter):
+        super().__init__(log_file_path, mode='a', encoding='utf-8', delay=True) # 'a' для добавления
+        self.setFormatter(formatter)
+        self.file_handler_failed = False
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.file_handler_failed:
+            return
+        if self.stream is None:
+            try:
+                self.stream = self._open()
+            except Exception as e:
+                # Продолжаем без файлового логирования, выводя только в консоль
+                self.file_handler_failed = True
+                print(f"Критическая ошибка: Не удалось настроить файловый обработчик для логов {self.baseFilename}: {e}", file=sys.stderr)
+                return
+        super().emit(record)
+
+
 def setup_logger(name: str = "VideoCreatorLogger", log_level: int = logging.INFO) -> logging.Logger:
     """
     Настраивает и возвращает экземпляр логгера.
     """
-    # Создаем директорию для логов, если она не существует
-    try:
-        LOG_DIR.mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        print(f"Критическая ошибка: Не удалось создать директорию для логов {LOG_DIR}: {e}", file=sys.stderr)
-        # В случае невозможности создать директорию логов, можно либо падать,
-        # либо продолжать без файлового логирования, выводя только в консоль.
-        # Пока просто выведем ошибку и продолжим (логгер не будет писать в файл).
-
     logger = logging.getLogger(name)
     
     # Предотвращаем дублирование обработчиков, если функция вызывается несколько раз
@@ -40,11 +73,16 @@ def setup_logger(name: str = "VideoCreatorLogger", log_level: int = logging.INFO
 
     logger.setLevel(log_level)
 
-    # Форматтер для сообщений
+    # Форматтер для сообщений в консоль (с указанием места вызова)
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s:%(lineno)d - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
+    # Упрощенный форматтер для файла
+    file_formatter = logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
 
     # Обработчик для вывода в консоль (для отладки и информации)
     console_handler = logging.StreamHandler(sys.stdout) # Используем stdout для обычных логов
@@ -53,33 +91,50 @@ def setup_logger(name: str = "VideoCreatorLogger", log_level: int = logging.INFO
     # console_handler.setLevel(logging.DEBUG) 
     logger.addHandler(console_handler)
 
-    # Обработчик для записи в файл
+    # Обработчик для записи в файл: файл открывается при первой записи.
+    # Логгер только кладет записи в очередь, на диск их пишет QueueListener в фоновом потоке
     log_file_path = LOG_DIR / LOG_FILE_NAME
-    try:
-        file_handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8') # 'a' для добавления
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    except Exception as e:
-        logger.error(f"Не удалось настроить файловый обработчик для логов: {e}")
-
-
-    logger.info(f"Логгер '{name}' настроен. Уровень логирования: {logging.getLevelName(log_level)}.")
-    if file_handler in logger.handlers:
-         logger.info(f"Логи будут записываться в: {log_file_path.resolve()}")
-    else:
-        logger.warning(f"Файловое логирование не настроено из-за предыдущей ошибки.")
+    file_handler = DeferredFileHandler(log_file_path, file_formatter)
+    previous_listener = _queue_listeners.pop(name, None)
+    if previous_listener is not None:
+        previous_listener.stop()
+        for handler in previous_listener.handlers:
+            handler.close()
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    queue_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    queue_listener.start()
+    _queue_listeners[name] = queue_listener
+
+    # DEBUG, а не INFO: сама настройка при импорте не должна открывать файл лога
+    logger.debug(f"Логгер '{name}' настроен. Уровень логирования: {logging.getLevelName(log_level)}.")
+    logger.debug(f"Логи будут записываться в: {log_file_path}")
 
+    return logger
 
-    # Пример перехвата необработанных исключений (опционально, но полезно)
+def install_excepthook(target_logger: logging.Logger) -> None:
+    """
+    Перенаправляет необработанные исключения в лог. Вызывается явно точкой входа приложения,
+    а не при импорте модуля, чтобы не подменять sys.excepthook у IDE, Jupyter и тестов.
+    """
     def handle_exception(exc_type, exc_value, exc_traceback):
         if issubclass(exc_type, KeyboardInterrupt):
             sys.__excepthook__(exc_type, exc_value, exc_traceback)
             return
-        logger.critical("Необработанное исключение:", exc_info=(exc_type, exc_value, exc_traceback))
+        target_logger.critical("Необработанное исключение:", exc_info=(exc_type, exc_value, exc_traceback))
 
     sys.excepthook = handle_exception
-    
-    return logger
+
+def _stop_queue_listeners() -> None:
+    for queue_listener in _queue_listeners.values():
+        queue_listener.stop()
+        for handler in queue_listener.handlers:
+            handler.close()
+    _queue_listeners.clear()
+
+# Останавливаем слушатели раньше logging.shutdown (atexit вызывает функции в обратном порядке),
+# чтобы оставшиеся в очереди записи попали в файл
+atexit.register(_stop_queue_listeners)
 
 # Получаем основной логгер приложения при импорте модуля
 # Это позволит другим модулям просто делать `from logger_setup import logger`
@@ -101,4 +156,5 @@ if __name__ == '__main__':
     
     logger.info("Тестирование логгера завершено.")
     # Для теста необработанного исключения:
+    # install_excepthook(logger)
     # raise ValueError("Тестовое необработанное исключение для проверки sys.excepthook")
\ No newline at end of file
@@ -4,32 +4,196 @@ media_engine.py - Модуль обработки видео для VideoCreator
 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Фиксим проблему с AudioFileClip reader = None
 """
 
+from __future__ import annotations
+
 import os
+import hashlib
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Any 
-
-from moviepy import (
-    ImageClip, AudioFileClip, CompositeVideoClip,
-    CompositeAudioClip, concatenate_videoclips,
-    ColorClip
-)
+from typing import List, Tuple, Optional, Dict, Any, TYPE_CHECKING
 
 try:
-    from moviepy.video.fx.all import crop
-    CROP_FUNCTION_AVAILABLE = True
+    import numpy as np
+    NUMPY_AVAILABLE = True
 except ImportError:
-    CROP_FUNCTION_AVAILABLE = False
-    print("ПРЕДУПРЕЖДЕНИЕ: moviepy.video.fx.all.crop не найден. Пространственная обрезка в MoviePy может быть недоступна.")
+    NUMPY_AVAILABLE = False
+    print("ПРЕДУПРЕЖДЕНИЕ: Библиотека NumPy не найдена. Предобработка изображений средствами Pillow будет пропущена.")
 
-try:
-    from PIL import Image as PILImage
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
-    print("ПРЕДУПРЕЖДЕНИЕ: Библиотека Pillow (PIL) не найдена. Обрезка изображений может не работать корректно.")
+if TYPE_CHECKING:
+    from moviepy import ImageClip, AudioFileClip, CompositeVideoClip, CompositeAudioClip
 
 from logger_setup import logger
 
+VALID_IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'})
+VALID_AUDIO_EXTS = frozenset({'.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac'})
+
+LANCZOS_SUPPORT = 3.0
+
+WAVEFORM_SAMPLE_RATE = 4000 # Частота, с которой аудио декодируется для формы волны
+# Декодированные амплитуды для формы волны кэшируются на диске: перерисовка таймлайна не декодирует файл заново
+WAVEFORM_CACHE_DIR = Path.home() / ".cache" / "videocreator" / "waveforms"
+# Предел размера кэша формы волны: при записи сверх него удаляются давно не использованные файлы
+WAVEFORM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# moviepy, Pillow, OpenCV и imageio импортируются при первом использовании, а не при загрузке модуля:
+# validate_* и get_media_info для неподходящих файлов не должны платить за их импорт
+_optional_modules: Dict[str, Any] = {}
+
+def _optional_import(module_name: str, warning: Optional[str] = None) -> Any:
+    """Импортирует модуль при первом обращении и кэширует результат; None, если модуль недоступен."""
+    if module_name not in _optional_modules:
+        try:
+            _optional_modules[module_name] = importlib.import_module(module_name)
+        except ImportError:
+            _optional_modules[module_name] = None
+            if warning:
+                print(warning)
+    return _optional_modules[module_name]
+
+def _get_pil_image() -> Any:
+    return _optional_import("PIL.Image", "ПРЕДУПРЕЖДЕНИЕ: Библиотека Pillow (PIL) не найдена. Обрезка изображений может не работать корректно.")
+
+def _get_moviepy_crop() -> Any:
+    fx_all = _optional_import("moviepy.video.fx.all", "ПРЕДУПРЕЖДЕНИЕ: moviepy.video.fx.all.crop не найден. Пространственная обрезка в MoviePy может быть недоступна.")
+    return getattr(fx_all, "crop", None)
+
+def _get_cv2() -> Any:
+    return _optional_import("cv2")
+
+def _get_imageio() -> Any:
+    return _optional_import("imageio.v2")
+
+def _fit_to_height(original_w: int, original_h: int, resolution: Tuple[int, int]) -> Tuple[int, int, Tuple[float, float, float, float]]:
+    """Размер после масштабирования по высоте кадра и область исходника (box), обрезанная по ширине кадра."""
+    target_w, target_h = resolution
+    new_w = int(original_w * target_h / original_h)
+    src_box = (0, 0, original_w, original_h)
+    if new_w > target_w:
+        src_w = original_h * target_w / target_h
+        src_left = (original_w - src_w) / 2
+        src_box = (src_left, 0, src_left + src_w, original_h)
+        new_w = target_w
+    return new_w, target_h, src_box
+
+def _lanczos_axis_weights(src_size: int, box_start: float, box_end: float, dst_size: int) -> Tuple[Any, Any]:
+    """
+    Таблица отсчетов Lanczos-3 для одной оси: индексы исходных пикселей и нормированные веса
+    формы (dst_size, taps). Ядро sinc(x)*sinc(x/3) вычисляется один раз на ось, а не на каждый пиксель.
+    """
+    scale = (box_end - box_start) / dst_size
+    filter_scale = max(scale, 1.0)
+    support = LANCZOS_SUPPORT * filter_scale
+    centers = box_start + (np.arange(dst_size) + 0.5) * scale
+    taps = int(np.ceil(support)) * 2 + 1
+    indices = np.floor(centers - support).astype(np.int64)[:, None] + np.arange(taps)[None, :]
+    x = (indices + 0.5 - centers[:, None]) / filter_scale
+    weights = np.sinc(x) * np.sinc(x / LANCZOS_SUPPORT)
+    weights[(np.abs(x) >= LANCZOS_SUPPORT) | (indices < 0) | (indices >= src_size)] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(indices, 0, src_size - 1), weights.astype(np.float32)
+
+def _lanczos_resize(image: Any, size: Tuple[int, int], box: Tuple[float, float, float, float]) -> Any:
+    """
+    Сепарабельный Lanczos-3 на NumPy (аналог Pillow resize с box) для работы без Pillow.
+    Порядок проходов как в Pillow: сначала по горизонтали с округлением промежуточного
+    результата до 8 бит, затем по вертикали - иначе выбросы ядра на резких границах
+    обрезаются в другом месте и результат заметно расходится с Pillow.
+    """
+    dst_w, dst_h = size
+    left, top, right, bottom = box
+    source = image.astype(np.float32)
+
+    col_indices, col_weights = _lanczos_axis_weights(source.shape[1], left, right, dst_w)
+    columns = np.zeros((source.shape[0], dst_w) + source.shape[2:], dtype=np.float32)
+    for k in range(col_indices.shape[1]):
+        columns += col_weights[None, :, k, None] * source[:, col_indices[:, k]]
+    np.clip(np.rint(columns, out=columns), 0, 255, out=columns)
+
+    row_indices, row_weights = _lanczos_axis_weights(source.shape[0], top, bottom, dst_h)
+    result = np.zeros((dst_h, dst_w) + source.shape[2:], dtype=np.float32)
+    for k in range(row_indices.shape[1]):
+        result += row_weights[:, k, None, None] * columns[row_indices[:, k]]
+
+    return np.clip(np.rint(result), 0, 255).astype(np.uint8)
+
+def _preprocess_image_numpy(image_path_str: str, resolution: Tuple[int, int]) -> Any:
+    """Резервная предобработка без Pillow: чтение через imageio и масштабирование _lanczos_resize."""
+    image = np.asarray(_get_imageio().imread(image_path_str))
+    if image.ndim == 2:
+        image = np.stack([image] * 3, axis=-1)
+    image = image[..., :3]
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+
+    original_h, original_w = image.shape[:2]
+    new_w, new_h, src_box = _fit_to_height(original_w, original_h, resolution)
+    image_array = _lanczos_resize(image, (new_w, new_h), src_box)
+    logger.debug(f"Изображение '{Path(image_path_str).name}' приведено NumPy (Lanczos) к ({new_w}, {new_h})")
+    return image_array
+
+def _preprocess_image(image_path_str: str, resolution: Tuple[int, int]) -> Any:
+    """
+    Масштабирует и обрезает изображение средствами Pillow под целевое разрешение.
+    Не обращается к MoviePy, поэтому может выполняться в рабочем потоке.
+    Без Pillow использует резервный путь NumPy + imageio.
+    Возвращает массив NumPy или исходный путь, если предобработка недоступна.
+    """
+    PILImage = _get_pil_image()
+    if PILImage is None or not NUMPY_AVAILABLE:
+        if NUMPY_AVAILABLE and _get_imageio() is not None:
+            return _preprocess_image_numpy(image_path_str, resolution)
+        return image_path_str
+
+    img_name = Path(image_path_str).name
+    with PILImage.open(image_path_str) as img:
+        if img.format == "JPEG":
+            # libjpeg декодирует сразу в уменьшенном масштабе (1/2, 1/4, 1/8), не меньше запрошенного размера
+            img.draft("RGB", (resolution[0] * 2, resolution[1] * 2))
+        if img.mode != "RGB":
+            # convert всегда копирует буфер; RGB (большинство JPEG) используем как есть, P/L/RGBA/CMYK приводим
+            img = img.convert("RGB")
+        original_w, original_h = img.size
+
+        resample_filter = PILImage.Resampling.LANCZOS if hasattr(PILImage.Resampling, 'LANCZOS') else PILImage.LANCZOS
+
+        # Обрезка по ширине совмещена с масштабированием: box задаёт центральную область исходника,
+        # и ресемплинг не тратится на пиксели, которые потом отбросились бы
+        new_w, new_h, src_box = _fit_to_height(original_w, original_h, resolution)
+
+        cv2 = _get_cv2()
+        if cv2 is not None and original_h > new_h:
+            # Чистое уменьшение: INTER_AREA в OpenCV заметно быстрее LANCZOS и дает сопоставимое качество
+            src_left, src_top, src_right, src_bottom = (int(round(v)) for v in src_box)
+            source_array = np.asarray(img)[src_top:src_bottom, src_left:src_right]
+            image_array = cv2.resize(source_array, (new_w, new_h), interpolation=cv2.INTER_AREA)
+            logger.debug(f"Изображение '{img_name}' приведено OpenCV к ({new_w}, {new_h})")
+            return image_array
+
+        try:
+            # reducing_gap: быстрое предварительное уменьшение, затем точный ресемплинг (Pillow 7+)
+            processed_image_data = img.resize((new_w, new_h), resample_filter, box=src_box, reducing_gap=2.0)
+        except TypeError:
+            processed_image_data = img.resize((new_w, new_h), resample_filter, box=src_box)
+        logger.debug(f"Изображение '{img_name}' приведено Pillow к ({new_w}, {new_h})")
+
+        image_array = np.asarray(processed_image_data)
+        processed_image_data.close()
+        return image_array
+
+
+def _black_background(size: Tuple[int, int], duration: float, video_fps: int, shared_frame: Any = None) -> ImageClip:
+    """Черный фон для клипа; кадр нужного размера берется из общего буфера, а не выделяется для каждого изображения."""
+    from moviepy import ImageClip, ColorClip
+
+    if shared_frame is not None and shared_frame.shape[:2] == (size[1], size[0]):
+        # Буфер только читается при композиции, поэтому один массив безопасно делят все клипы
+        background = ImageClip(shared_frame).with_duration(duration)
+    else:
+        background = ColorClip(size=size, color=(0, 0, 0), duration=duration)
+    background.fps = video_fps
+    return background
+
 def create_image_clips(image_paths: List[str], resolution: Tuple[int, int], total_duration: int, video_fps: int = 30) -> List[ImageClip]:
     logger.info(f"Начало создания клипов из {len(image_paths)} изображений. Общая длительность: {total_duration} сек, разрешение: {resolution}, FPS видео: {video_fps}.")
     clips_to_return = []
@@ -46,126 +210,104 @@ def create_image_clips(image_paths: List[str], resolution: Tuple[int, int], tota
         logger.error("Ошибка: количество изображений равно нулю.")
         return []
 
-    temp_files_to_delete = []
-    
-    for i, image_path_str in enumerate(image_paths):
-        logger.debug(f"Обработка изображения {i+1}/{len(image_paths)}: '{image_path_str}'")
-        current_image_path_for_moviepy = image_path_str
-        
-        processed_pil_image_path = None
+    from moviepy import ImageClip, CompositeVideoClip
+
+    # Необязательные модули загружаются здесь, в основном потоке, до запуска рабочих потоков
+    _get_cv2()
+    if _get_pil_image() is None or not NUMPY_AVAILABLE:
+        if NUMPY_AVAILABLE and _get_imageio() is not None:
+            logger.warning("Pillow не доступен, используется резервная предобработка NumPy (Lanczos).")
+        else:
+            logger.warning("Pillow или NumPy не доступны, предобработка средствами Pillow пропускается.")
+
+    # Инварианты цикла: целевые размеры; соотношение сторон сравнивается перекрестным умножением без деления
+    target_w, target_h = resolution
+    shared_background_frame = np.zeros((target_h, target_w, 3), dtype=np.uint8) if NUMPY_AVAILABLE else None
+
+    # Декодирование и ресемплинг в Pillow отпускают GIL, поэтому предобработка идет параллельно,
+    # а клипы MoviePy создаются только в основном потоке по мере готовности результатов
+    max_workers = min(8, len(image_paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        preprocess_futures = [executor.submit(_preprocess_image, path, resolution) for path in image_paths]
+
+        for i, (image_path_str, preprocess_future) in enumerate(zip(image_paths, preprocess_futures)):
+            logger.debug(f"Обработка изображения {i+1}/{len(image_paths)}: '{image_path_str}'")
+            img_name = Path(image_path_str).name
 
-        try:
-            if PIL_AVAILABLE:
-                img = PILImage.open(image_path_str)
-                img = img.convert("RGB") 
-                original_w, original_h = img.size
-
-                target_h = resolution[1]
-                scale_ratio = target_h / original_h
-                new_w = int(original_w * scale_ratio)
-                new_h = target_h
-                
-                resample_filter = PILImage.Resampling.LANCZOS if hasattr(PILImage.Resampling, 'LANCZOS') else PILImage.LANCZOS
-                
-                img_resized = img.resize((new_w, new_h), resample_filter)
-                logger.debug(f"Изображение '{Path(image_path_str).name}' изменено Pillow до ({new_w}, {new_h})")
-                processed_image_data = img_resized
-
-                if new_w > resolution[0]:
-                    target_w = resolution[0]
-                    left = (new_w - target_w) / 2
-                    right = left + target_w
-                    img_cropped = img_resized.crop((int(left), 0, int(right), new_h))
-                    logger.debug(f"Изображение обрезано Pillow до ({target_w}, {new_h})")
-                    processed_image_data = img_cropped
-                
-                temp_image_path_obj = Path(image_path_str).parent / f"temp_pil_processed_{i}_{Path(image_path_str).name}"
-                save_format = "PNG" 
-                if temp_image_path_obj.suffix.lower() not in ['.png']:
-                    temp_image_path_obj = temp_image_path_obj.with_suffix(".png")
-
-                processed_image_data.save(temp_image_path_obj, format=save_format)
-                current_image_path_for_moviepy = str(temp_image_path_obj)
-                temp_files_to_delete.append(temp_image_path_obj)
-                processed_pil_image_path = current_image_path_for_moviepy
-            else:
-                logger.warning("Pillow не доступен, предобработка средствами Pillow пропускаются.")
-
-            final_clip_item: Optional[ImageClip] = None
-            source_image_clip_obj: Optional[ImageClip] = None
-            
             try:
-                source_image_clip_obj = ImageClip(current_image_path_for_moviepy)
-                source_image_clip_obj.fps = video_fps
-
-                resize_attr = getattr(source_image_clip_obj, 'resize', None)
-                if not resize_attr:
-                    resize_attr = getattr(source_image_clip_obj, 'resized', None)
-                if resize_attr:
-                    current_moviepy_clip = resize_attr(height=resolution[1])
-                else:
-                    current_moviepy_clip = source_image_clip_obj
-                
-                if current_moviepy_clip.w > resolution[0]:
-                    if CROP_FUNCTION_AVAILABLE:
-                        current_moviepy_clip = crop(current_moviepy_clip, 
-                                                    x_center=int(current_moviepy_clip.w / 2), 
-                                                    width=int(resolution[0]))
-                        logger.debug(f"MoviePy crop применен. Новая ширина: {current_moviepy_clip.w}")
+                # Источник для ImageClip: массив NumPy после предобработки Pillow (без временных файлов) или путь к файлу
+                image_source_for_moviepy: Any = preprocess_future.result()
+
+                final_clip_item: Optional[ImageClip] = None
+                source_image_clip_obj: Optional[ImageClip] = None
+            
+                try:
+                    source_image_clip_obj = ImageClip(image_source_for_moviepy)
+                    source_image_clip_obj.fps = video_fps
+
+                    resize_attr = getattr(source_image_clip_obj, 'resize', None)
+                    if not resize_attr:
+                        resize_attr = getattr(source_image_clip_obj, 'resized', None)
+                    if resize_attr and source_image_clip_obj.h != target_h:
+                        current_moviepy_clip = resize_attr(height=target_h)
                     else:
-                        logger.warning("Функция crop недоступна. Попытка центрирования на фоне для 'обрезки'.")
-                        background = ColorClip(size=(resolution[0], current_moviepy_clip.h), color=(0,0,0), duration=clip_duration)
-                        background.fps = video_fps
-                        positioned_image = current_moviepy_clip.with_position('center')
-                        current_moviepy_clip = CompositeVideoClip([background, positioned_image], size=(resolution[0], current_moviepy_clip.h))
+                        current_moviepy_clip = source_image_clip_obj
+                
+                    if current_moviepy_clip.w > target_w:
+                        crop = _get_moviepy_crop()
+                        if crop is not None:
+                            current_moviepy_clip = crop(current_moviepy_clip, 
+                                                        x_center=int(current_moviepy_clip.w / 2), 
+                                                        width=int(target_w))
+                            logger.debug(f"MoviePy crop применен. Новая ширина: {current_moviepy_clip.w}")
+                        else:
+                            logger.warning("Функция crop недоступна. Попытка центрирования на фоне для 'обрезки'.")
+                            background = _black_background((target_w, current_moviepy_clip.h), clip_duration, video_fps, shared_background_frame)
+                            positioned_image = current_moviepy_clip.with_position('center')
+                            current_moviepy_clip = CompositeVideoClip([background, positioned_image], size=(target_w, current_moviepy_clip.h))
                 
-                final_clip_item = current_moviepy_clip
+                    final_clip_item = current_moviepy_clip
                 
-                if final_clip_item.w != resolution[0] or final_clip_item.h != resolution[1]:
-                    logger.debug(f"Размеры клипа ({final_clip_item.w}x{final_clip_item.h}) отличаются от целевых ({resolution[0]}x{resolution[1]}). Создаем финальный фон.")
-                    final_background = ColorClip(size=resolution, color=(0,0,0), is_mask=False, duration=clip_duration)
-                    final_background.fps = video_fps
-
-                    clip_to_composite = final_clip_item
-                    if final_clip_item.w > resolution[0] or final_clip_item.h > resolution[1]:
-                        resize_attr = getattr(final_clip_item, 'resize', None) or getattr(final_clip_item, 'resized', None)
-                        if resize_attr:
-                            if final_clip_item.w / final_clip_item.h > resolution[0] / resolution[1]:
-                                clip_to_composite = resize_attr(width=resolution[0])
-                            else:
-                                clip_to_composite = resize_attr(height=resolution[1])
+                    if final_clip_item.w == target_w and final_clip_item.h == target_h:
+                        # Обычный случай после предобработки Pillow: ни масштабирование, ни фон не нужны
+                        logger.debug(f"Клип '{img_name}' уже имеет целевой размер {target_w}x{target_h}, финальный фон не требуется.")
+                    else:
+                        logger.debug(f"Размеры клипа ({final_clip_item.w}x{final_clip_item.h}) отличаются от целевых ({target_w}x{target_h}). Создаем финальный фон.")
+                        final_background = _black_background(resolution, clip_duration, video_fps, shared_background_frame)
+
+                        clip_to_composite = final_clip_item
+                        if final_clip_item.w > target_w or final_clip_item.h > target_h:
+                            resize_attr = getattr(final_clip_item, 'resize', None) or getattr(final_clip_item, 'resized', None)
+                            if resize_attr:
+                                if final_clip_item.w * target_h > final_clip_item.h * target_w:
+                                    clip_to_composite = resize_attr(width=target_w)
+                                else:
+                                    clip_to_composite = resize_attr(height=target_h)
                     
-                    if getattr(clip_to_composite, 'fps', None) is None: clip_to_composite.fps = video_fps
+                        if getattr(clip_to_composite, 'fps', None) is None: clip_to_composite.fps = video_fps
                     
-                    positioned_final_image = clip_to_composite.with_position('center')
-                    if getattr(positioned_final_image, 'fps', None) is None: positioned_final_image.fps = video_fps
+                        positioned_final_image = clip_to_composite.with_position('center')
+                        if getattr(positioned_final_image, 'fps', None) is None: positioned_final_image.fps = video_fps
                     
-                    final_clip_item = CompositeVideoClip([final_background, positioned_final_image], 
-                                                         size=resolution, use_bgclip=True, bg_color=(0,0,0,0))
+                        final_clip_item = CompositeVideoClip([final_background, positioned_final_image], 
+                                                             size=resolution, use_bgclip=True, bg_color=(0,0,0,0))
                 
-                final_clip_item = final_clip_item.with_duration(clip_duration)
-                if getattr(final_clip_item, 'fps', None) is None: final_clip_item.fps = video_fps
-
-                clips_to_return.append(final_clip_item)
-                logger.info(f"Клип для изображения '{Path(image_path_str).name}' успешно создан и добавлен в список.")
-
-            except Exception as e_moviepy:
-                logger.error(f"Ошибка MoviePy при создании ImageClip для '{current_image_path_for_moviepy}': {e_moviepy}", exc_info=True)
-            finally:
-                if source_image_clip_obj and (not clips_to_return or id(source_image_clip_obj) != id(clips_to_return[-1])):
-                    try: source_image_clip_obj.close()
-                    except: pass
+                    final_clip_item = final_clip_item.with_duration(clip_duration)
+                    if getattr(final_clip_item, 'fps', None) is None: final_clip_item.fps = video_fps
+
+                    clips_to_return.append(final_clip_item)
+                    logger.info(f"Клип для изображения '{img_name}' успешно создан и добавлен в список.")
+
+                except Exception as e_moviepy:
+                    logger.error(f"Ошибка MoviePy при создании ImageClip для '{image_path_str}': {e_moviepy}", exc_info=True)
+                finally:
+                    if source_image_clip_obj and (not clips_to_return or id(source_image_clip_obj) != id(clips_to_return[-1])):
+                        try: source_image_clip_obj.close()
+                        except: pass
         
-        except Exception as e_pil_outer:
-            logger.error(f"Ошибка Pillow при обработке изображения '{image_path_str}': {e_pil_outer}", exc_info=True)
+            except Exception as e_pil_outer:
+                logger.error(f"Ошибка Pillow при обработке изображения '{image_path_str}': {e_pil_outer}", exc_info=True)
     
-    for temp_file in temp_files_to_delete:
-        try:
-            os.remove(temp_file)
-            logger.debug(f"Временный файл Pillow {temp_file} удален.")
-        except Exception as e_del:
-            logger.warning(f"Не удалось удалить временный файл Pillow {temp_file}: {e_del}")
-
     if not clips_to_return: logger.warning("Не создано ни одного клипа изображений.")
     else: logger.info(f"Успешно создано {len(clips_to_return)} клипов изображений.")
     return clips_to_return
@@ -173,6 +315,8 @@ def create_image_clips(image_paths: List[str], resolution: Tuple[int, int], tota
 
 def create_slideshow(clips: List[ImageClip], total_duration: int, video_fps: int = 30) -> Optional[CompositeVideoClip]:
     logger.info(f"Начало создания слайдшоу из {len(clips)} клипов. Общая длительность: {total_duration} сек.")
+    from moviepy import ImageClip, concatenate_videoclips
+
     if not clips:
         logger.error("Список клипов для слайдшоу пуст.")
         return None
@@ -193,24 +337,33 @@ def create_slideshow(clips: List[ImageClip], total_duration: int, video_fps: int
             if getattr(original_clip, 'fps', None) is None:
                 original_clip.fps = video_fps 
             
-            processed_clip = original_clip.with_duration(clip_duration)
-            if getattr(processed_clip, 'fps', None) is None:
-                 processed_clip.fps = video_fps
+            # Кадр статичного изображения постоянен: вычисляем его один раз (вместе с фоном и центрированием)
+            # и дальше отдаем готовый буфер, а не пересобираем композицию на каждом кадре при записи
+            frame = original_clip.get_frame(0)
+            if NUMPY_AVAILABLE:
+                # Запись ждет непрерывный uint8; приводим один раз, иначе astype выполнялся бы на каждом кадре
+                frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            processed_clip = ImageClip(frame).with_duration(clip_duration)
+            processed_clip.fps = video_fps
             processed_clips_for_concat.append(processed_clip)
 
         if not processed_clips_for_concat:
             logger.warning("Не удалось обработать клипы для слайдшоу.")
             return None
 
-        final_slideshow = concatenate_videoclips(processed_clips_for_concat, method="compose")
+        # Слайды идут строго друг за другом и не перекрываются, поэтому "compose" нужен
+        # только для выравнивания клипов разного размера
+        concat_method = "chain"
+        if len({clip.size for clip in processed_clips_for_concat}) > 1:
+            logger.debug("Клипы слайдшоу имеют разные размеры, используется method='compose'.")
+            concat_method = "compose"
+        final_slideshow = concatenate_videoclips(processed_clips_for_concat, method=concat_method)
         final_slideshow.fps = video_fps 
         
         if abs(final_slideshow.duration - total_duration) > 0.01:
-             current_ref = final_slideshow 
-             final_slideshow = final_slideshow.with_duration(total_duration)
-             if id(final_slideshow) != id(current_ref) and hasattr(current_ref, 'close'):
-                 try: current_ref.close()
-                 except: pass
+            # Меняется только длительность: правим атрибуты на месте, без копии клипа через with_duration
+            final_slideshow.duration = total_duration
+            final_slideshow.end = getattr(final_slideshow, 'start', 0) + total_duration
         
         logger.info("Слайдшоу успешно создано.")
         return final_slideshow
@@ -230,76 +383,91 @@ def create_audio_track(
     target_duration: float
 ) -> Optional[CompositeAudioClip]:
     logger.info(f"Начало создания композитной аудиодорожки. Целевая длительность: {target_duration:.2f} сек. Количество треков: {len(audio_tracks_info)}.")
+    from moviepy import AudioFileClip, CompositeAudioClip
+
     if not audio_tracks_info:
         logger.info("Список информации об аудиодорожках пуст.")
         return None
     
     clips_for_composition: List[AudioFileClip] = []
+    pending_tracks: List[Tuple[int, str, str, float]] = []
 
     for i, track_info in enumerate(audio_tracks_info):
         audio_path = track_info.get("path")
         start_time = float(track_info.get("start_time", 0.0))
 
-        if not audio_path or not Path(audio_path).exists():
+        audio_path_obj = Path(audio_path) if audio_path else None
+        if audio_path_obj is None or not audio_path_obj.exists():
             logger.warning(f"Трек {i+1}: путь к файлу '{audio_path}' отсутствует или некорректен. Пропуск.")
             continue
+        audio_name = audio_path_obj.name
             
         logger.debug(f"Обработка аудиофайла {i+1}/{len(audio_tracks_info)}: '{audio_path}', время начала: {start_time:.2f} сек.")
 
         if start_time >= target_duration:
-            logger.info(f"Время начала трека '{Path(audio_path).name}' ({start_time:.2f} сек) выходит за рамки ({target_duration:.2f} сек). Трек пропущен.")
+            logger.info(f"Время начала трека '{audio_name}' ({start_time:.2f} сек) выходит за рамки ({target_duration:.2f} сек). Трек пропущен.")
             continue
 
-        try:
+        pending_tracks.append((i, audio_path, audio_name, start_time))
+
+    if pending_tracks:
+        # Каждый AudioFileClip запускает ffmpeg для чтения метаданных, поэтому открываем файлы параллельно,
+        # а проверки, обрезку и позиционирование выполняем в основном потоке в исходном порядке
+        max_workers = min(8, len(pending_tracks), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
             # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Создаем новый AudioFileClip каждый раз
-            audio_clip = AudioFileClip(str(audio_path))
-            
-            # Проверяем валидность клипа
-            if not hasattr(audio_clip, 'reader') or audio_clip.reader is None:
-                logger.error(f"AudioFileClip для '{audio_path}' не имеет корректного reader. Пропускаем.")
-                try: audio_clip.close()
-                except: pass
-                continue
+            open_futures = [executor.submit(AudioFileClip, str(audio_path)) for _, audio_path, _, _ in pending_tracks]
+
+            for (i, audio_path, audio_name, start_time), open_future in zip(pending_tracks, open_futures):
+                try:
+                    audio_clip = open_future.result()
             
-            # Проверяем длительность
-            try:
-                clip_duration = audio_clip.duration
-                if clip_duration is None or clip_duration <= 0:
-                    logger.error(f"AudioFileClip для '{audio_path}' имеет некорректную длительность: {clip_duration}. Пропускаем.")
-                    audio_clip.close()
-                    continue
-            except Exception as e:
-                logger.error(f"Ошибка при получении длительности для '{audio_path}': {e}. Пропускаем.")
-                audio_clip.close()
-                continue
+                    # Проверяем валидность клипа
+                    if not hasattr(audio_clip, 'reader') or audio_clip.reader is None:
+                        logger.error(f"AudioFileClip для '{audio_path}' не имеет корректного reader. Пропускаем.")
+                        try: audio_clip.close()
+                        except: pass
+                        continue
             
-            # Обрезаем клип если нужно
-            effective_end_time = start_time + clip_duration
-            if effective_end_time > target_duration:
-                new_duration = target_duration - start_time
-                if new_duration > 0.01:
-                    logger.debug(f"Обрезаем трек '{Path(audio_path).name}' с {clip_duration:.2f}с до {new_duration:.2f}с.")
-                    # ИСПРАВЛЕНИЕ: Используем subclipped для безопасной обрезки
+                    # Проверяем длительность
                     try:
-                        audio_clip = audio_clip.subclipped(0, new_duration)
-                    except AttributeError:
-                        # Fallback если subclipped недоступен
-                        audio_clip = audio_clip.with_duration(new_duration)
-                else:
-                    logger.info(f"Трек '{Path(audio_path).name}' после обрезки слишком мал. Пропуск.")
-                    audio_clip.close()
-                    continue
+                        clip_duration = audio_clip.duration
+                        if clip_duration is None or clip_duration <= 0:
+                            logger.error(f"AudioFileClip для '{audio_path}' имеет некорректную длительность: {clip_duration}. Пропускаем.")
+                            audio_clip.close()
+                            continue
+                    except Exception as e:
+                        logger.error(f"Ошибка при получении длительности для '{audio_path}': {e}. Пропускаем.")
+                        audio_clip.close()
+                        continue
             
-            # Устанавливаем время начала
-            positioned_clip = audio_clip.with_start(start_time)
-            clips_for_composition.append(positioned_clip)
+                    # Обрезаем клип если нужно
+                    effective_end_time = start_time + clip_duration
+                    if effective_end_time > target_duration:
+                        new_duration = target_duration - start_time
+                        if new_duration > 0.01:
+                            logger.debug(f"Обрезаем трек '{audio_name}' с {clip_duration:.2f}с до {new_duration:.2f}с.")
+                            # ИСПРАВЛЕНИЕ: Используем subclipped для безопасной обрезки
+                            try:
+                                audio_clip = audio_clip.subclipped(0, new_duration)
+                            except AttributeError:
+                                # Fallback если subclipped недоступен
+                                audio_clip = audio_clip.with_duration(new_duration)
+                        else:
+                            logger.info(f"Трек '{audio_name}' после обрезки слишком мал. Пропуск.")
+                            audio_clip.close()
+                            continue
             
-            logger.info(f"Аудиосегмент из '{Path(audio_path).name}' добавлен в композицию: начало={start_time:.2f}с, длит={positioned_clip.duration:.2f}с.")
+                    # Устанавливаем время начала
+                    positioned_clip = audio_clip.with_start(start_time)
+                    clips_for_composition.append(positioned_clip)
             
-        except Exception as e:
-            logger.error(f"Ошибка обработки аудиофайла '{audio_path}': {e}", exc_info=True)
-            continue
+                    logger.info(f"Аудиосегмент из '{audio_name}' добавлен в композицию: начало={start_time:.2f}с, длит={positioned_clip.duration:.2f}с.")
             
+                except Exception as e:
+                    logger.error(f"Ошибка обработки аудиофайла '{audio_path}': {e}", exc_info=True)
+                    continue
+
     if not clips_for_composition:
         logger.warning("Не удалось подготовить ни одного аудиосегмента.")
         return None
@@ -324,43 +492,124 @@ def create_audio_track(
             except: pass
         return None
 
+def load_waveform_amplitudes(audio_path: str, sample_rate: int = WAVEFORM_SAMPLE_RATE) -> Any:
+    """
+    Модули амплитуд моно-сигнала с частотой sample_rate (float16).
+    Кэш привязан к пути, размеру и времени изменения файла, поэтому измененный файл декодируется заново.
+    """
+    stat = os.stat(audio_path)
+    cache_key = f"{os.path.abspath(audio_path)}:{stat.st_mtime_ns}:{stat.st_size}:{sample_rate}"
+    cache_file = WAVEFORM_CACHE_DIR / f"{hashlib.sha1(cache_key.encode('utf-8')).hexdigest()}.npy"
+    try:
+        amplitudes = np.load(cache_file, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    else:
+        # mtime файла кэша - время последнего использования (atime часто не обновляется: relatime, noatime)
+        try: os.utime(cache_file)
+        except OSError: pass
+        return amplitudes
+
+    from moviepy import AudioFileClip
+    # to_soundarray(fps=...) в MoviePy 2 при чтении диапазона шире половины буфера ридера возвращает нули,
+    # поэтому файл читается кусками по 0.1 сек
+    with AudioFileClip(audio_path) as audio_clip:
+        sound_array = np.concatenate(list(audio_clip.iter_chunks(fps=sample_rate, chunksize=max(1, sample_rate // 10))))
+    if sound_array.ndim == 2: # Стерео -> Моно (берем среднее или один канал)
+        sound_array = sound_array.mean(axis=1)
+    amplitudes = np.abs(sound_array).astype(np.float16)
+
+    try:
+        WAVEFORM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_name(f"{cache_file.stem}.{os.getpid()}.tmp")
+        with open(temp_file, 'wb') as f:
+            np.save(f, amplitudes)
+        os.replace(temp_file, cache_file)
+        _prune_waveform_cache(cache_file)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить кэш формы волны {cache_file}: {e}")
+    return amplitudes
+
+def _prune_waveform_cache(keep_file: Path) -> None:
+    """Удаляет давно не использованные файлы кэша формы волны, пока он превышает WAVEFORM_CACHE_MAX_BYTES."""
+    cache_entries = []
+    with os.scandir(WAVEFORM_CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith('.npy') and entry.is_file():
+                entry_stat = entry.stat()
+                cache_entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in cache_entries)
+    for _, size, path in sorted(cache_entries):
+        if total_size <= WAVEFORM_CACHE_MAX_BYTES:
+            break
+        if path == os.fspath(keep_file):
+            continue
+        try:
+            os.remove(path)
+            total_size -= size
+            logger.debug(f"Удален старый файл кэша формы волны: {path}")
+        except OSError:
+            pass
+
 def validate_image_file(file_path: str) -> bool:
     try:
-        if not os.path.exists(file_path): return False
-        valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'}
-        return Path(file_path).suffix.lower() in valid_extensions
+        # Сначала дешевая строковая проверка расширения, затем один stat
+        if os.path.splitext(file_path)[1].lower() not in VALID_IMAGE_EXTS: return False
+        # isfile, как entry.is_file() в validate_*_entry: папка с "расширением" медиафайла не подходит
+        return os.path.isfile(file_path)
     except: return False
 
 def validate_audio_file(file_path: str) -> bool:
     try:
-        if not os.path.exists(file_path): return False
-        valid_extensions = {'.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac'}
-        return Path(file_path).suffix.lower() in valid_extensions
+        # Сначала дешевая строковая проверка расширения, затем один stat
+        if os.path.splitext(file_path)[1].lower() not in VALID_AUDIO_EXTS: return False
+        # isfile, как entry.is_file() в validate_*_entry: папка с "расширением" медиафайла не подходит
+        return os.path.isfile(file_path)
     except: return False
 
+def validate_image_entry(entry: os.DirEntry) -> bool:
+    """Вариант validate_image_file для обхода папки через os.scandir: is_file() берется из кэша DirEntry без stat."""
+    try:
+        if os.path.splitext(entry.name)[1].lower() not in VALID_IMAGE_EXTS: return False
+        return entry.is_file()
+    except OSError: return False
+
+def validate_audio_entry(entry: os.DirEntry) -> bool:
+    """Вариант validate_audio_file для обхода папки через os.scandir: is_file() берется из кэша DirEntry без stat."""
+    try:
+        if os.path.splitext(entry.name)[1].lower() not in VALID_AUDIO_EXTS: return False
+        return entry.is_file()
+    except OSError: return False
+
 def get_media_info(file_path: str) -> dict:
     info = {'exists': False, 'size': 0, 'extension': '', 'name': ''}
     try:
-        info['exists'] = os.path.exists(file_path)
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            file_stat = None
+        info['exists'] = file_stat is not None
         if info['exists']:
-            path_obj = Path(file_path)
-            info['size'] = path_obj.stat().st_size
-            info['extension'] = path_obj.suffix.lower()
-            info['name'] = path_obj.name
+            info['size'] = file_stat.st_size
+            info['extension'] = os.path.splitext(file_path)[1].lower()
+            info['name'] = os.path.basename(file_path)
             
             img_clip_temp: Optional[ImageClip] = None
             audio_clip_temp: Optional[AudioFileClip] = None
             try:
-                if info['extension'] in {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}:
-                    if PIL_AVAILABLE:
+                if info['extension'] in VALID_IMAGE_EXTS:
+                    PILImage = _get_pil_image()
+                    if PILImage is not None:
                         with PILImage.open(file_path) as img:
                             info['dimensions'] = img.size
                             info['format'] = img.format
                     else: 
                         logger.warning("PIL (Pillow) не установлен для get_media_info.")
+                        from moviepy import ImageClip
                         img_clip_temp = ImageClip(file_path)
                         info['dimensions'] = (img_clip_temp.w, img_clip_temp.h)
-                elif info['extension'] in {'.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac'}:
+                elif info['extension'] in VALID_AUDIO_EXTS:
+                    from moviepy import AudioFileClip
                     audio_clip_temp = AudioFileClip(file_path)
                     if hasattr(audio_clip_temp, 'reader') and audio_clip_temp.reader is not None:
                         info['duration'] = audio_clip_temp.duration
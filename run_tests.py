@@ -3,35 +3,68 @@
 run_tests.py - Запуск всех тестов VideoCreator Pro
 """
 
+import os
 import sys
-import subprocess
+import runpy
+import traceback
 from pathlib import Path
 
+try:
+    import pytest
+    SKIP_EXCEPTION = pytest.skip.Exception
+except ImportError:
+    SKIP_EXCEPTION = None
+
+TESTS_DIR = Path(__file__).parent
+
+def run_script_in_process(test_path):
+    """
+    Выполняет тест-скрипт в текущем интерпретаторе так же, как `python test_file`,
+    и возвращает код выхода. moviepy/PIL/numpy импортируются один раз на все тесты.
+    """
+    saved_argv, saved_cwd = sys.argv[:], os.getcwd()
+    sys.argv = [str(test_path)]
+    os.chdir(test_path.parent)
+    try:
+        runpy.run_path(str(test_path), run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    finally:
+        sys.argv = saved_argv
+        os.chdir(saved_cwd)
+
 def run_test(test_name, test_file):
-    """Запускает отдельный тест"""
+    """Запускает отдельный тест. Возвращает True/False, либо None если тест пропущен"""
     print(f"\n{'='*60}")
     print(f"🧪 ЗАПУСК ТЕСТА: {test_name}")
     print(f"📄 Файл: {test_file}")
     print(f"{'='*60}")
     
+    test_path = TESTS_DIR / test_file
     try:
-        if Path(test_file).exists():
-            result = subprocess.run([sys.executable, test_file], 
-                                  capture_output=False, 
-                                  text=True, 
-                                  cwd=Path(__file__).parent)
+        if test_path.exists():
+            returncode = run_script_in_process(test_path)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 print(f"✅ {test_name} - ПРОЙДЕН")
                 return True
             else:
-                print(f"❌ {test_name} - ПРОВАЛЕН (код: {result.returncode})")
+                print(f"❌ {test_name} - ПРОВАЛЕН (код: {returncode})")
                 return False
         else:
             print(f"⚠️ Файл теста не найден: {test_file}")
             return False
             
-    except Exception as e:
+    except BaseException as e:
+        if SKIP_EXCEPTION is not None and isinstance(e, SKIP_EXCEPTION):
+            print(f"⏭️ {test_name} - ПРОПУЩЕН ({e})")
+            return None
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        traceback.print_exc()
         print(f"❌ Ошибка запуска теста {test_name}: {e}")
         return False
 
@@ -58,19 +91,26 @@ def main():
     
     passed = 0
     failed = 0
+    skipped = 0
     
     for test_name, success in results:
-        status = "✅ ПРОЙДЕН" if success else "❌ ПРОВАЛЕН"
-        print(f"{status:<15} {test_name}")
-        if success:
+        if success is None:
+            status = "⏭️ ПРОПУЩЕН"
+            skipped += 1
+        elif success:
+            status = "✅ ПРОЙДЕН"
             passed += 1
         else:
+            status = "❌ ПРОВАЛЕН"
             failed += 1
+        print(f"{status:<15} {test_name}")
     
     print(f"\n📈 Статистика:")
     print(f"   ✅ Пройдено: {passed}")
     print(f"   ❌ Провалено: {failed}")
-    print(f"   📊 Всего: {passed + failed}")
+    if skipped:
+        print(f"   ⏭️ Пропущено: {skipped}")
+    print(f"   📊 Всего: {passed + failed + skipped}")
     
     if failed == 0:
         print(f"\n🎉 ВСЕ ТЕСТЫ ПРОЙДЕНЫ! Можно запускать основное приложение:")
@@ -5,10 +5,19 @@ template_manager.py - Модуль для управления шаблонам
 """
 
 import json
+import logging
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Импортируем настроенный логгер
 from logger_setup import logger
@@ -17,12 +26,91 @@ TEMPLATES_DIR_NAME = "saved_templates"
 TEMPLATE_FILE_EXTENSION = ".json"
 
 try:
-    BASE_DIR = Path(__file__).resolve().parent
+    # abspath без разрешения симлинков: resolve() делал бы readlink/lstat для каждого компонента пути при импорте
+    BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 except NameError:
     BASE_DIR = Path.cwd() 
 
 TEMPLATES_DIR = BASE_DIR / TEMPLATES_DIR_NAME
 
+# Директория, для которой ensure_templates_dir_exists уже выполнила mkdir; повторные вызовы не делают syscall.
+# Сбрасывается, если директория пропала (FileNotFoundError при работе с ней).
+_templates_dir_ready: Optional[Path] = None
+
+# Шаблоны sanitize_filename, скомпилированные один раз. Все они - классы символов без вложенных
+# квантификаторов, поэтому движок re проходит строку линейно, без откатов; RE2 здесь не подходит,
+# так как его \w не включает кириллицу. Серия недопустимых символов удаляется одним совпадением.
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_UNSAFE_CHARS = re.compile(r'[^\w\._-]+')
+_RE_UNDERSCORES = re.compile(r'_+')
+
+# Для ASCII-имен пробелы, регистр и недопустимые символы обрабатываются одним str.translate:
+# пробельные -> '_', буквы -> нижний регистр, все кроме [a-z0-9_.-] удаляется
+_ASCII_FILENAME_TABLE = str.maketrans({
+    chr(code): ('_' if chr(code).isspace()
+                else chr(code).lower() if chr(code).isalnum() or chr(code) in '_.-'
+                else None)
+    for code in range(128)
+})
+
+# Кэш разобранных шаблонов для get_saved_templates: путь -> (st_mtime_ns, st_size, display_name).
+# Файл перечитывается только если изменились его mtime или размер.
+_TEMPLATE_CACHE: Dict[str, Tuple[int, int, str]] = {}
+
+def _json_dumps(data: Dict[str, Any]) -> bytes:
+    """
+    Сериализует шаблон в UTF-8 байты: orjson, если установлен, иначе стандартный json.
+    Отступ 2 пробела в обоих случаях (orjson другого не умеет): формат файла не зависит от наличия orjson.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _read_json(path: Any) -> Any:
+    """Читает JSON-файл целиком одним read и разбирает его (orjson или стандартный json)."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+def _template_path(filename: str) -> str:
+    """
+    Путь к файлу в TEMPLATES_DIR как строка: внутри модуля пути собираются через os.path,
+    без создания промежуточных объектов Path. TEMPLATES_DIR читается при каждом вызове,
+    поэтому переназначение директории (например, в тестах) учитывается.
+    """
+    return os.path.join(os.fspath(TEMPLATES_DIR), filename)
+
+def _atomic_write_bytes(filepath: str, data: bytes) -> os.stat_result:
+    """
+    Записывает файл через временный файл рядом и os.replace: параллельное чтение
+    (например, обновление списка шаблонов) видит либо старую, либо новую версию целиком.
+    Возвращает stat записанного файла.
+    """
+    tmp_path = f"{filepath}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+            file_stat = os.fstat(fd)
+            if hasattr(os, 'posix_fadvise'):
+                # Шаблон перечитывается только по явной загрузке: после fsync страницы чистые,
+                # и их можно сразу освободить, не вытесняя из page cache более нужные данные
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                except OSError:
+                    pass
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, filepath)
+        return file_stat
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
 def ensure_templates_dir_exists() -> None:
     """
     Гарантирует существование директории для сохранения шаблонов.
@@ -32,18 +120,28 @@ def ensure_templates_dir_exists() -> None:
     # поэтому логирование здесь может быть избыточным, если логгер еще не настроен.
     # Однако, если вызывать ее отдельно, логирование полезно.
     # logger.debug(f"Проверка/создание директории шаблонов: {TEMPLATES_DIR}")
+    global _templates_dir_ready
+    if _templates_dir_ready == TEMPLATES_DIR:
+        return
     try:
         TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+        _templates_dir_ready = TEMPLATES_DIR
         # logger.info(f"Директория шаблонов {TEMPLATES_DIR} проверена/создана.")
     except Exception as e:
         # Используем print, так как логгер может быть еще не полностью настроен при первом вызове
         print(f"Критическая ошибка: Не удалось создать директорию для шаблонов {TEMPLATES_DIR}: {e}")
         # logger.critical(f"Не удалось создать директорию для шаблонов {TEMPLATES_DIR}: {e}", exc_info=True)
 
+def _reset_templates_dir_ready() -> None:
+    """Сбрасывает флаг ensure_templates_dir_exists, когда директория шаблонов исчезла."""
+    global _templates_dir_ready
+    _templates_dir_ready = None
 
+@lru_cache(maxsize=512)
 def sanitize_filename(name: str) -> str:
     """
     Очищает строку для использования в качестве имени файла.
+    Функция чистая (результат зависит только от name), поэтому кэш не требует инвалидации.
     """
     # logger.debug(f"Санитизация имени файла для: '{name}'")
     if not name or not isinstance(name, str) or not name.strip():
@@ -51,10 +149,14 @@ def sanitize_filename(name: str) -> str:
         return "untitled"
     
     original_name = name
-    name = name.strip().lower()
-    name = re.sub(r'\s+', '_', name)
-    name = re.sub(r'[^\w\._-]', '', name)
-    name = re.sub(r'_+', '_', name)
+    if name.isascii():
+        # Крайние пробелы станут '_' и уйдут при strip('._-') ниже
+        name = name.translate(_ASCII_FILENAME_TABLE)
+    else:
+        name = name.strip().lower()
+        name = _RE_WHITESPACE.sub('_', name)
+        name = _RE_UNSAFE_CHARS.sub('', name)
+    name = _RE_UNDERSCORES.sub('_', name)
     name = name.strip('._-')
 
     if not name:
@@ -69,25 +171,70 @@ def save_template(settings: Dict[str, Any], template_display_name: str) -> bool:
     """
     logger.info(f"Попытка сохранения шаблона с отображаемым именем: '{template_display_name}'")
     ensure_templates_dir_exists() # Убедимся, что директория есть
-    
+    return _write_template(settings, template_display_name)
+
+def save_templates_batch(templates: List[Tuple[Dict[str, Any], str]], max_workers: int = 8) -> int:
+    """
+    Сохраняет несколько шаблонов (настройки, отображаемое имя) за один вызов.
+    Директория проверяется один раз, файлы записываются параллельно.
+    Возвращает количество успешно сохраненных шаблонов.
+    """
+    logger.info(f"Пакетное сохранение шаблонов: {len(templates)} шт.")
+    if not templates:
+        return 0
+    ensure_templates_dir_exists()
+
+    # Шаблоны с одинаковым именем файла записываются один раз: побеждает последний, как при сохранении по очереди
+    latest_by_filename: Dict[str, Tuple[Dict[str, Any], str]] = {}
+    named_count = 0
+    for settings, template_display_name in templates:
+        if not template_display_name or not template_display_name.strip():
+            logger.error("Ошибка сохранения шаблона: Отображаемое имя шаблона не может быть пустым.")
+            continue
+        named_count += 1
+        latest_by_filename[sanitize_filename(template_display_name.strip())] = (settings, template_display_name)
+
+    duplicates_count = named_count - len(latest_by_filename)
+    if duplicates_count:
+        logger.info(f"Пропущено шаблонов с повторяющимся именем файла (сохранен последний): {duplicates_count}.")
+    if not latest_by_filename:
+        return 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(latest_by_filename))) as executor:
+        results = list(executor.map(lambda item: _write_template(*item), latest_by_filename.values()))
+    saved_count = sum(results)
+    # Считаем от числа файлов к записи: отброшенные дубликаты и пустые имена не выглядят как сбои записи
+    logger.info(f"Пакетное сохранение завершено: сохранено {saved_count} из {len(latest_by_filename)} файлов.")
+    return saved_count
+
+def _write_template(settings: Dict[str, Any], template_display_name: str) -> bool:
+    """Записывает один шаблон в TEMPLATES_DIR; директория уже должна существовать."""
     if not template_display_name or not template_display_name.strip():
         logger.error("Ошибка сохранения шаблона: Отображаемое имя шаблона не может быть пустым.")
         return False
 
     clean_display_name = template_display_name.strip()
-    logger.debug(f"Очищенное отображаемое имя: '{clean_display_name}'")
+    logger.debug("Очищенное отображаемое имя: '%s'", clean_display_name)
     
     template_data = settings.copy()
     template_data["name"] = clean_display_name
 
-    filename_base = sanitize_filename(clean_display_name)
-    filepath = TEMPLATES_DIR / f"{filename_base}{TEMPLATE_FILE_EXTENSION}"
-    logger.debug(f"Полный путь для сохранения шаблона: {filepath}")
+    filename = sanitize_filename(clean_display_name) + TEMPLATE_FILE_EXTENSION
+    filepath = _template_path(filename)
+    logger.debug("Полный путь для сохранения шаблона: %s", filepath)
 
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(template_data, f, ensure_ascii=False, indent=4)
-        logger.info(f"Шаблон '{clean_display_name}' (файл: {filepath.name}) успешно сохранен.")
+        _TEMPLATE_CACHE.pop(filepath, None)
+        template_bytes = _json_dumps(template_data)
+        try:
+            file_stat = _atomic_write_bytes(filepath, template_bytes)
+        except FileNotFoundError:
+            # Директорию удалили после проверки: создаем заново и повторяем запись
+            _reset_templates_dir_ready()
+            ensure_templates_dir_exists()
+            file_stat = _atomic_write_bytes(filepath, template_bytes)
+        # Имя уже известно: следующий get_saved_templates не будет перечитывать только что записанный файл
+        _TEMPLATE_CACHE[filepath] = (file_stat.st_mtime_ns, file_stat.st_size, clean_display_name)
+        logger.info(f"Шаблон '{clean_display_name}' (файл: {filename}) успешно сохранен.")
         return True
     except IOError as e:
         logger.error(f"IOError при сохранении шаблона '{clean_display_name}' в {filepath}: {e}", exc_info=True)
@@ -104,23 +251,22 @@ def load_template(template_filename_stem: str) -> Optional[Dict[str, Any]]:
     logger.info(f"Попытка загрузки шаблона с именем файла (без расширения): '{template_filename_stem}'")
     # ensure_templates_dir_exists() # Обычно директория уже должна существовать
     
-    filepath = TEMPLATES_DIR / f"{template_filename_stem}{TEMPLATE_FILE_EXTENSION}"
-    logger.debug(f"Полный путь для загрузки шаблона: {filepath}")
-
-    if not filepath.is_file():
-        logger.error(f"Ошибка загрузки: Файл шаблона {filepath} не найден или не является файлом.")
-        return None
+    filename = template_filename_stem + TEMPLATE_FILE_EXTENSION
+    filepath = _template_path(filename)
+    logger.debug("Полный путь для загрузки шаблона: %s", filepath)
 
+    # Отдельная проверка is_file() не нужна: отсутствие файла сообщает сам open(), без лишнего stat
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _read_json(filepath)
         
         if not isinstance(data, dict) or "name" not in data:
             logger.error(f"Ошибка: Файл {filepath} не является корректным шаблоном (отсутствует поле 'name' или не является словарем).")
             return None
             
-        logger.info(f"Шаблон '{data.get('name', template_filename_stem)}' успешно загружен из {filepath.name}.")
+        logger.info(f"Шаблон '{data.get('name', template_filename_stem)}' успешно загружен из {filename}.")
         return data
+    except (FileNotFoundError, IsADirectoryError):
+        logger.error(f"Ошибка загрузки: Файл шаблона {filepath} не найден или не является файлом.")
     except IOError as e:
         logger.error(f"IOError при загрузке шаблона из {filepath}: {e}", exc_info=True)
     except json.JSONDecodeError as e:
@@ -139,23 +285,62 @@ def get_saved_templates() -> List[Dict[str, str]]:
     
     file_count = 0
     processed_count = 0
-    for filepath in TEMPLATES_DIR.glob(f"*{TEMPLATE_FILE_EXTENSION}"):
-        file_count += 1
-        if filepath.is_file():
-            logger.debug(f"Обработка файла шаблона: {filepath.name}")
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                display_name = data.get("name", filepath.stem) 
-                templates_info.append({"filename_stem": filepath.stem, "display_name": display_name})
-                processed_count +=1
-            except (IOError, json.JSONDecodeError, KeyError) as e:
-                logger.warning(f"Не удалось прочитать или распарсить файл шаблона {filepath.name}: {e}. Пропускаем.", exc_info=True)
-                templates_info.append({"filename_stem": filepath.stem, "display_name": f"{filepath.stem} (ошибка чтения имени)"})
+    seen_paths = set()
+    entries_to_parse: List[Tuple[str, str, str, os.stat_result]] = []
+    try:
+        entries = os.scandir(TEMPLATES_DIR)
+    except FileNotFoundError:
+        _reset_templates_dir_ready()
+        ensure_templates_dir_exists()
+        logger.warning(f"Директория шаблонов {TEMPLATES_DIR} отсутствовала и создана заново.")
+        _TEMPLATE_CACHE.clear()
+        return templates_info
+    with entries:
+        for entry in entries:
+            # glob("*.json") не возвращал скрытые файлы, сохраняем это поведение
+            if entry.name.startswith('.') or not entry.name.endswith(TEMPLATE_FILE_EXTENSION):
+                continue
+            file_count += 1
+            # Тип файла берется из d_type, уже полученного scandir; stat выполняется только для симлинков
+            if not entry.is_file():
+                continue
+            filename_stem = entry.name[:-len(TEMPLATE_FILE_EXTENSION)]
+            file_stat = entry.stat()
+            seen_paths.add(entry.path)
+
+            cached = _TEMPLATE_CACHE.get(entry.path)
+            if cached and cached[0] == file_stat.st_mtime_ns and cached[1] == file_stat.st_size:
+                templates_info.append({"filename_stem": filename_stem, "display_name": cached[2]})
+                processed_count += 1
+                continue
+            entries_to_parse.append((entry.name, entry.path, filename_stem, file_stat))
+
+    if entries_to_parse:
+        # Новые и измененные файлы читаются параллельно: ожидание ввода-вывода одного файла перекрывается чтением других
+        with ThreadPoolExecutor(max_workers=min(8, len(entries_to_parse))) as executor:
+            read_futures = [executor.submit(_read_json, path) for _, path, _, _ in entries_to_parse]
+
+            for (entry_name, entry_path, filename_stem, file_stat), read_future in zip(entries_to_parse, read_futures):
+                logger.debug("Обработка файла шаблона: %s", entry_name)
+                try:
+                    data = read_future.result()
+                    display_name = data.get("name", filename_stem) 
+                    templates_info.append({"filename_stem": filename_stem, "display_name": display_name})
+                    _TEMPLATE_CACHE[entry_path] = (file_stat.st_mtime_ns, file_stat.st_size, display_name)
+                    processed_count +=1
+                except (IOError, json.JSONDecodeError, KeyError) as e:
+                    logger.warning(f"Не удалось прочитать или распарсить файл шаблона {entry_name}: {e}. Пропускаем.", exc_info=True)
+                    templates_info.append({"filename_stem": filename_stem, "display_name": f"{filename_stem} (ошибка чтения имени)"})
+
+    # Удаляем из кэша файлы, которых больше нет в директории
+    for stale_path in _TEMPLATE_CACHE.keys() - seen_paths:
+        del _TEMPLATE_CACHE[stale_path]
     
     logger.info(f"Найдено {file_count} файлов с расширением '{TEMPLATE_FILE_EXTENSION}'. Обработано как шаблоны: {processed_count}.")
     templates_info.sort(key=lambda x: x["display_name"].lower())
-    logger.debug(f"Список шаблонов для возврата (отсортированный): {templates_info}")
+    # repr всего списка строится только при включенном DEBUG
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Список шаблонов для возврата (отсортированный): %s", templates_info)
     return templates_info
 
 def delete_template(template_filename_stem: str) -> bool:
@@ -163,26 +348,22 @@ def delete_template(template_filename_stem: str) -> bool:
     Удаляет файл шаблона.
     """
     logger.info(f"Попытка удаления шаблона с именем файла (без расширения): '{template_filename_stem}'")
-    ensure_templates_dir_exists()
-    filepath = TEMPLATES_DIR / f"{template_filename_stem}{TEMPLATE_FILE_EXTENSION}"
-    logger.debug(f"Полный путь для удаления шаблона: {filepath}")
+    # Создавать директорию ради удаления незачем: если ее нет, unlink() сообщит об отсутствии файла
+    filename = template_filename_stem + TEMPLATE_FILE_EXTENSION
+    filepath = _template_path(filename)
+    logger.debug("Полный путь для удаления шаблона: %s", filepath)
 
-    if not filepath.is_file():
-        logger.error(f"Ошибка удаления: Файл шаблона {filepath} не найден или не является файлом.")
-        return False
-    
     try:
-        display_name_for_log = filepath.stem # Для лога, если не сможем прочитать JSON
-        try: # Попытка прочитать имя из файла для более информативного лога
-            with open(filepath, 'r', encoding='utf-8') as f_read:
-                data_for_log = json.load(f_read)
-                display_name_for_log = data_for_log.get("name", filepath.stem)
-        except:
-            pass # Если не удалось прочитать, используем имя файла
-
-        filepath.unlink()
-        logger.info(f"Шаблон '{display_name_for_log}' (файл: {filepath.name}) успешно удален.")
+        # Имя для лога берем из кэша get_saved_templates, не перечитывая файл; иначе используем имя файла
+        cached = _TEMPLATE_CACHE.pop(filepath, None)
+        display_name_for_log = cached[2] if cached else template_filename_stem
+
+        # Отсутствие файла сообщает сам unlink(), отдельная проверка is_file() не нужна
+        os.unlink(filepath)
+        logger.info(f"Шаблон '{display_name_for_log}' (файл: {filename}) успешно удален.")
         return True
+    except (FileNotFoundError, IsADirectoryError):
+        logger.error(f"Ошибка удаления: Файл шаблона {filepath} не найден или не является файлом.")
     except OSError as e:
         logger.error(f"OSError при удалении файла шаблона {filepath}: {e}", exc_info=True)
     except Exception as e:
@@ -8,6 +8,44 @@ from pathlib import Path
 import tempfile
 import os
 
+from fnmatch import fnmatch
+
+# Порядок шаблонов - порядок приоритета: сначала любой *.mp3, затем *.wav и т.д.
+AUDIO_PATTERNS = ('*.mp3', '*.wav', '*.m4a')
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.jpeg')
+
+def _first_match(names, patterns):
+    for pattern in patterns:
+        for name in names:
+            if fnmatch(name, pattern):
+                return name
+    return None
+
+def find_media_in_folder(folder):
+    """
+    Один проход scandir по папке: первый аудиофайл и первое изображение с тем же приоритетом,
+    что у поочередных glob по расширениям (регистр имен - как в glob, скрытые файлы пропускаются).
+    """
+    try:
+        with os.scandir(folder) as entries:
+            names = [entry.name for entry in entries if not entry.name.startswith('.')]
+    except OSError:
+        return None, None
+    audio_name = _first_match(names, AUDIO_PATTERNS)
+    image_name = _first_match(names, IMAGE_PATTERNS)
+    return (os.path.join(folder, audio_name) if audio_name else None,
+            os.path.join(folder, image_name) if image_name else None)
+
+def test_find_media_in_folder_priority(tmp_path):
+    """Приоритет расширений сохраняется независимо от порядка файлов в папке"""
+    for name in ('b.m4a', 'a.wav', 'c.mp3', '.hidden.mp3', 'd.jpeg', 'e.jpg', 'f.png', 'g.PNG'):
+        (tmp_path / name).write_bytes(b'')
+    assert find_media_in_folder(tmp_path) == (os.path.join(tmp_path, 'c.mp3'), os.path.join(tmp_path, 'f.png'))
+    (tmp_path / 'c.mp3').unlink()
+    (tmp_path / 'f.png').unlink()
+    assert find_media_in_folder(tmp_path) == (os.path.join(tmp_path, 'a.wav'), os.path.join(tmp_path, 'e.jpg'))
+    assert find_media_in_folder(tmp_path / 'missing') == (None, None)
+
 def main():
     print(f"🔧 Тестирование исправлений аудио VideoCreator Pro")
     print("=" * 60)
@@ -23,6 +61,9 @@ def main():
         from text_effects_engine import create_enhanced_video
         print("✅ Модули импортированы успешно")
         
+        # Папка Downloads читается один раз: из нее берутся и запасной аудиофайл, и изображение
+        downloads_audio, downloads_image = find_media_in_folder(Path.home() / "Downloads")
+
         # Проверяем наличие тестовых файлов
         test_audio_files = []
         audio_folder = Path("output")
@@ -37,14 +78,9 @@ def main():
             print("💡 Создайте аудиофайлы с помощью script.py или добавьте любой .mp3 файл в папку output/")
             
             # Попробуем найти любой аудиофайл в системе
-            downloads_folder = Path.home() / "Downloads"
-            for audio_ext in ["*.mp3", "*.wav", "*.m4a"]:
-                for audio_file in downloads_folder.glob(audio_ext):
-                    test_audio_files = [str(audio_file)]
-                    print(f"🎧 Используем тестовый аудиофайл: {audio_file.name}")
-                    break
-                if test_audio_files:
-                    break
+            if downloads_audio:
+                test_audio_files = [downloads_audio]
+                print(f"🎧 Используем тестовый аудиофайл: {Path(downloads_audio).name}")
         
         if not test_audio_files:
             print("❌ Аудиофайлы не найдены. Попробуйте:")
@@ -54,15 +90,9 @@ def main():
             return
         
         # Создаем простое тестовое изображение
-        test_image_path = None
-        downloads_folder = Path.home() / "Downloads"
-        for img_ext in ["*.png", "*.jpg", "*.jpeg"]:
-            for img_file in downloads_folder.glob(img_ext):
-                test_image_path = str(img_file)
-                print(f"🖼️ Используем тестовое изображение: {img_file.name}")
-                break
-            if test_image_path:
-                break
+        test_image_path = downloads_image
+        if test_image_path:
+            print(f"🖼️ Используем тестовое изображение: {Path(test_image_path).name}")
         
         if not test_image_path:
             print("⚠️ Изображения не найдены в Downloads/")
@@ -3,10 +3,25 @@
 test_fixes.py - Быстрый тест исправлений без запуска полного приложения
 """
 
+import os
 import sys
 from pathlib import Path
 import platform
 
+try:
+    import msgspec
+
+    class ServiceAccountInfo(msgspec.Struct):
+        """Обязательные поля файла сервисного аккаунта; остальные поля JSON пропускаются при декодировании."""
+        type: str
+        project_id: str
+        private_key: str
+        client_email: str
+
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
 print(f"🔧 Тестирование исправлений VideoCreator Pro")
 print(f"💻 Система: {platform.system()} {platform.release()}")
 print(f"🐍 Python: {sys.version}")
@@ -66,6 +81,9 @@ except Exception as e:
 # Тест 3: Проверка файлов проекта
 print("\n3️⃣ Проверка файлов проекта...")
 
+# Одно чтение текущей директории вместо отдельного stat на каждый файл
+present = {entry.name for entry in os.scandir('.')}
+
 required_files = [
     "videocreator_main.py",
     "text_effects_engine.py", 
@@ -75,7 +93,7 @@ required_files = [
 ]
 
 for file in required_files:
-    if Path(file).exists():
+    if file in present:
         print(f"✅ {file}")
     else:
         print(f"❌ {file} - отсутствует")
@@ -87,7 +105,7 @@ sheets_files = [
 ]
 
 for file in sheets_files:
-    if Path(file).exists():
+    if file in present:
         print(f"✅ {file}")
     else:
         print(f"⚠️ {file} - отсутствует (опционально)")
@@ -106,15 +124,23 @@ for folder in folders:
 # Тест 4: Проверка Google Sheets подключения (если файл есть)
 print("\n4️⃣ Тестирование Google Sheets...")
 service_account_file = "elevenlabs-voice-generator-9cd6aae15cf6.json"
-if Path(service_account_file).exists():
+if service_account_file in present:
     try:
         # Простая проверка валидности JSON
-        import json
-        with open(service_account_file, 'r') as f:
-            data = json.load(f)
-        
-        required_keys = ["type", "project_id", "private_key", "client_email"]
-        missing_keys = [key for key in required_keys if key not in data]
+        if MSGSPEC_AVAILABLE:
+            # Декодирование и проверка обязательных полей за один проход, без построения полного словаря
+            try:
+                msgspec.json.decode(Path(service_account_file).read_bytes(), type=ServiceAccountInfo)
+                missing_keys = []
+            except msgspec.ValidationError as e:
+                missing_keys = [str(e)]
+        else:
+            import json
+            with open(service_account_file, 'r') as f:
+                data = json.load(f)
+            
+            required_keys = ["type", "project_id", "private_key", "client_email"]
+            missing_keys = [key for key in required_keys if key not in data]
         
         if not missing_keys:
             print("✅ Файл сервисного аккаунта валиден")
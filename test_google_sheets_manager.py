@@ -0,0 +1,384 @@
+"""Тесты google_sheets_manager: порядок поиска файлов темы и загрузка данных проекта"""
+import asyncio
+import threading
+import unicodedata
+
+import pytest
+
+pytest.importorskip("gspread")
+
+import google_sheets_manager as gsm
+
+
+class _SheetsStub:
+    """Вместо GoogleSheetsManager: данные тем без обращения к Google Sheets"""
+
+    def __init__(self, themes):
+        self.themes = themes
+
+    def connect(self):
+        return True
+
+    def reset_themes_index(self):
+        pass
+
+    def _get_themes_index(self):
+        return {theme: (row, text) for row, (theme, text) in enumerate(self.themes.items(), start=2)}
+
+    def get_theme_data(self, theme):
+        text = self.themes.get(theme)
+        return {'theme': theme, 'text': text} if text is not None else None
+
+
+class _SpreadsheetStub:
+    """values_batch_get по таблице в памяти; пустые ячейки в конце колонок обрезаются, как в API"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.batch_get_calls = 0
+
+    def values_batch_get(self, ranges, params=None):
+        self.batch_get_calls += 1
+        value_ranges = []
+        for cell_range in ranges:
+            start = cell_range.split('!')[1].split(':')[0]
+            column, first_row = ord(start[0]) - ord('A'), int(start[1:])
+            values = [row[column] if column < len(row) else "" for row in self.rows[first_row - 1:]]
+            while values and values[-1] == "":
+                values.pop()
+            value_ranges.append({'values': [values]} if values else {})
+        return {'valueRanges': value_ranges}
+
+
+class _WorksheetStub:
+    def __init__(self, rows):
+        self.spreadsheet = _SpreadsheetStub(rows)
+        self.updated_cells = []
+        self.batch_updates = []
+
+    def update_cell(self, row, col, value):
+        self.updated_cells.append((row, col, value))
+
+    def batch_update(self, data, value_input_option=None):
+        self.batch_updates.append((data, value_input_option))
+
+
+def _get_all_values_lookup(rows, theme):
+    """Прежний поиск темы: перебор get_all_values() (строки дополнены до ширины таблицы)"""
+    width = max(map(len, rows), default=0)
+    grid = [row + [""] * (width - len(row)) for row in rows]
+    for row_idx, row in enumerate(grid[1:], start=2):
+        if len(row) >= 2 and row[0].strip() == theme:
+            return {'theme': row[0].strip(), 'title': row[0].strip(), 'text': row[1].strip(), 'row_number': row_idx}
+    return None
+
+
+@pytest.mark.parametrize("rows", [
+    [["Тема", "Текст"], ["Овен", " Текст овна "], ["Телец", "Текст тельца"]],
+    [["Тема", "Текст"], ["Овен"], ["", "без темы"], [" Близнецы ", "Текст"], ["Овен", "дубль"]],
+    [["Тема"], ["Овен"], ["Телец", "Текст тельца"]],
+    [["Тема", "Текст"], ["Овен"], ["Телец"]],
+    # Вторая колонка отсутствует во всей таблице: темы не находятся
+    [["Тема"], ["Овен"], ["Телец"]],
+])
+def test_get_theme_data_matches_get_all_values(rows, monkeypatch):
+    monkeypatch.delenv(gsm.SHEETS_CACHE_ENV, raising=False)
+    manager = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    manager.sheet = _WorksheetStub(rows)
+    for theme in ("Овен", "Телец", "Близнецы", "Рак"):
+        assert manager.get_theme_data(theme) == _get_all_values_lookup(rows, theme)
+
+
+@pytest.fixture
+def sheets_cache(tmp_path, monkeypatch):
+    """Дисковый кэш Google Sheets во временной папке, TTL 60 секунд"""
+    cache_file = tmp_path / "cache" / "themes.json"
+    monkeypatch.setattr(gsm, "SHEETS_CACHE_FILE", cache_file)
+    monkeypatch.setenv(gsm.SHEETS_CACHE_ENV, "60")
+    return cache_file
+
+
+@pytest.mark.parametrize("ttl", [None, "0", "не число"])
+def test_sheets_cache_disabled(ttl, sheets_cache, monkeypatch):
+    if ttl is None:
+        monkeypatch.delenv(gsm.SHEETS_CACHE_ENV)
+    else:
+        monkeypatch.setenv(gsm.SHEETS_CACHE_ENV, ttl)
+    gsm._write_sheets_cache("key", ["Овен"])
+    assert not sheets_cache.exists()
+    assert gsm._read_sheets_cache("key") is None
+
+
+def test_sheets_cache_ttl(sheets_cache, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(gsm.time, "time", lambda: now)
+    gsm._write_sheets_cache("themes", ["Овен", "Телец"])
+    gsm._write_sheets_cache("other", {"a": 1})
+    assert gsm._read_sheets_cache("themes") == ["Овен", "Телец"]
+    assert gsm._read_sheets_cache("other") == {"a": 1}
+    assert gsm._read_sheets_cache("missing") is None
+    # Временный файл после записи не остается
+    assert [path.name for path in sheets_cache.parent.iterdir()] == ["themes.json"]
+
+    now += 61
+    assert gsm._read_sheets_cache("themes") is None
+
+
+def test_sheets_cache_ignores_corrupted_file(sheets_cache):
+    sheets_cache.parent.mkdir()
+    sheets_cache.write_text("{не json", encoding="utf-8")
+    assert gsm._read_sheets_cache("themes") is None
+    gsm._write_sheets_cache("themes", ["Овен"])
+    assert gsm._read_sheets_cache("themes") == ["Овен"]
+
+
+def test_sheets_cache_concurrent_writes_keep_all_keys(sheets_cache):
+    """Запись из нескольких потоков сразу: ни один ключ не теряется, временных файлов не остается"""
+    keys = [f"key{i}" for i in range(16)]
+    barrier = threading.Barrier(len(keys))
+
+    def write(key):
+        barrier.wait()
+        gsm._write_sheets_cache(key, [key])
+
+    threads = [threading.Thread(target=write, args=(key,)) for key in keys]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {key: gsm._read_sheets_cache(key) for key in keys} == {key: [key] for key in keys}
+    assert [path.name for path in sheets_cache.parent.iterdir()] == ["themes.json"]
+
+
+def test_sheets_cache_failed_write_leaves_no_temp_file(sheets_cache, monkeypatch):
+    gsm._write_sheets_cache("themes", ["Овен"])
+
+    def failing_replace(src, dst):
+        raise OSError("диск заполнен")
+
+    monkeypatch.setattr(gsm.os, "replace", failing_replace)
+    gsm._write_sheets_cache("themes", ["Телец"])
+    assert gsm._read_sheets_cache("themes") == ["Овен"]
+    assert [path.name for path in sheets_cache.parent.iterdir()] == ["themes.json"]
+
+
+def test_themes_index_served_from_sheets_cache(sheets_cache):
+    rows = [["Тема", "Текст"], ["Овен", "Текст овна"], ["Телец", "Текст тельца"]]
+    manager = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    manager.sheet = _WorksheetStub(rows)
+    expected = manager.get_theme_data("Телец")
+
+    # Новый менеджер берет индекс с диска и не обращается к таблице
+    cached_manager = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    cached_manager.sheet = _WorksheetStub([])
+    cached_manager.sheet.spreadsheet.values_batch_get = None
+    assert cached_manager.get_theme_data("Телец") == expected
+    # Другой лист - другой ключ кэша
+    other_sheet = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id", "Лист2")
+    other_sheet.sheet = _WorksheetStub([["Тема", "Текст"]])
+    assert other_sheet.get_theme_data("Телец") is None
+
+
+@pytest.fixture
+def sheets(sheets_cache):
+    rows = [["Тема", "Текст"], ["Овен", "Текст овна"], ["Телец", "Текст тельца"]]
+    manager = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    manager.sheet = _WorksheetStub(rows)
+    return manager
+
+
+def _cached_index(manager):
+    return {theme: tuple(entry) for theme, entry in gsm._read_sheets_cache(manager._cache_key('index')).items()}
+
+
+def test_update_theme_text_row_from_index(sheets):
+    assert sheets.update_theme_text("Телец", " Новый текст ")
+    assert sheets.sheet.updated_cells == [(3, 2, " Новый текст ")]
+    assert sheets.get_theme_data("Телец")['text'] == "Новый текст"
+    assert _cached_index(sheets)["Телец"] == (3, "Новый текст")
+
+    assert not sheets.update_theme_text("Рак", "текст")
+    assert len(sheets.sheet.updated_cells) == 1
+
+
+def test_update_theme_text_checks_row_number(sheets):
+    sheets.get_theme_data("Овен")
+    assert sheets.update_theme_text("Телец", "Новый текст", row_number=3)
+    assert sheets.sheet.updated_cells == [(3, 2, "Новый текст")]
+
+    # Строка чужой темы и неизвестная тема отклоняются без записи в таблицу и индекс
+    assert not sheets.update_theme_text("Телец", "Ошибка", row_number=2)
+    assert not sheets.update_theme_text("Рак", "Ошибка", row_number=4)
+    assert len(sheets.sheet.updated_cells) == 1
+    assert sheets.get_theme_data("Овен")['text'] == "Текст овна"
+    assert _cached_index(sheets) == {"Овен": (2, "Текст овна"), "Телец": (3, "Новый текст")}
+
+
+def test_update_theme_text_row_number_without_index(sheets):
+    """Без загруженного индекса известный номер строки используется без лишнего запроса"""
+    assert sheets.update_theme_text("Телец", "Новый текст", row_number=3)
+    assert sheets.sheet.updated_cells == [(3, 2, "Новый текст")]
+    assert sheets.sheet.spreadsheet.batch_get_calls == 0
+    assert sheets._themes_cache is None
+
+
+def test_update_theme_texts_single_batch_update(sheets):
+    assert sheets.update_theme_texts({"Телец": " Текст 1 ", "Овен": "Текст 2"})
+    assert sheets.sheet.batch_updates == [([
+        {'range': "B3", 'values': [[" Текст 1 "]]},
+        {'range': "B2", 'values': [["Текст 2"]]},
+    ], 'RAW')]
+    assert sheets.sheet.updated_cells == []
+    # Индекс в памяти и дисковый кэш обновлены без повторной загрузки
+    assert sheets.get_theme_data("Телец")['text'] == "Текст 1"
+    assert _cached_index(sheets) == {"Овен": (2, "Текст 2"), "Телец": (3, "Текст 1")}
+    assert sheets.sheet.spreadsheet.batch_get_calls == 1
+
+
+def test_update_theme_texts_skips_unknown_themes(sheets):
+    # Неизвестная тема пропускается, найденные обновляются; результат - не все темы обновлены
+    assert not sheets.update_theme_texts({"Рак": "текст", "Овен": "Новый текст"})
+    assert sheets.sheet.batch_updates == [([{'range': "B2", 'values': [["Новый текст"]]}], 'RAW')]
+    assert _cached_index(sheets)["Овен"] == (2, "Новый текст")
+
+    # Ни одна тема не найдена: запроса на запись нет
+    assert not sheets.update_theme_texts({"Рак": "текст", "Лев": "текст"})
+    assert len(sheets.sheet.batch_updates) == 1
+    assert sheets.update_theme_texts({})
+    assert len(sheets.sheet.batch_updates) == 1
+
+
+def test_candidates_keep_priority_order():
+    assert gsm._audio_candidates("Моя Тема-1") == (
+        "Моя Тема-1.mp3", "Моя_Тема_1.mp3", "моя тема-1.mp3", "моя_тема_1.mp3")
+    assert gsm._template_candidates("Моя Тема-1") == (
+        "моя_тема_1.json", "моя тема-1.json", "Моя Тема-1.json")
+    # Совпадающие варианты проверяются один раз
+    assert gsm._audio_candidates("тема") == ("тема.mp3",)
+
+
+def test_find_audio_file_prefers_exact_name(tmp_path):
+    for name in ("моя_тема.mp3", "Моя_Тема.mp3", "Моя Тема.mp3"):
+        (tmp_path / name).write_bytes(b"")
+    manager = gsm.ProjectDataManager(_SheetsStub({}), str(tmp_path), str(tmp_path))
+    assert manager.find_audio_file("Моя Тема") == str(tmp_path / "Моя Тема.mp3")
+    (tmp_path / "Моя Тема.mp3").unlink()
+    assert manager.find_audio_file("Моя Тема") == str(tmp_path / "Моя_Тема.mp3")
+
+
+def test_find_audio_file_nfd_name(tmp_path):
+    """Имя на диске в NFD (так его может сохранить macOS) находится по теме в NFC"""
+    disk_name = unicodedata.normalize('NFD', "Водолей.mp3")
+    assert disk_name != "Водолей.mp3"
+    (tmp_path / disk_name).write_bytes(b"")
+    manager = gsm.ProjectDataManager(_SheetsStub({}), str(tmp_path), str(tmp_path))
+    audio_path = manager.find_audio_file("Водолей")
+    assert audio_path == str(tmp_path / disk_name)
+
+
+def test_find_file_falls_back_to_stat(tmp_path, monkeypatch):
+    """Если имени нет в списке папки буквально (ФС без учета регистра), файл ищется через stat"""
+    (tmp_path / "Моя_Тема.mp3").write_bytes(b"")
+    (tmp_path / "моя_тема.json").write_text("{}", encoding="utf-8")
+    manager = gsm.ProjectDataManager(_SheetsStub({}), str(tmp_path), str(tmp_path))
+    monkeypatch.setattr(gsm, "_get_dir_filenames", lambda folder: {})
+    assert manager.find_audio_file("Моя Тема") == str(tmp_path / "Моя_Тема.mp3")
+    assert manager.find_template_file("Моя Тема") == str(tmp_path / "моя_тема.json")
+    assert manager.find_audio_file("Другая тема") is None
+
+
+@pytest.fixture
+def project_manager(tmp_path):
+    audio_folder, templates_folder = tmp_path / "output", tmp_path / "saved_templates"
+    audio_folder.mkdir()
+    templates_folder.mkdir()
+    (audio_folder / "Тема_один.mp3").write_bytes(b"")
+    (templates_folder / "тема_один.json").write_text("{}", encoding="utf-8")
+    sheets = _SheetsStub({"Тема один": "Текст темы", "Без аудио": "Текст"})
+    return gsm.ProjectDataManager(sheets, str(audio_folder), str(templates_folder))
+
+
+def test_load_project_data(project_manager):
+    result = project_manager.load_project_data("Тема один")
+    assert result['success']
+    assert result['text_data']['text'] == "Текст темы"
+    assert result['audio_path'].endswith("Тема_один.mp3")
+    assert result['template_path'].endswith("тема_один.json")
+    assert result['errors'] == []
+
+
+def test_load_project_data_inside_running_loop(project_manager):
+    """Синхронный вызов не создает свой цикл событий и работает внутри уже запущенного"""
+    async def call_sync():
+        return project_manager.load_project_data("Тема один")
+
+    assert asyncio.run(call_sync())['success']
+
+
+def test_load_project_data_async_matches_sync(project_manager):
+    for theme in ("Тема один", "Без аудио", "Нет такой темы"):
+        assert asyncio.run(project_manager.load_project_data_async(theme)) == project_manager.load_project_data(theme)
+
+
+def test_load_many(project_manager):
+    results = project_manager.load_many(["Тема один", "Без аудио"], max_workers=2)
+    assert results["Тема один"]['success']
+    assert not results["Без аудио"]['success']
+    assert results["Без аудио"]['errors'] == ["Аудиофайл для темы 'Без аудио' не найден"]
+
+
+def test_load_project_data_rereads_edited_sheet(project_manager, monkeypatch):
+    """Индекс тем в памяти не переживает загрузку: правка текста в таблице видна при следующей"""
+    monkeypatch.delenv(gsm.SHEETS_CACHE_ENV, raising=False)
+    rows = [["Тема", "Текст"], ["Тема один", "Старый текст"]]
+    sheets = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    sheets.sheet = _WorksheetStub(rows)
+    project_manager.sheets_manager = sheets
+    assert project_manager.load_project_data("Тема один")['text_data']['text'] == "Старый текст"
+
+    rows[1][1] = "Новый текст"
+    assert project_manager.load_project_data("Тема один")['text_data']['text'] == "Новый текст"
+    rows[1][1] = "Текст из async"
+    assert asyncio.run(project_manager.load_project_data_async("Тема один"))['text_data']['text'] == "Текст из async"
+    rows[1][1] = "Текст из load_many"
+    assert project_manager.load_many(["Тема один"])["Тема один"]['text_data']['text'] == "Текст из load_many"
+
+
+def test_load_many_fetches_themes_index_once(project_manager, monkeypatch):
+    monkeypatch.delenv(gsm.SHEETS_CACHE_ENV, raising=False)
+    sheets = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    sheets.sheet = _WorksheetStub([["Тема", "Текст"], ["Тема один", "Текст"], ["Без аудио", "Текст"]])
+    requested = []
+    get_theme_data = sheets.get_theme_data
+    monkeypatch.setattr(sheets, "get_theme_data", lambda theme: requested.append(theme) or get_theme_data(theme))
+    project_manager.sheets_manager = sheets
+
+    themes = ["Нет такой темы", "Тема один", "Без аудио"]
+    results = project_manager.load_many(themes, max_workers=4)
+    assert sheets.sheet.spreadsheet.batch_get_calls == 1
+    # Прогрев индекса идет напрямую: лишнего get_theme_data для первой темы нет
+    assert sorted(requested) == sorted(themes)
+    assert results["Тема один"]['success']
+    assert results["Нет такой темы"]['errors'][0] == "Текстовые данные для темы 'Нет такой темы' не найдены в Google Sheets"
+
+
+def test_load_many_short_circuits_on_index_failure(project_manager, monkeypatch):
+    monkeypatch.delenv(gsm.SHEETS_CACHE_ENV, raising=False)
+    sheets = gsm.GoogleSheetsManager("service_account.json", "spreadsheet-id")
+    sheets.sheet = _WorksheetStub([])
+    calls = []
+
+    def failing_batch_get(ranges, params=None):
+        calls.append(ranges)
+        raise ConnectionError("квота исчерпана")
+
+    sheets.sheet.spreadsheet.values_batch_get = failing_batch_get
+    project_manager.sheets_manager = sheets
+
+    results = project_manager.load_many(["Тема один", "Без аудио"], max_workers=4)
+    # Индекс запрашивается один раз, потоки не повторяют упавший запрос
+    assert len(calls) == 1
+    assert not results["Тема один"]['success']
+    assert results["Тема один"]['errors'] == ["Не удалось загрузить данные тем из Google Sheets: квота исчерпана"]
+    # Файлы ищутся как обычно
+    assert results["Тема один"]['audio_path'].endswith("Тема_один.mp3")
@@ -0,0 +1,79 @@
+"""Тесты logger_setup: файл лога открывается при первой записи, записи не задерживаются"""
+import logging
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import logger_setup
+
+
+def _record(message, level=logging.INFO):
+    return logging.LogRecord("test", level, __file__, 1, message, None, None)
+
+
+def test_deferred_file_handler_writes_through(tmp_path):
+    log_file = tmp_path / "logs" / "videocreator.log"
+    handler = logger_setup.DeferredFileHandler(log_file, logging.Formatter('%(levelname)s - %(message)s'))
+    try:
+        # Ни директория, ни файл не создаются до первой записи
+        assert not log_file.parent.exists()
+        handler.handle(_record("первая запись"))
+        # INFO попадает в файл сразу, без ожидания WARNING или закрытия
+        assert log_file.read_text(encoding="utf-8") == "INFO - первая запись\n"
+        handler.handle(_record("вторая запись", logging.DEBUG))
+        assert log_file.read_text(encoding="utf-8").splitlines()[-1] == "DEBUG - вторая запись"
+    finally:
+        handler.close()
+
+
+def test_deferred_file_handler_without_access(tmp_path, capsys):
+    blocker = tmp_path / "logs"
+    blocker.write_text("", encoding="utf-8")  # файл на месте директории логов
+    handler = logger_setup.DeferredFileHandler(blocker / "videocreator.log", logging.Formatter('%(message)s'))
+    try:
+        handler.handle(_record("запись"))
+        handler.handle(_record("еще запись"))
+        assert handler.file_handler_failed
+        # Ошибка открытия сообщается один раз
+        assert capsys.readouterr().err.count("Не удалось настроить файловый обработчик") == 1
+    finally:
+        handler.close()
+
+
+def test_setup_logger_writes_to_log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger_setup, "LOG_DIR", tmp_path / "logs")
+    name = "VideoCreatorTestLogger"
+    test_logger = logger_setup.setup_logger(name)
+    try:
+        test_logger.info("сообщение теста")
+        # stop() дожидается, пока фоновый поток запишет все записи из очереди
+        logger_setup._queue_listeners[name].stop()
+        log_text = (tmp_path / "logs" / logger_setup.LOG_FILE_NAME).read_text(encoding="utf-8")
+        assert "INFO - сообщение теста" in log_text
+    finally:
+        listener = logger_setup._queue_listeners.pop(name)
+        for handler in listener.handlers:
+            handler.close()
+        test_logger.handlers.clear()
+
+
+def test_import_creates_no_log_file(tmp_path):
+    """Импорт модуля (настройка логгера при импорте) не создает ни директорию, ни файл лога"""
+    shutil.copy(Path(logger_setup.__file__), tmp_path / "logger_setup.py")
+    subprocess.run([sys.executable, "-c", "import logger_setup"], cwd=tmp_path, check=True)
+    assert not (tmp_path / logger_setup.LOG_DIR_NAME).exists()
+
+
+def test_setup_logger_opens_file_on_first_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger_setup, "LOG_DIR", tmp_path / "logs")
+    name = "VideoCreatorLazyTestLogger"
+    test_logger = logger_setup.setup_logger(name)
+    try:
+        logger_setup._queue_listeners[name].stop()
+        assert not (tmp_path / "logs").exists()
+    finally:
+        listener = logger_setup._queue_listeners.pop(name)
+        for handler in listener.handlers:
+            handler.close()
+        test_logger.handlers.clear()
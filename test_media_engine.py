@@ -0,0 +1,363 @@
+"""Тесты media_engine: ресемплер Lanczos-3 на NumPy, клипы изображений и дисковый кэш формы волны"""
+import os
+import time
+import wave
+
+import moviepy
+import numpy as np
+import pytest
+
+import media_engine as me
+
+Image = pytest.importorskip("PIL.Image")
+
+# В корне репозитория - заглушка moviepy; декодированию аудио нужен установленный MoviePy 2
+requires_moviepy = pytest.mark.skipif(
+    not hasattr(moviepy, "AudioClip"), reason="нужен установленный MoviePy 2")
+
+
+def _test_images():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:240, 0:320]
+    gradient = np.stack([x * 255 // 319, y * 255 // 239, (x + y) % 256], axis=-1).astype(np.uint8)
+    blocks = np.where(((x // 40) + (y // 40))[..., None] % 2 == 0, 230, 20).repeat(3, axis=-1).astype(np.uint8)
+    return {
+        "noise": rng.integers(0, 256, (240, 320, 3), dtype=np.uint8),
+        "gradient": gradient,
+        "blocks": blocks,
+    }
+
+
+@pytest.mark.parametrize("image_name", ["noise", "gradient", "blocks"])
+@pytest.mark.parametrize("resolution", [(160, 120), (123, 77), (100, 180), (640, 360), (1280, 720)])
+def test_lanczos_resize_matches_pillow(image_name, resolution):
+    """Результат NumPy-пути совпадает с Pillow LANCZOS с точностью до округления"""
+    image = _test_images()[image_name]
+    new_w, new_h, src_box = me._fit_to_height(image.shape[1], image.shape[0], resolution)
+    expected = np.asarray(Image.fromarray(image).resize((new_w, new_h), Image.Resampling.LANCZOS, box=src_box))
+    actual = me._lanczos_resize(image, (new_w, new_h), src_box)
+
+    assert actual.shape == expected.shape and actual.dtype == np.uint8
+    difference = np.abs(actual.astype(np.int16) - expected)
+    # Pillow считает в фиксированной точке: на точных половинах округление может уйти на единицу в каждом проходе
+    assert difference.max() <= 2
+    assert difference.mean() < 0.5
+
+
+def test_lanczos_resize_same_size_is_identity():
+    image = _test_images()["noise"]
+    np.testing.assert_array_equal(me._lanczos_resize(image, (320, 240), (0, 0, 320, 240)), image)
+
+
+def test_preprocess_image_numpy_matches_pillow_path(tmp_path, monkeypatch):
+    """Резервная предобработка (imageio + NumPy) совпадает с путем через Pillow"""
+    pytest.importorskip("imageio.v2")
+    path = str(tmp_path / "image.png")
+    Image.fromarray(_test_images()["gradient"]).save(path)
+    resolution = (160, 180)
+
+    # Путь Pillow без OpenCV - тот же ресемплинг Lanczos
+    monkeypatch.setitem(me._optional_modules, "cv2", None)
+    pillow_result = me._preprocess_image(path, resolution)
+    numpy_result = me._preprocess_image_numpy(path, resolution)
+
+    assert numpy_result.shape == pillow_result.shape == (180, 160, 3)
+    assert np.abs(numpy_result.astype(np.int16) - pillow_result).max() <= 2
+
+
+def test_entry_validators_match_path_validators(tmp_path):
+    """validate_*_entry (обход os.scandir) принимают те же файлы, что и validate_*_file"""
+    for name in ("photo.jpg", "PHOTO.PNG", "scan.TiFf", "song.mp3", "voice.FLAC", "notes.txt", "noext", ".png", "archive.mp3.zip"):
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / "folder.png").mkdir()
+    (tmp_path / "folder.mp3").mkdir()
+    os.symlink(tmp_path / "photo.jpg", tmp_path / "link.jpg")
+    os.symlink(tmp_path / "nowhere.mp3", tmp_path / "broken.mp3")
+
+    with os.scandir(tmp_path) as entries:
+        entries = list(entries)
+    for entry in entries:
+        assert me.validate_image_entry(entry) == me.validate_image_file(entry.path), entry.name
+        assert me.validate_audio_entry(entry) == me.validate_audio_file(entry.path), entry.name
+    assert sorted(entry.name for entry in entries if me.validate_image_entry(entry)) == [
+        "PHOTO.PNG", "link.jpg", "photo.jpg", "scan.TiFf"]
+    assert sorted(entry.name for entry in entries if me.validate_audio_entry(entry)) == ["song.mp3", "voice.FLAC"]
+
+
+SLIDE_RESOLUTION = (320, 180)
+# (ширина, высота, цвет): альбомное шире кадра, портретное, квадратное и точно в размер кадра
+SLIDE_IMAGES = [(400, 200, (200, 30, 30)), (100, 300, (30, 200, 30)), (240, 240, (30, 30, 200)), (320, 180, (200, 200, 30))]
+
+
+def _write_slide_images(directory):
+    paths = []
+    for i, (width, height, color) in enumerate(SLIDE_IMAGES):
+        path = str(directory / f"slide{i}.png")
+        Image.new("RGB", (width, height), color).save(path)
+        paths.append(path)
+    return paths
+
+
+def _assert_slides(clips, duration):
+    target_w, target_h = SLIDE_RESOLUTION
+    assert len(clips) == len(SLIDE_IMAGES)
+    for clip, (width, height, color) in zip(clips, SLIDE_IMAGES):
+        assert tuple(clip.size) == SLIDE_RESOLUTION
+        assert clip.duration == pytest.approx(duration)
+        frame = clip.get_frame(0)
+        # Порядок клипов - порядок путей: в центре кадра цвет своего изображения
+        assert tuple(frame[target_h // 2, target_w // 2]) == color
+        # Изображение уже кадра по ширине центрируется на черном фоне
+        scaled_w = width * target_h // height
+        if scaled_w < target_w:
+            assert tuple(frame[target_h // 2, 0]) == (0, 0, 0)
+        else:
+            assert tuple(frame[target_h // 2, 0]) == color
+
+
+@requires_moviepy
+def test_create_image_clips_mixed_orientations(tmp_path, monkeypatch):
+    paths = _write_slide_images(tmp_path)
+    # Первые изображения обрабатываются дольше: результаты пула приходят не по порядку
+    preprocess_image = me._preprocess_image
+
+    def slow_preprocess(path, resolution):
+        time.sleep(0.05 * (len(paths) - paths.index(path)))
+        return preprocess_image(path, resolution)
+
+    monkeypatch.setattr(me, "_preprocess_image", slow_preprocess)
+    clips = me.create_image_clips(paths + [str(tmp_path / "missing.png")], SLIDE_RESOLUTION, 10, 24)
+    # Отсутствующий файл пропускается, длительность делится на все переданные пути
+    _assert_slides(clips, 10 / 5)
+    # Изображение точно в размер кадра и уже приведенные к высоте кадра не масштабируются и не собираются на фоне
+    assert [type(clip).__name__ for clip in clips] == ["ImageClip", "CompositeVideoClip", "CompositeVideoClip", "ImageClip"]
+
+
+@requires_moviepy
+def test_create_image_clips_without_preprocessing(tmp_path, monkeypatch):
+    """Если предобработка недоступна, MoviePy приводит исходные файлы к тем же кадрам"""
+    monkeypatch.setattr(me, "_preprocess_image", lambda path, resolution: path)
+    clips = me.create_image_clips(_write_slide_images(tmp_path), SLIDE_RESOLUTION, 8, 24)
+    _assert_slides(clips, 2)
+
+
+@pytest.mark.parametrize("sizes, expected_method", [
+    ([(320, 180), (320, 180), (320, 180)], "chain"),
+    ([(320, 180), (160, 180), (320, 180)], "compose"),
+])
+@requires_moviepy
+def test_create_slideshow_concat_method(sizes, expected_method, monkeypatch):
+    methods = []
+    concatenate_videoclips = moviepy.concatenate_videoclips
+
+    def recording_concatenate(clips, method="chain", **kwargs):
+        methods.append(method)
+        return concatenate_videoclips(clips, method=method, **kwargs)
+
+    monkeypatch.setattr(moviepy, "concatenate_videoclips", recording_concatenate)
+    colors = [(200, 30, 30), (30, 200, 30), (30, 30, 200)]
+    clips = [moviepy.ColorClip(size, color=color, duration=1) for size, color in zip(sizes, colors)]
+    slideshow = me.create_slideshow(clips, 6, 24)
+
+    assert methods == [expected_method]
+    assert slideshow.duration == pytest.approx(6)
+    assert tuple(slideshow.size) == (320, 180)
+    for i, (size, color) in enumerate(zip(sizes, colors)):
+        frame = slideshow.get_frame(2 * i + 1)
+        assert tuple(frame[90, 160]) == color
+        # Слайд меньшего размера выравнивается по центру черного кадра
+        assert tuple(frame[90, 0]) == (color if size[0] == 320 else (0, 0, 0))
+
+
+def _write_tone(path, duration, frequency=440, sample_rate=44100):
+    """Моно WAV с синусом амплитуды 0.5"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    samples = (0.5 * 32767 * np.sin(2 * np.pi * frequency * t)).astype("<i2")
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+
+
+@requires_moviepy
+def test_create_audio_track_order_and_skips(tmp_path, monkeypatch):
+    durations = {"a.wav": 1.0, "b.wav": 0.4, "d.wav": 1.0}
+    for name, duration in durations.items():
+        _write_tone(tmp_path / name, duration)
+    opened = []
+    audio_file_clip = moviepy.AudioFileClip
+
+    def slow_audio_file_clip(path, *args, **kwargs):
+        # Первый файл открывается дольше всех: результаты пула приходят не по порядку
+        time.sleep(0.2 if path.endswith("a.wav") else 0)
+        opened.append(os.path.basename(path))
+        return audio_file_clip(path, *args, **kwargs)
+
+    monkeypatch.setattr(moviepy, "AudioFileClip", slow_audio_file_clip)
+    tracks = [
+        {"path": str(tmp_path / "a.wav"), "start_time": 0.5},
+        {"path": str(tmp_path / "missing.wav"), "start_time": 0},
+        {"path": str(tmp_path / "b.wav")},
+        {"path": str(tmp_path / "d.wav"), "start_time": 2.5},  # начинается после конца видео
+        {"path": None},
+        {"path": str(tmp_path / "d.wav"), "start_time": 1.5},  # обрезается до 0.5 сек
+    ]
+    composite = me.create_audio_track(tracks, 2.0)
+
+    # Отсутствующие и начинающиеся после конца видео треки даже не открываются
+    assert sorted(opened) == ["a.wav", "b.wav", "d.wav"]
+    assert [clip.start for clip in composite.clips] == [0.5, 0.0, 1.5]
+    assert [clip.duration for clip in composite.clips] == pytest.approx([1.0, 0.4, 0.5], abs=0.01)
+    assert composite.duration == pytest.approx(2.0)
+
+    assert me.create_audio_track([{"path": str(tmp_path / "missing.wav")}], 2.0) is None
+    assert me.create_audio_track([], 2.0) is None
+
+
+@pytest.fixture
+def waveform_cache(tmp_path, monkeypatch):
+    """Кэш формы волны во временной папке и счетчик декодирований AudioFileClip"""
+    cache_dir = tmp_path / "waveforms"
+    monkeypatch.setattr(me, "WAVEFORM_CACHE_DIR", cache_dir)
+    decodes = []
+    audio_file_clip = moviepy.AudioFileClip
+
+    def counting_audio_file_clip(path, *args, **kwargs):
+        decodes.append(path)
+        return audio_file_clip(path, *args, **kwargs)
+
+    monkeypatch.setattr(moviepy, "AudioFileClip", counting_audio_file_clip)
+    return cache_dir, decodes
+
+
+@requires_moviepy
+def test_waveform_cache_reused(tmp_path, waveform_cache):
+    """Повторная загрузка читает .npy из кэша без декодирования"""
+    cache_dir, decodes = waveform_cache
+    audio_path = str(tmp_path / "tone.wav")
+    _write_tone(audio_path, 5.0)
+
+    amplitudes = me.load_waveform_amplitudes(audio_path)
+    assert len(decodes) == 1
+    assert amplitudes.dtype == np.float16 and amplitudes.ndim == 1
+    assert abs(len(amplitudes) - 5 * me.WAVEFORM_SAMPLE_RATE) <= 1
+    # Синус не теряется при понижении частоты: амплитуды не нулевые на всей длине файла
+    assert 0.3 < float(amplitudes.max()) <= 0.5
+    assert float(amplitudes[-len(amplitudes) // 4:].mean()) > 0.1
+    assert [f.suffix for f in cache_dir.iterdir()] == [".npy"]
+
+    cached = me.load_waveform_amplitudes(audio_path)
+    assert len(decodes) == 1
+    assert isinstance(cached, np.memmap)
+    np.testing.assert_array_equal(cached, amplitudes)
+
+
+@requires_moviepy
+def test_waveform_cache_invalidated_on_mtime_change(tmp_path, waveform_cache):
+    """Изменение времени модификации файла приводит к повторному декодированию"""
+    cache_dir, decodes = waveform_cache
+    audio_path = str(tmp_path / "tone.wav")
+    _write_tone(audio_path, 0.5)
+    me.load_waveform_amplitudes(audio_path)
+
+    stat = os.stat(audio_path)
+    os.utime(audio_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    me.load_waveform_amplitudes(audio_path)
+    assert len(decodes) == 2
+    assert len(list(cache_dir.glob("*.npy"))) == 2
+
+    me.load_waveform_amplitudes(audio_path)
+    assert len(decodes) == 2
+
+
+@requires_moviepy
+def test_waveform_cache_invalidated_on_size_change(tmp_path, waveform_cache):
+    """Файл другого размера с тем же mtime не отдается из старого кэша"""
+    cache_dir, decodes = waveform_cache
+    audio_path = str(tmp_path / "tone.wav")
+    _write_tone(audio_path, 0.5)
+    short = me.load_waveform_amplitudes(audio_path)
+    mtime_ns = os.stat(audio_path).st_mtime_ns
+
+    _write_tone(audio_path, 1.0)
+    os.utime(audio_path, ns=(mtime_ns, mtime_ns))
+    longer = me.load_waveform_amplitudes(audio_path)
+    assert len(decodes) == 2
+    assert len(longer) > len(short)
+
+
+@requires_moviepy
+def test_waveform_cache_keyed_by_sample_rate(tmp_path, waveform_cache):
+    """Разные частоты дискретизации кэшируются отдельно"""
+    cache_dir, decodes = waveform_cache
+    audio_path = str(tmp_path / "tone.wav")
+    _write_tone(audio_path, 0.5)
+
+    default_rate = me.load_waveform_amplitudes(audio_path)
+    half_rate = me.load_waveform_amplitudes(audio_path, sample_rate=me.WAVEFORM_SAMPLE_RATE // 2)
+    assert len(decodes) == 2
+    assert abs(len(half_rate) - len(default_rate) / 2) <= 1
+
+
+@requires_moviepy
+def test_waveform_cache_corrupted_file_is_rewritten(tmp_path, waveform_cache):
+    """Поврежденный .npy декодируется заново и перезаписывается, временных файлов не остается"""
+    cache_dir, decodes = waveform_cache
+    audio_path = str(tmp_path / "tone.wav")
+    _write_tone(audio_path, 0.5)
+    amplitudes = me.load_waveform_amplitudes(audio_path)
+    (cache_file,) = cache_dir.iterdir()
+    cache_file.write_bytes(b"not a numpy file")
+
+    np.testing.assert_array_equal(me.load_waveform_amplitudes(audio_path), amplitudes)
+    assert len(decodes) == 2
+    assert list(cache_dir.iterdir()) == [cache_file]
+    np.testing.assert_array_equal(np.load(cache_file), amplitudes)
+
+
+@requires_moviepy
+def test_waveform_cache_unwritable_dir(tmp_path, monkeypatch, waveform_cache):
+    """Недоступная для записи папка кэша не мешает получить амплитуды"""
+    blocker = tmp_path / "blocker"
+    blocker.write_text("файл вместо папки")
+    monkeypatch.setattr(me, "WAVEFORM_CACHE_DIR", blocker / "waveforms")
+    audio_path = str(tmp_path / "tone.wav")
+    _write_tone(audio_path, 0.5)
+
+    amplitudes = me.load_waveform_amplitudes(audio_path)
+    assert amplitudes.dtype == np.float16 and len(amplitudes) > 0
+
+
+@requires_moviepy
+def test_waveform_cache_prunes_least_recently_used(tmp_path, monkeypatch, waveform_cache):
+    """Сверх предела размера удаляются файлы кэша, которые дольше всех не использовались"""
+    cache_dir, decodes = waveform_cache
+    paths = []
+    for name in ("first", "second", "third"):
+        path = str(tmp_path / f"{name}.wav")
+        _write_tone(path, 0.5)
+        paths.append(path)
+
+    me.load_waveform_amplitudes(paths[0])
+    first_file, = cache_dir.iterdir()
+    # Помещаются ровно два файла одинакового размера
+    monkeypatch.setattr(me, "WAVEFORM_CACHE_MAX_BYTES", 2 * first_file.stat().st_size)
+    # Явные метки времени: порядок использования не зависит от точности часов ФС
+    os.utime(first_file, ns=(1, 1))
+    me.load_waveform_amplitudes(paths[1])
+    second_file, = set(cache_dir.iterdir()) - {first_file}
+    os.utime(second_file, ns=(2, 2))
+
+    # Попадание в кэш обновляет время использования: теперь дольше всех не использовался второй файл
+    me.load_waveform_amplitudes(paths[0])
+    assert first_file.stat().st_mtime_ns > 2
+    me.load_waveform_amplitudes(paths[2])
+    assert len(decodes) == 3
+    assert first_file.exists() and not second_file.exists()
+    assert len(list(cache_dir.glob("*.npy"))) == 2
+
+    # Только что записанный файл сохраняется, даже если один превышает предел
+    monkeypatch.setattr(me, "WAVEFORM_CACHE_MAX_BYTES", 0)
+    me.load_waveform_amplitudes(paths[1])
+    assert [f.suffix for f in cache_dir.iterdir()] == [".npy"]
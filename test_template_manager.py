@@ -0,0 +1,198 @@
+"""Тесты template_manager: кэш списка шаблонов, атомарная запись, orjson"""
+import json
+import os
+
+import pytest
+
+import template_manager as tm
+
+
+@pytest.fixture
+def templates_dir(tmp_path, monkeypatch):
+    """Директория шаблонов во временной папке с пустым кэшем"""
+    directory = tmp_path / "saved_templates"
+    monkeypatch.setattr(tm, "TEMPLATES_DIR", directory)
+    monkeypatch.setattr(tm, "_templates_dir_ready", None)
+    monkeypatch.setattr(tm, "_TEMPLATE_CACHE", {})
+    return directory
+
+
+@pytest.fixture
+def json_reads(monkeypatch):
+    """Пути файлов, прочитанных _read_json"""
+    read_paths = []
+    original_read_json = tm._read_json
+
+    def counting_read_json(path):
+        read_paths.append(os.path.basename(path))
+        return original_read_json(path)
+
+    monkeypatch.setattr(tm, "_read_json", counting_read_json)
+    return read_paths
+
+
+def _write_raw_template(directory, stem, name):
+    path = directory / f"{stem}.json"
+    path.write_text(f'{{"name": "{name}"}}', encoding="utf-8")
+    return path
+
+
+def test_saved_templates_cache_rereads_only_changed_files(templates_dir, json_reads):
+    tm.ensure_templates_dir_exists()
+    first = _write_raw_template(templates_dir, "first", "Первый")
+    second = _write_raw_template(templates_dir, "second", "Второй")
+
+    expected = [{"filename_stem": "second", "display_name": "Второй"},
+                {"filename_stem": "first", "display_name": "Первый"}]
+    assert tm.get_saved_templates() == expected
+    assert sorted(json_reads) == ["first.json", "second.json"]
+
+    # Без изменений файлы не перечитываются
+    json_reads.clear()
+    assert tm.get_saved_templates() == expected
+    assert json_reads == []
+
+    # Изменился размер
+    first.write_text('{"name": "Первый шаблон"}', encoding="utf-8")
+    assert {"filename_stem": "first", "display_name": "Первый шаблон"} in tm.get_saved_templates()
+    assert json_reads == ["first.json"]
+
+    # Размер тот же, изменилось только время модификации
+    json_reads.clear()
+    second.write_text('{"name": "Вторый"}', encoding="utf-8")
+    stat = second.stat()
+    os.utime(second, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert {"filename_stem": "second", "display_name": "Вторый"} in tm.get_saved_templates()
+    assert json_reads == ["second.json"]
+
+
+def test_saved_templates_cache_drops_deleted_files(templates_dir):
+    tm.ensure_templates_dir_exists()
+    kept = _write_raw_template(templates_dir, "kept", "Оставить")
+    removed = _write_raw_template(templates_dir, "removed", "Удалить")
+    tm.get_saved_templates()
+    assert set(tm._TEMPLATE_CACHE) == {str(kept), str(removed)}
+
+    removed.unlink()
+    assert tm.get_saved_templates() == [{"filename_stem": "kept", "display_name": "Оставить"}]
+    assert set(tm._TEMPLATE_CACHE) == {str(kept)}
+
+
+def test_save_template_primes_cache(templates_dir, json_reads):
+    assert tm.save_template({"duration": 10}, " Новый шаблон ")
+    assert tm.get_saved_templates() == [{"filename_stem": "новый_шаблон", "display_name": "Новый шаблон"}]
+    assert json_reads == []
+
+
+def test_save_template_is_atomic(templates_dir, monkeypatch):
+    assert tm.save_template({"duration": 10}, "Шаблон")
+    path = templates_dir / "шаблон.json"
+    original = path.read_bytes()
+
+    def failing_fsync(fd):
+        raise OSError("диск заполнен")
+
+    # Сбой посреди записи: прежний файл не поврежден, временный удален
+    with monkeypatch.context() as patch:
+        patch.setattr(tm.os, "fsync", failing_fsync)
+        assert not tm.save_template({"duration": 20}, "Шаблон")
+    assert path.read_bytes() == original
+    assert sorted(os.listdir(templates_dir)) == ["шаблон.json"]
+
+    assert tm.save_template({"duration": 30}, "Шаблон")
+    assert tm.load_template("шаблон")["duration"] == 30
+    assert sorted(os.listdir(templates_dir)) == ["шаблон.json"]
+
+
+def test_save_template_recreates_removed_dir(templates_dir):
+    assert tm.save_template({"duration": 10}, "Первый")
+    for name in os.listdir(templates_dir):
+        os.remove(templates_dir / name)
+    templates_dir.rmdir()
+    assert tm.save_template({"duration": 20}, "Второй")
+    assert tm.load_template("второй") == {"duration": 20, "name": "Второй"}
+
+
+def test_save_templates_batch(templates_dir, caplog):
+    templates = [
+        ({"duration": 1}, "Первый"),
+        ({"duration": 2}, "  "),
+        ({"duration": 3}, "Второй"),
+        ({"duration": 4}, " первый "),  # то же имя файла, что у "Первый": сохраняется последний
+        ({"duration": 5}, ""),
+    ]
+    with caplog.at_level("INFO"):
+        assert tm.save_templates_batch(templates, max_workers=2) == 2
+    assert sorted(os.listdir(templates_dir)) == ["второй.json", "первый.json"]
+    assert tm.load_template("первый") == {"duration": 4, "name": "первый"}
+    assert "Пропущено шаблонов с повторяющимся именем файла (сохранен последний): 1." in caplog.text
+    assert "сохранено 2 из 2 файлов." in caplog.text
+
+    assert tm.save_templates_batch([]) == 0
+    assert tm.save_templates_batch([({}, " ")]) == 0
+
+
+def test_save_templates_batch_partial_failure(templates_dir, monkeypatch, caplog):
+    atomic_write_bytes = tm._atomic_write_bytes
+
+    def failing_write(filepath, data):
+        if os.path.basename(filepath) == "сбой.json":
+            raise OSError("диск заполнен")
+        return atomic_write_bytes(filepath, data)
+
+    monkeypatch.setattr(tm, "_atomic_write_bytes", failing_write)
+    with caplog.at_level("INFO"):
+        assert tm.save_templates_batch([({}, "Сбой"), ({}, "Успех"), ({}, "Еще")]) == 2
+    assert sorted(os.listdir(templates_dir)) == ["еще.json", "успех.json"]
+    assert "сохранено 2 из 3 файлов." in caplog.text
+    assert "Пропущено шаблонов" not in caplog.text
+
+
+TEMPLATE_SETTINGS = {
+    "resolution": [1920, 1080], "duration": 30.5, "title_text": "Заголовок «в кавычках»\nвторая строка",
+    "effects": {"typewriter": False, "fade": True}, "font_path": None,
+    "audio_tracks_info": [{"path": "./audio/фон.mp3", "start_time": 1.25}], 1: "числовой ключ",
+}
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_json_fast_path_matches_stdlib(use_orjson, monkeypatch):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    monkeypatch.setattr(tm, "ORJSON_AVAILABLE", use_orjson)
+    # Ключи не-строки сохраняются как строки - так же, как в стандартном json
+    expected = json.loads(json.dumps(TEMPLATE_SETTINGS, ensure_ascii=False))
+    assert json.loads(tm._json_dumps(TEMPLATE_SETTINGS).decode("utf-8")) == expected
+
+
+def test_json_backends_write_identical_files(monkeypatch):
+    """Файл шаблона не меняет формат в зависимости от того, установлен ли orjson"""
+    pytest.importorskip("orjson")
+    settings = dict(TEMPLATE_SETTINGS, empty_list=[], empty_dict={}, nested=[[1, 2], {"a": None}])
+    monkeypatch.setattr(tm, "ORJSON_AVAILABLE", True)
+    orjson_bytes = tm._json_dumps(settings)
+    monkeypatch.setattr(tm, "ORJSON_AVAILABLE", False)
+    assert tm._json_dumps(settings) == orjson_bytes
+
+
+@pytest.mark.parametrize("write_orjson, read_orjson", [(True, False), (False, True), (True, True)])
+def test_templates_compatible_between_json_backends(write_orjson, read_orjson, templates_dir, monkeypatch):
+    pytest.importorskip("orjson")
+    monkeypatch.setattr(tm, "ORJSON_AVAILABLE", write_orjson)
+    assert tm.save_template(TEMPLATE_SETTINGS, "Совместимость")
+    monkeypatch.setattr(tm, "ORJSON_AVAILABLE", read_orjson)
+    monkeypatch.setattr(tm, "_TEMPLATE_CACHE", {})
+    loaded = tm.load_template("совместимость")
+    assert loaded["title_text"] == TEMPLATE_SETTINGS["title_text"]
+    assert loaded["audio_tracks_info"] == TEMPLATE_SETTINGS["audio_tracks_info"]
+    assert loaded["1"] == "числовой ключ"
+    assert tm.get_saved_templates() == [{"filename_stem": "совместимость", "display_name": "Совместимость"}]
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_unserializable_template_not_saved(use_orjson, templates_dir, monkeypatch):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    monkeypatch.setattr(tm, "ORJSON_AVAILABLE", use_orjson)
+    assert not tm.save_template({"value": object()}, "Ошибка")
+    assert os.listdir(templates_dir) == []
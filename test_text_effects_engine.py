@@ -0,0 +1,246 @@
+"""Тесты text_effects_engine: кэш шрифта, статичный текст через PIL, компоновка и запись видео"""
+import json
+import platform
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import moviepy
+from moviepy import ColorClip, CompositeVideoClip
+
+import text_effects_engine as tee
+
+# В корне репозитория - заглушка moviepy; тестам отрисовки нужен установленный MoviePy 2
+requires_moviepy = pytest.mark.skipif(
+    not hasattr(moviepy, "VideoClip"), reason="нужен установленный MoviePy 2")
+
+RESOLUTION = (640, 360)
+BACKGROUND_COLOR = (30, 60, 90)
+
+
+def _ink_rows(frame):
+    """Строки кадра, в которых есть пиксели, отличные от фона"""
+    return np.flatnonzero((frame != BACKGROUND_COLOR).any(axis=(1, 2)))
+
+
+class _ProbeTextClip:
+    """Вместо TextClip при пробе шрифтов: принимает только шрифты из available"""
+    available = set()
+    probed = []
+
+    def __init__(self, text, font, font_size, color):
+        self.probed.append(font)
+        if font not in self.available:
+            raise ValueError(f"шрифт {font} недоступен")
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fonts_dir(tmp_path):
+    """Файлы шрифтов-пустышек: в font.json хранится путь к существующему файлу"""
+    fonts = tmp_path / "fonts"
+    fonts.mkdir()
+    for name in ("DejaVu Sans", "Liberation Sans", "Ubuntu", "Arial", "Other", "Cached"):
+        (fonts / f"{name}.ttf").write_bytes(b"")
+    return fonts
+
+
+@pytest.fixture
+def font_cache(tmp_path, fonts_dir, monkeypatch):
+    """font.json во временной папке, проба шрифтов Linux без обращения к системе"""
+    cache_file = tmp_path / "cache" / "font.json"
+    monkeypatch.setattr(tee, "FONT_CACHE_FILE", cache_file)
+    monkeypatch.setattr(tee.platform, "system", lambda: "Linux")
+    monkeypatch.setattr(tee, "_resolve_font_file", lambda name: str(fonts_dir / f"{name}.ttf"))
+    monkeypatch.setattr(tee, "TextClip", _ProbeTextClip)
+    monkeypatch.setattr(_ProbeTextClip, "available", {str(fonts_dir / "Liberation Sans.ttf")})
+    monkeypatch.setattr(_ProbeTextClip, "probed", [])
+    tee.get_system_font_for_cyrillic.cache_clear()
+    yield cache_file
+    tee.get_system_font_for_cyrillic.cache_clear()
+
+
+def test_font_probe_result_cached_on_disk(font_cache, fonts_dir):
+    liberation = str(fonts_dir / "Liberation Sans.ttf")
+    assert tee.get_system_font_for_cyrillic() == liberation
+    assert _ProbeTextClip.probed == [str(fonts_dir / "DejaVu Sans.ttf"), liberation]
+    assert json.loads(font_cache.read_text(encoding="utf-8")) == {platform.platform(): liberation}
+    # Временный файл после записи не остается
+    assert [path.name for path in font_cache.parent.iterdir()] == ["font.json"]
+
+    # В том же процессе - lru_cache, в новом - font.json; проба не повторяется
+    assert tee.get_system_font_for_cyrillic() == liberation
+    tee.get_system_font_for_cyrillic.cache_clear()
+    assert tee.get_system_font_for_cyrillic() == liberation
+    assert len(_ProbeTextClip.probed) == 2
+
+
+def test_font_cache_keyed_by_platform(font_cache, fonts_dir):
+    liberation, other = str(fonts_dir / "Liberation Sans.ttf"), str(fonts_dir / "Other.ttf")
+    font_cache.parent.mkdir()
+    font_cache.write_text(json.dumps({"Other-Platform": other}), encoding="utf-8")
+    assert tee.get_system_font_for_cyrillic() == liberation
+    # Запись другой платформы сохраняется рядом с новой
+    assert json.loads(font_cache.read_text(encoding="utf-8")) == {
+        "Other-Platform": other, platform.platform(): liberation}
+
+    tee.get_system_font_for_cyrillic.cache_clear()
+    font_cache.write_text(json.dumps({platform.platform(): str(fonts_dir / "Cached.ttf")}), encoding="utf-8")
+    assert tee.get_system_font_for_cyrillic() == str(fonts_dir / "Cached.ttf")
+
+
+@pytest.mark.parametrize("content", ["{не json", "[]", '{"%s": ""}' % platform.platform()])
+def test_font_cache_invalid_content_probes_again(content, font_cache, fonts_dir):
+    liberation = str(fonts_dir / "Liberation Sans.ttf")
+    font_cache.parent.mkdir()
+    font_cache.write_text(content, encoding="utf-8")
+    assert tee.get_system_font_for_cyrillic() == liberation
+    assert json.loads(font_cache.read_text(encoding="utf-8"))[platform.platform()] == liberation
+
+
+def test_font_cache_missing_file_probes_again(font_cache, fonts_dir):
+    """Файл шрифта из кэша удален (удаление шрифта, обновление ОС): проба повторяется"""
+    liberation = str(fonts_dir / "Liberation Sans.ttf")
+    font_cache.parent.mkdir()
+    font_cache.write_text(json.dumps({platform.platform(): str(fonts_dir / "Removed.ttf")}), encoding="utf-8")
+    assert tee.get_system_font_for_cyrillic() == liberation
+    assert json.loads(font_cache.read_text(encoding="utf-8"))[platform.platform()] == liberation
+
+    # Имя шрифта без пути (путь к файлу не был найден при пробе) берется из кэша как есть
+    tee.get_system_font_for_cyrillic.cache_clear()
+    font_cache.write_text(json.dumps({platform.platform(): "Liberation Sans"}), encoding="utf-8")
+    assert tee.get_system_font_for_cyrillic() == "Liberation Sans"
+    assert len(_ProbeTextClip.probed) == 2
+
+
+def test_font_not_found_is_not_cached(font_cache, monkeypatch):
+    monkeypatch.setattr(_ProbeTextClip, "available", set())
+    assert tee.get_system_font_for_cyrillic() is None
+    assert not font_cache.exists()
+
+
+@requires_moviepy
+@pytest.mark.parametrize("text, font_size, stroke_width", [
+    ("Заголовок", 40, 2),
+    ("Очень длинный заголовок, который точно не поместится в одну строку на экране", 40, 2),
+    ("Безпробеловдлиннаястрокакотораянепомещаетсяникакимобразомвширину" * 2, 36, 1),
+    ("Две строки\nвторая строка тоже длинная длинная длинная длинная длинная длинная", 24, 0),
+])
+@pytest.mark.parametrize("position", [('center', 50), ('center', RESOLUTION[1] - 200)])
+def test_static_text_matches_textclip(text, font_size, stroke_width, position):
+    """Перенос строк и положение текста на кадре совпадают с TextClip(method='caption')"""
+    engine = tee.TextEffectsEngine()
+    box_width = engine._text_box_width(RESOLUTION)
+    text_clip = engine._build_text_clip(
+        text, None, font_size, "#ffffff", "#000000", stroke_width, box_width, position, 24)
+    raster = engine._render_text_frame(text, None, font_size, "#ffffff", "#000000", stroke_width, box_width)
+    image_clip = engine._text_clip_from_frame(raster, RESOLUTION, position, 1, 24)
+
+    lines = engine._wrap_text_lines(text, tee._cached_font(None, font_size), box_width, stroke_width)
+    wrapped = "\n".join(lines)
+    assert wrapped.count("\n") == text_clip.text.count("\n")
+    assert wrapped == text_clip.text
+
+    background = ColorClip(RESOLUTION, BACKGROUND_COLOR, duration=1)
+    expected = CompositeVideoClip([background, text_clip.with_duration(1)], size=RESOLUTION).get_frame(0)
+    actual = CompositeVideoClip([background, image_clip], size=RESOLUTION).get_frame(0)
+
+    expected_rows, actual_rows = _ink_rows(expected), _ink_rows(actual)
+    assert (actual_rows[0], actual_rows[-1]) == (expected_rows[0], expected_rows[-1])
+    np.testing.assert_array_equal(actual, expected)
+
+
+@requires_moviepy
+def test_write_video_with_parallel_audio(tmp_path):
+    """Видео и аудио записываются параллельно и объединяются; временные файлы удаляются"""
+    from moviepy import AudioClip
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    output_path = str(tmp_path / "out.mp4")
+    temp_audio_path = str(tmp_path / "out_temp_audio.m4a")
+    video = ColorClip(RESOLUTION, BACKGROUND_COLOR, duration=1)
+    audio = AudioClip(lambda t: np.sin(2 * np.pi * 440 * t), duration=1, fps=44100)
+    write_params = {
+        "fps": 24, "codec": "libx264", "preset": "ultrafast", "logger": None,
+        "audio_codec": "aac", "audio_bitrate": "64k", "audio_fps": 22050,
+        "temp_audiofile": temp_audio_path, "remove_temp": True,
+    }
+
+    tee._write_video_with_parallel_audio(video, audio, output_path, temp_audio_path, write_params)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out.mp4"]
+    infos = ffmpeg_parse_infos(output_path)
+    assert infos["video_found"] and infos["audio_found"]
+    # Параметры audio_* передаются в write_audiofile
+    assert infos["audio_fps"] == 22050
+    assert infos["duration"] == pytest.approx(1, abs=0.1)
+
+
+@requires_moviepy
+def test_composite_into_buffer_matches_composite_video_clip():
+    """Кадры собственного компоновщика совпадают с CompositeVideoClip попиксельно"""
+    from moviepy import ImageClip
+
+    from media_engine import create_slideshow
+
+    engine = tee.TextEffectsEngine()
+    box_width = engine._text_box_width(RESOLUTION)
+    rng = np.random.default_rng(0)
+    slides = [ImageClip(rng.integers(0, 256, (RESOLUTION[1], RESOLUTION[0], 3), dtype=np.uint8)) for _ in range(2)]
+    slideshow = create_slideshow(slides, 2, 24)
+
+    raster = engine._render_text_frame("Заголовок слайдшоу", None, 40, "#ffcc00", "#000000", 2, box_width)
+    title = engine._text_clip_from_frame(raster, RESOLUTION, ('center', 50), 2, 24)
+    subtitle = engine._apply_fade_effect(engine._build_text_clip(
+        "Субтитры с появлением", None, 24, "#ffffff", "#202020", 1, box_width, ('center', RESOLUTION[1] - 60), 24), 2)
+    # Слой частично за краем кадра
+    corner = engine._text_clip_from_frame(raster, RESOLUTION, (-40, -10), 2, 24)
+    overlays = [title, subtitle, corner]
+
+    expected_clip = CompositeVideoClip([slideshow] + overlays, size=RESOLUTION)
+    actual_clip = tee._composite_into_buffer(slideshow, overlays, RESOLUTION, 2)
+    for t in (0.0, 0.3, 0.99, 1.0, 1.5, 1.9):
+        np.testing.assert_array_equal(actual_clip.get_frame(t), expected_clip.get_frame(t))
+
+
+def _canonical(settings):
+    """Сравнение с учетом типов (1 и 1.0, True и 1) и NaN"""
+    return repr(sorted(settings.items()))
+
+
+@pytest.mark.parametrize("settings", [
+    tee.get_default_settings(),
+    {},
+    {"text_color": "#A1b2C3", "stroke_width": 0, "title_size": 100, "subtitle_size": 8, "fps": 60,
+     "video_quality": "high", "codec_name": "libx265", "effects": {"fade": True},
+     "audio_tracks_info": [{"path": "a.mp3", "start_time": 1}, {"path": "b.mp3"}],
+     "resolution": [1280, 720], "title_text": "Заголовок"},
+    {"text_color": "red", "stroke_color": "#0000001", "stroke_width": 11, "title_size": 5, "subtitle_size": 80.5},
+    {"stroke_width": True, "title_size": "40", "subtitle_size": None, "fps": True, "video_quality": "ultra"},
+    {"title_size": float("nan"), "fps": "30", "codec_name": "LIBX264", "effects": {"typewriter": 1, "fade": ""}},
+    {"effects": ["fade"], "audio_tracks_info": ["a.mp3", {"path": 1}, {"path": "b.mp3", "start_time": -2},
+                                                 {"path": "c.mp3", "start_time": "x"}, 5]},
+    {"audio_tracks_info": "a.mp3", "codec_name": None},
+    {"audio_tracks_info": [OrderedDict(path="a", start_time=1)]},
+    {"audio_tracks_info": [OrderedDict(path="a", start_time=-1), {"path": "b"}, 7]},
+])
+def test_validate_settings_msgspec_matches_field_checks(settings, monkeypatch):
+    """Быстрая проверка схемой msgspec дает тот же результат, что и проверка по полям"""
+    pytest.importorskip("msgspec")
+    monkeypatch.setattr(tee, "MSGSPEC_AVAILABLE", True)
+    fast = tee.validate_settings(settings)
+    monkeypatch.setattr(tee, "MSGSPEC_AVAILABLE", False)
+    slow = tee.validate_settings(settings)
+    assert _canonical(fast) == _canonical(slow)
+
+
+def test_valid_settings_take_msgspec_path():
+    """Корректные настройки проходят схему целиком, без поэлементной проверки"""
+    msgspec = pytest.importorskip("msgspec")
+    if not tee.MSGSPEC_AVAILABLE:
+        pytest.skip("схема msgspec не создана")
+    for settings in (tee.get_default_settings(), {}, {"fps": 24, "audio_tracks_info": [{"path": "a.mp3", "start_time": 0.5}]}):
+        msgspec.convert(settings, tee._SettingsSchema)
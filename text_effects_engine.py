@@ -5,15 +5,23 @@ text_effects_engine.py - Модуль визуальных эффектов дл
 ИСПРАВЛЕНО: Добавлена логика выбора шрифтов для macOS и включено аудио обратно
 """
 
+import bisect
+import copy
+import json
 import os
+import shutil
+import subprocess
 import sys
 import platform
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Union
 
 from moviepy import (
     TextClip, CompositeVideoClip, ColorClip,
-    concatenate_videoclips, AudioFileClip, ImageClip, CompositeAudioClip
+    AudioFileClip, ImageClip, CompositeAudioClip
 )
 
 from media_engine import (
@@ -21,10 +29,122 @@ from media_engine import (
 )
 from logger_setup import logger
 
+try:
+    import msgspec
+    from typing import Annotated, Literal
+
+    class _EffectsSchema(msgspec.Struct):
+        typewriter: bool = False
+        fade: bool = False
+
+    class _AudioTrackSchema(msgspec.Struct):
+        path: str
+        start_time: Annotated[float, msgspec.Meta(ge=0)] = 0.0
+
+    class _SettingsSchema(msgspec.Struct, kw_only=True):
+        """Допустимые значения настроек (совпадают с проверками validate_settings); неизвестные поля пропускаются."""
+        text_color: Annotated[str, msgspec.Meta(pattern=r'^#[0-9a-fA-F]{6}\Z')] = "#ffffff"
+        stroke_color: Annotated[str, msgspec.Meta(pattern=r'^#[0-9a-fA-F]{6}\Z')] = "#000000"
+        stroke_width: Annotated[int, msgspec.Meta(ge=0, le=10)] = 2
+        title_size: Annotated[int, msgspec.Meta(ge=10, le=100)] = 40
+        subtitle_size: Annotated[int, msgspec.Meta(ge=8, le=80)] = 24
+        effects: _EffectsSchema = msgspec.field(default_factory=_EffectsSchema)
+        # Отсутствующие fps и video_quality validate_settings не добавляет - UNSET не попадает в to_builtins
+        fps: Union[Literal[24, 30, 60], msgspec.UnsetType] = msgspec.UNSET
+        video_quality: Union[Literal["high", "medium", "low"], msgspec.UnsetType] = msgspec.UNSET
+        codec_name: Literal["libx264", "libx265"] = "libx264"
+        audio_tracks_info: List[_AudioTrackSchema] = []
+
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# Межстрочный интервал TextClip по умолчанию (параметр interline в MoviePy 2)
+TEXTCLIP_INTERLINE = 4
+
+# Найденный шрифт для кириллицы сохраняется между запусками, чтобы не повторять пробу TextClip
+FONT_CACHE_FILE = Path.home() / ".cache" / "videocreator" / "font.json"
+
+# Цвет в формате #RRGGBB
+_HEX_RE = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+def _read_font_cache() -> Dict[str, Any]:
+    try:
+        with open(FONT_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_font_cache(platform_key: str, font: str) -> None:
+    """Запомнить найденный шрифт для данной платформы"""
+    cache = _read_font_cache()
+    cache[platform_key] = font
+    try:
+        FONT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        # Через временный файл и os.replace: другой процесс не прочитает наполовину записанный JSON
+        temp_file = FONT_CACHE_FILE.with_name(f"{FONT_CACHE_FILE.stem}.{os.getpid()}.tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_file, FONT_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Не удалось записать кэш шрифта {FONT_CACHE_FILE}: {e}")
+
+
+def _resolve_font_file(font_name: str) -> Optional[str]:
+    """
+    Абсолютный путь к файлу шрифта по его имени. С одним только именем PIL при каждом
+    ImageFont.truetype() заново обходит системные каталоги шрифтов (os.walk); путь к файлу
+    открывается сразу. Семейства с пробелами ("DejaVu Sans") ищутся через fc-match, если он есть.
+    """
+    from PIL import ImageFont
+    try:
+        font_file = getattr(ImageFont.truetype(font_name, 12), 'path', None)
+        if isinstance(font_file, str) and os.path.isfile(font_file):
+            return os.path.abspath(font_file)
+    except Exception:
+        pass
+
+    fc_match = shutil.which("fc-match")
+    if not fc_match:
+        return None
+    try:
+        result = subprocess.run(
+            [fc_match, "-f", "%{family}\n%{file}", font_name],
+            capture_output=True, text=True, timeout=5, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    families, _, font_file = result.stdout.partition("\n")
+    # fc-match всегда возвращает хоть какой-то шрифт: принимаем только совпадение по семейству
+    if font_name.lower() not in (family.strip().lower() for family in families.split(",")):
+        return None
+    return font_file.strip() if os.path.isfile(font_file.strip()) else None
+
+
+@lru_cache(maxsize=32)
+def _cached_font(font_path: Optional[str], font_size: int) -> Any:
+    """Объект шрифта PIL по (путь, размер); файл шрифта разбирается FreeType один раз на процесс"""
+    from PIL import ImageFont
+    return ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default(font_size)
+
+
+@lru_cache(maxsize=1)
 def get_system_font_for_cyrillic():
     """
-    Определяет доступный системный шрифт для поддержки кириллицы
+    Определяет доступный системный шрифт для поддержки кириллицы.
+    Проба выполняется не чаще раза за процесс; найденный шрифт кэшируется на диске по platform.platform().
     """
+    platform_key = platform.platform()
+    cached_font = _read_font_cache().get(platform_key)
+    if isinstance(cached_font, str) and cached_font:
+        # Файл шрифта мог исчезнуть (удаление шрифта, обновление ОС) - тогда шрифт определяется заново
+        if not os.path.isabs(cached_font) or os.path.isfile(cached_font):
+            logger.info(f"Шрифт для кириллицы взят из кэша {FONT_CACHE_FILE}: {cached_font}")
+            return cached_font
+        logger.info(f"Файл шрифта из кэша не найден: {cached_font}. Шрифт определяется заново")
+
     system = platform.system()
     
     if system == "Darwin":  # macOS
@@ -54,12 +174,15 @@ def get_system_font_for_cyrillic():
         ]
     
     # Тестируем каждый шрифт
-    for font in possible_fonts:
+    for font_name in possible_fonts:
+        # Дальше используется путь к файлу шрифта, если его удалось определить
+        font = _resolve_font_file(font_name) or font_name
         try:
             # Пробуем создать тестовый TextClip с кириллицей
             test_clip = TextClip(text="Тест", font=font, font_size=12, color='white')
             test_clip.close()  # Сразу закрываем тестовый клип
             logger.info(f"Найден рабочий шрифт для кириллицы: {font}")
+            _write_font_cache(platform_key, font)
             return font
         except Exception as e:
             logger.debug(f"Шрифт {font} недоступен: {e}")
@@ -69,172 +192,253 @@ def get_system_font_for_cyrillic():
     logger.warning("Не найден подходящий шрифт для кириллицы, используется системный по умолчанию")
     return None
 
+
+def validate_color(color: str) -> bool:
+    """Проверка цвета формата #RRGGBB без создания TextEffectsEngine"""
+    # fullmatch, а не match с '$': '$' допускает завершающий перевод строки
+    return isinstance(color, str) and _HEX_RE.fullmatch(color) is not None
+
+def _hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
+    try:
+        rgb = bytes.fromhex(hex_color.lstrip('#'))
+        return (rgb[0], rgb[1], rgb[2])
+    except Exception as e:
+        logger.warning(f"Ошибка конвертации HEX '{hex_color}' в RGB: {e}.", exc_info=True)
+        return (255, 255, 255)
+
 class TextEffectsEngine:
     def __init__(self):
         logger.debug("Инициализация TextEffectsEngine...")
-        # Определяем системный шрифт при инициализации
-        self.system_font = get_system_font_for_cyrillic()
         logger.debug("TextEffectsEngine инициализирован.")
 
-    def create_enhanced_title_clip(
-        self, text: str, resolution: Tuple[int, int], duration: int,
-        text_color: str = "#ffffff", stroke_color: str = "#000000", stroke_width: int = 2,
-        title_size: int = 40, font_path: Optional[str] = None, effects: Optional[Dict[str, bool]] = None,
-        video_fps: int = 30
-    ) -> Optional[TextClip]:
-        logger.info(f"Создание улучшенного клипа заголовка: '{text[:30]}...'")
-        if not text.strip():
-            logger.warning("Текст заголовка пуст, клип не будет создан.")
-            return None
-        effects = effects or {}
-        
-        # Определяем шрифт
-        font_to_use = None
+    @property
+    def system_font(self) -> Optional[str]:
+        # Шрифт определяется при первом обращении; результат кэширован на уровне модуля
+        return get_system_font_for_cyrillic()
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _resolve_font_cached(font_path: Optional[str], system_font: Optional[str]) -> Optional[str]:
+        """Выбор шрифта для TextClip; результат кэшируется, поэтому stat файла шрифта и лог - только при первом запросе"""
         if font_path and os.path.exists(font_path):
-            font_to_use = font_path
             logger.info(f"Используется пользовательский шрифт: {font_path}")
-        elif self.system_font:
-            font_to_use = self.system_font
-            logger.info(f"Используется системный шрифт: {self.system_font}")
+            return font_path
+        if system_font:
+            logger.info(f"Используется системный шрифт: {system_font}")
+            return system_font
+        logger.info("Шрифт не указан, используется системный по умолчанию")
+        return None
+
+    def _wrap_text_lines(self, text: str, pil_font: Any, max_width: int, stroke_width: int) -> List[str]:
+        """
+        Перенос строк как в TextClip(method='caption') MoviePy 2: ширина проверяется после каждого символа,
+        перенос - по последнему пробелу, без пробела - посреди слова. Позиция пробела, как и в TextClip,
+        отсчитывается от начала всего текста, поэтому строки совпадают с TextClip один в один.
+        """
+        from PIL import Image, ImageDraw
+
+        draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+        lines: List[str] = []
+        current_line = ""
+        last_space = 0
+        for index, char in enumerate(text):
+            if char == " ":
+                last_space = index
+            temp_line = current_line + char
+            left, _, right, _ = draw.multiline_textbbox(
+                (0, 0), temp_line, font=pil_font, spacing=TEXTCLIP_INTERLINE, stroke_width=stroke_width)
+            if right - left < max_width:
+                current_line = temp_line
+            elif last_space:
+                lines.append(temp_line[:last_space])
+                current_line = temp_line[last_space + 1:index + 1]
+                last_space = 0
+            else:
+                lines.append(current_line[:index])
+                current_line = char
+        if current_line:
+            lines.append(current_line)
+        return lines
+
+    @staticmethod
+    def _text_box_width(resolution: Tuple[int, int]) -> int:
+        """Ширина области переноса текста заголовка и субтитров"""
+        return resolution[0] - 100
+
+    def _render_text_frame(
+        self, text: str, font: Optional[str], font_size: int, color: str, stroke_color: str,
+        stroke_width: int, max_width: int
+    ) -> Tuple[Any, Tuple[int, int], Tuple[int, int]]:
+        """
+        Статичный текст без эффектов: отрисовка напрямую через PIL ImageDraw, с той же раскладкой,
+        что у TextClip(method='caption', size=(max_width, None)): перенос _wrap_text_lines, рамка шириной
+        max_width, текст по центру рамки, базовая линия первой строки на ascent + stroke_width от верха.
+        Возвращает (RGBA-массив, обрезанный по непрозрачным пикселям; смещение обрезки в рамке; размер рамки):
+        при компоновке каждого кадра смешивается только область с текстом.
+        Объектов MoviePy не создает, поэтому может выполняться в рабочем потоке.
+        """
+        import numpy as np
+        from PIL import Image, ImageDraw
+
+        pil_font = _cached_font(font, font_size)
+        wrapped = "\n".join(self._wrap_text_lines(text, pil_font, max_width, stroke_width))
+        draw_kwargs = {"font": pil_font, "spacing": TEXTCLIP_INTERLINE, "stroke_width": stroke_width, "anchor": "ls"}
+        measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+        left, top, right, bottom = measure.multiline_textbbox((0, 0), wrapped, **draw_kwargs)
+        text_width, text_height = int(right - left), int(bottom - top)
+        # Высоту рамки TextClip считает по тексту, перенесенному повторно (уже разбитый текст переносится еще раз),
+        # а сам текст центрирует в рамке по вертикали
+        rewrapped = "\n".join(self._wrap_text_lines(wrapped, pil_font, max_width, stroke_width))
+        _, top, _, bottom = measure.multiline_textbbox((0, 0), rewrapped, **draw_kwargs)
+        box_height = int(bottom - top)
+
+        canvas = Image.new("RGBA", (max_width, box_height), (0, 0, 0, 0))
+        ascent, _ = pil_font.getmetrics()
+        origin = ((max_width - text_width) / 2 + stroke_width,
+                  (box_height - text_height) / 2 + ascent + stroke_width)
+        ImageDraw.Draw(canvas).multiline_text(
+            origin, wrapped, fill=color, stroke_fill=stroke_color, align="left", **draw_kwargs)
+
+        ink_box = canvas.getchannel("A").getbbox() or (0, 0, 1, 1)
+        return np.asarray(canvas.crop(ink_box)), (ink_box[0], ink_box[1]), canvas.size
+
+    def _text_clip_from_frame(
+        self, text_raster: Tuple[Any, Tuple[int, int], Tuple[int, int]], resolution: Tuple[int, int],
+        position: Any, duration: float, fps: int
+    ) -> ImageClip:
+        """ImageClip из результата _render_text_frame; позиция задается для рамки, как у TextClip"""
+        from moviepy.video.VideoClip import compute_position
+
+        text_frame, (offset_x, offset_y), box_size = text_raster
+        box_x, box_y = compute_position(box_size, resolution, position)
+        text_clip = ImageClip(text_frame, transparent=True, duration=duration).with_position(
+            (box_x + offset_x, box_y + offset_y))
+        text_clip.fps = fps
+        return text_clip
+
+    def _build_text_clip(
+        self, text: str, font: Optional[str], font_size: int, color: str, stroke_color: str,
+        stroke_width: int, box_width: int, position: Any, fps: int
+    ) -> TextClip:
+        """TextClip(method='caption') с переносом по ширине box_width; шрифт передается, только если он определен"""
+        # Используем правильные параметры для TextClip (MoviePy 2.0)
+        clip_kwargs = {
+            "font_size": font_size,
+            "color": color,
+            "stroke_color": stroke_color,
+            "stroke_width": stroke_width,
+            "size": (box_width, None),
+            "method": 'caption'
+        }
+        if font:
+            clip_kwargs["font"] = font
+
+        # Передаем текст как первый позиционный аргумент
+        text_clip = TextClip(text=text, **clip_kwargs).with_position(position)
+        if getattr(text_clip, 'fps', None) is None:
+            text_clip.fps = fps
+        return text_clip
+
+    def _apply_effects(
+        self, base_clip: TextClip, effects: Dict[str, bool], duration: float, fps: int,
+        font: Optional[str], font_size: int, stroke_width: int
+    ) -> Any:
+        """Применяет к клипу эффект печатной машинки или появления/исчезновения"""
+        if effects.get('typewriter', False):
+            final_clip = self._apply_typewriter_effect(
+                base_clip, duration, fps=fps, font=font, font_size=font_size, stroke_width=stroke_width)
+        elif effects.get('fade', False):
+            final_clip = self._apply_fade_effect(base_clip, duration)
         else:
-            logger.info("Шрифт не указан, используется системный по умолчанию")
-        
+            final_clip = base_clip.with_duration(duration)
+
+        if final_clip and getattr(final_clip, 'fps', None) is None:
+            final_clip.fps = fps
+        return final_clip
+
+    def _create_text_clip(
+        self, label: str, text: str, position: Any, resolution: Tuple[int, int], duration: int,
+        text_color: str, stroke_color: str, stroke_width: int, font_size: int,
+        font_path: Optional[str], effects: Optional[Dict[str, bool]], video_fps: int,
+        text_frame: Optional[Any] = None
+    ) -> Optional[Any]:
+        """
+        Общая часть заголовка и субтитров; label - подпись клипа в логах ('заголовка', 'субтитров').
+        text_frame - заранее полученный результат _render_text_frame (для текста без эффектов).
+        """
+        effects = effects or {}
+        box_width = self._text_box_width(resolution)
+
+        # Определяем шрифт
+        font_to_use = self._resolve_font_cached(font_path, self.system_font)
+
         try:
-            # Используем правильные параметры для TextClip (MoviePy 2.0)
-            clip_kwargs = {
-                "font_size": title_size,
-                "color": text_color,
-                "stroke_color": stroke_color,
-                "stroke_width": stroke_width,
-                "size": (resolution[0] - 100, None),
-                "method": 'caption'
-            }
-            
-            # Добавляем шрифт только если он определен
-            if font_to_use:
-                clip_kwargs["font"] = font_to_use
-
-            # Передаем текст как первый позиционный аргумент
-            base_clip = TextClip(text=text, **clip_kwargs).with_position(('center', 50))
-            if getattr(base_clip, 'fps', None) is None:
-                base_clip.fps = video_fps
-            
-            # Применяем эффекты
-            final_clip = None
-            if effects.get('typewriter', False):
-                final_clip = self._apply_typewriter_effect(base_clip, duration, fps=video_fps)
-            elif effects.get('fade', False):
-                final_clip = self._apply_fade_effect(base_clip, duration)
-            else:
-                final_clip = base_clip.with_duration(duration)
-            
-            if final_clip and getattr(final_clip, 'fps', None) is None:
-                final_clip.fps = video_fps
+            if not effects.get('typewriter', False) and not effects.get('fade', False):
+                try:
+                    if text_frame is None:
+                        text_frame = self._render_text_frame(
+                            text, font_to_use, font_size, text_color, stroke_color, stroke_width, box_width)
+                    final_clip = self._text_clip_from_frame(text_frame, resolution, position, duration, video_fps)
+                    logger.info(f"Клип {label} '{text[:30]}...' отрисован через PIL.")
+                    return final_clip
+                except Exception as e:
+                    logger.warning(f"Не удалось отрисовать клип {label} через PIL ({e}), используем TextClip")
 
-            logger.info(f"Клип заголовка '{text[:30]}...' успешно создан.")
+            base_clip = self._build_text_clip(
+                text, font_to_use, font_size, text_color, stroke_color, stroke_width,
+                box_width, position, video_fps)
+            final_clip = self._apply_effects(
+                base_clip, effects, duration, video_fps, font_to_use, font_size, stroke_width)
+
+            logger.info(f"Клип {label} '{text[:30]}...' успешно создан.")
             return final_clip
 
         except Exception as e:
-            logger.error(f"Ошибка создания заголовка: {e}", exc_info=True)
+            logger.error(f"Ошибка создания клипа {label}: {e}", exc_info=True)
             try:
-                # Простой fallback без кастомного шрифта
-                fb_clip = TextClip(
-                    text=text,
-                    font_size=title_size,
-                    color=text_color,
-                    stroke_color=stroke_color,
-                    stroke_width=stroke_width,
-                    size=(resolution[0] - 100, None),
-                    method='caption'
-                    # НЕ указываем font, пусть система сама выберет
-                ).with_position(('center', 50)).with_duration(duration)
+                # Простой fallback без кастомного шрифта: НЕ указываем font, пусть система сама выберет
+                fb_clip = self._build_text_clip(
+                    text, None, font_size, text_color, stroke_color, stroke_width,
+                    box_width, position, video_fps).with_duration(duration)
                 fb_clip.fps = video_fps
-                logger.info("Fallback клип заголовка создан без указания шрифта.")
+                logger.info(f"Fallback клип {label} создан без указания шрифта.")
                 return fb_clip
             except Exception as fe:
-                logger.error(f"Ошибка fallback заголовка: {fe}", exc_info=True)
+                logger.error(f"Ошибка fallback клипа {label}: {fe}", exc_info=True)
                 return None
-                  
+
+    def create_enhanced_title_clip(
+        self, text: str, resolution: Tuple[int, int], duration: int,
+        text_color: str = "#ffffff", stroke_color: str = "#000000", stroke_width: int = 2,
+        title_size: int = 40, font_path: Optional[str] = None, effects: Optional[Dict[str, bool]] = None,
+        video_fps: int = 30, text_frame: Optional[Any] = None
+    ) -> Optional[TextClip]:
+        logger.info(f"Создание улучшенного клипа заголовка: '{text[:30]}...'")
+        if not text.strip():
+            logger.warning("Текст заголовка пуст, клип не будет создан.")
+            return None
+        return self._create_text_clip(
+            "заголовка", text, ('center', 50), resolution, duration, text_color, stroke_color,
+            stroke_width, title_size, font_path, effects, video_fps, text_frame)
+
     def create_enhanced_subtitle_clip(
         self, text: str, resolution: Tuple[int, int], duration: int,
         text_color: str = "#ffffff", stroke_color: str = "#000000", stroke_width: int = 1,
         subtitle_size: int = 24, font_path: Optional[str] = None, effects: Optional[Dict[str, bool]] = None,
-        video_fps: int = 30
+        video_fps: int = 30, text_frame: Optional[Any] = None
     ) -> Optional[TextClip]:
         logger.info(f"Создание улучшенного клипа субтитров: '{text[:30]}...'")
         if not text.strip():
             logger.warning("Текст субтитров пуст, клип не будет создан.")
             return None
-        effects = effects or {}
-        
-        # Определяем шрифт
-        font_to_use = None
-        if font_path and os.path.exists(font_path):
-            font_to_use = font_path
-            logger.info(f"Используется пользовательский шрифт: {font_path}")
-        elif self.system_font:
-            font_to_use = self.system_font
-            logger.info(f"Используется системный шрифт: {self.system_font}")
-        else:
-            logger.info("Шрифт не указан, используется системный по умолчанию")
-
-        try:
-            # Используем правильные параметры для TextClip (MoviePy 2.0)
-            clip_kwargs = {
-                "font_size": subtitle_size,
-                "color": text_color,
-                "stroke_color": stroke_color,
-                "stroke_width": stroke_width,
-                "size": (resolution[0] - 100, None),
-                "method": 'caption'
-            }
-            
-            # Добавляем шрифт только если он определен
-            if font_to_use:
-                clip_kwargs["font"] = font_to_use
-
-            # Передаем текст как первый позиционный аргумент
-            base_clip = TextClip(text=text, **clip_kwargs).with_position(('center', resolution[1] - 200))
-            
-            if getattr(base_clip, 'fps', None) is None:
-                base_clip.fps = video_fps
-            
-            # Применяем эффекты
-            final_clip = None
-            if effects.get('typewriter', False):
-                final_clip = self._apply_typewriter_effect(base_clip, duration, fps=video_fps)
-            elif effects.get('fade', False):
-                final_clip = self._apply_fade_effect(base_clip, duration)
-            else:
-                final_clip = base_clip.with_duration(duration)
-            
-            if final_clip and getattr(final_clip, 'fps', None) is None:
-                final_clip.fps = video_fps
-
-            logger.info(f"Клип субтитров '{text[:30]}...' успешно создан.")
-            return final_clip
-        except Exception as e:
-            logger.error(f"Ошибка создания субтитров: {e}", exc_info=True)
-            try:
-                # Простой fallback без кастомного шрифта
-                fb_clip = TextClip(
-                    text=text,
-                    font_size=subtitle_size,
-                    color=text_color,
-                    stroke_color=stroke_color,
-                    stroke_width=stroke_width,
-                    size=(resolution[0] - 100, None),
-                    method='caption'
-                    # НЕ указываем font, пусть система сама выберет
-                ).with_position(('center', resolution[1] - 200)).with_duration(duration)
-                fb_clip.fps = video_fps
-                logger.info("Fallback клип субтитров создан без указания шрифта.")
-                return fb_clip
-            except Exception as fe:
-                logger.error(f"Ошибка fallback субтитров: {fe}", exc_info=True)
-                return None
+        return self._create_text_clip(
+            "субтитров", text, ('center', resolution[1] - 200), resolution, duration, text_color,
+            stroke_color, stroke_width, subtitle_size, font_path, effects, video_fps, text_frame)
 
-    def _apply_typewriter_effect(self, text_clip: TextClip, duration: int, fps: int = 30) -> Optional[CompositeVideoClip]:
+    def _apply_typewriter_effect(
+        self, text_clip: TextClip, duration: int, fps: int = 30,
+        font: Optional[str] = None, font_size: Optional[int] = None, stroke_width: int = 0
+    ) -> Optional[CompositeVideoClip]:
         text_value = getattr(text_clip, 'text', getattr(text_clip, 'txt', ''))
         logger.debug(
             f"Применение эффекта 'печатная машинка' к тексту '{str(text_value)[:50]}...' "
@@ -247,6 +451,17 @@ class TextEffectsEngine:
             if getattr(returned_clip, 'fps', None) is None:
                 returned_clip.fps = fps
             return returned_clip
+
+        # Основной путь: текст уже отрисован в text_clip один раз, анимация только открывает его маску.
+        # Без параметров шрифта метрики символов не получить - тогда используем отрисовку по фрагментам
+        if font_size is not None:
+            try:
+                reveal_clip = self._build_typewriter_reveal_clip(
+                    text_clip, original_text, duration, fps, font, font_size, stroke_width)
+                logger.info("Эффект 'печатная машинка' собран из одного отрисованного текста.")
+                return reveal_clip
+            except Exception as e:
+                logger.warning(f"Не удалось построить 'печатную машинку' по маске ({e}), используем отрисовку по фрагментам")
         
         # ИСПРАВЛЕНО: Убираем ограничение на количество символов
         # Оптимизируем для производительности другими способами
@@ -256,6 +471,14 @@ class TextEffectsEngine:
             logger.info(f"Длинный текст ({len(original_text)} символов), используем группировку по словам")
             # Разбиваем по словам для более быстрой анимации
             words = original_text.split()
+            # Текст со словами через один пробел и позиции концов слов считаются один раз:
+            # префикс для фрагмента - один срез вместо ' '.join по всем предыдущим словам
+            joined_words = ' '.join(words)
+            word_ends = []
+            word_end = -1
+            for word in words:
+                word_end += len(word) + 1
+                word_ends.append(word_end)
             # Группируем слова для оптимизации
             words_per_frame = max(1, len(words) // min(100, duration * fps // 10))
             
@@ -280,8 +503,8 @@ class TextEffectsEngine:
                     break
                     
                 # Собираем группу слов
-                word_group = words[i:i+words_per_frame]
-                sub_text = ' '.join(words[:i+len(word_group)])
+                last_word = min(i + words_per_frame, len(words)) - 1
+                sub_text = joined_words[:word_ends[last_word]]
                 
                 try:
                     clip_kwargs_frag = {
@@ -380,8 +603,7 @@ class TextEffectsEngine:
         
         try:
             logger.debug(f"Сборка typewriter из {len(animated_clips)} фрагментов...")
-            final_typewriter_clip = concatenate_videoclips(animated_clips, method="compose")
-            final_typewriter_clip = final_typewriter_clip.with_duration(duration)
+            final_typewriter_clip = self._build_fragment_table_clip(animated_clips, duration)
             final_typewriter_clip.fps = fps
             final_typewriter_clip = final_typewriter_clip.with_position(position_effect)
 
@@ -395,6 +617,123 @@ class TextEffectsEngine:
                 returned_clip.fps = fps
             return returned_clip
         
+    def _build_typewriter_reveal_clip(
+        self, text_clip: TextClip, text: str, duration: float, fps: int,
+        font: Optional[str], font_size: int, stroke_width: int
+    ) -> Any:
+        """
+        Строит 'печатную машинку' из уже отрисованного text_clip: RGB-кадр неизменен,
+        а маска по времени открывает строки целиком и текущую строку до правого края последнего символа.
+        Границы символов берутся из метрик PIL (textbbox префиксов) без повторной растеризации текста.
+        """
+        import numpy as np
+        from PIL import Image, ImageDraw
+        from moviepy import VideoClip
+
+        if text_clip.mask is None:
+            raise ValueError("у текстового клипа нет маски")
+        rgb_frame = text_clip.get_frame(0)
+        alpha = text_clip.mask.get_frame(0)
+        height, width = alpha.shape[:2]
+
+        pil_font = _cached_font(font, font_size)
+        draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+        bbox_kwargs = {"font": pil_font, "spacing": TEXTCLIP_INTERLINE, "stroke_width": stroke_width, "anchor": "ls"}
+
+        # Смещение раскладки PIL относительно кадра: совмещаем рамку текста с рамкой непрозрачных пикселей маски
+        rows = np.flatnonzero(alpha.any(axis=1))
+        cols = np.flatnonzero(alpha.any(axis=0))
+        if rows.size == 0:
+            raise ValueError("маска текста пуста")
+        left, top, _, _ = draw.multiline_textbbox((0, 0), text, **bbox_kwargs)
+        dx, dy = cols[0] - left, rows[0] - top
+
+        lines = text.split("\n")
+        # PIL разносит базовые линии строк на постоянный шаг - измеряем его один раз
+        line_pitch = (draw.multiline_textbbox((0, 0), "\nA", **bbox_kwargs)[3]
+                      - draw.textbbox((0, 0), "A", **bbox_kwargs)[3])
+        line_tops, line_bottoms = [], []
+        for index, line in enumerate(lines):
+            _, line_top, _, line_bottom = draw.textbbox((0, index * line_pitch), line, **bbox_kwargs)
+            line_tops.append(line_top + dy)
+            line_bottoms.append(line_bottom + dy)
+        # Полосы строк делятся посередине между соседними строками
+        band_starts = [0] + [int((line_bottoms[i] + line_tops[i + 1]) // 2) for i in range(len(lines) - 1)]
+        band_ends = band_starts[1:] + [height]
+
+        # Для каждого символа (включая переводы строк) - строка и правая граница открытой части
+        reveal_steps: List[Tuple[int, int]] = []
+        for line_index, line in enumerate(lines):
+            for char_index in range(1, len(line) + 1):
+                right = draw.textbbox((0, 0), line[:char_index], **bbox_kwargs)[2] + dx
+                reveal_steps.append((line_index, int(min(width, max(0, np.ceil(right))))))
+            if line_index < len(lines) - 1:
+                reveal_steps.append((line_index, width))
+
+        total_steps = len(reveal_steps)
+        # Одна маска на весь клип: при записи время идет вперед, и к маске
+        # дописываются только вновь открытые столбцы, без копии кадра на каждый шаг
+        mask = np.zeros_like(alpha)
+        shown_steps = 0
+
+        def reveal_mask(t):
+            nonlocal shown_steps
+            visible = min(total_steps, int(t * total_steps / duration) + 1)
+            if visible < shown_steps:
+                # Переход назад по времени (предпросмотр, повторный get_frame) - собираем маску заново
+                mask.fill(0)
+                shown_steps = 0
+            for line_index, cut_x in reveal_steps[shown_steps:visible]:
+                start, end = band_starts[line_index], band_ends[line_index]
+                mask[start:end, :cut_x] = alpha[start:end, :cut_x]
+            shown_steps = max(shown_steps, visible)
+            return mask
+
+        mask_clip = VideoClip(frame_function=reveal_mask, is_mask=True, duration=duration)
+        reveal_clip = ImageClip(rgb_frame, duration=duration).with_mask(mask_clip).with_position(text_clip.pos)
+        reveal_clip.fps = fps
+        return reveal_clip
+
+    def _build_fragment_table_clip(self, fragment_clips: List[Any], duration: float) -> Any:
+        """
+        Собирает статичные фрагменты в один клип: кадры и маски фрагментов берутся один раз,
+        а кадр для момента t находится бинарным поиском по времени окончания фрагментов
+        (вместо concatenate_videoclips(method="compose"), который композитит каждый подклип).
+        Фрагменты разного размера центрируются на общем холсте, как при method="compose".
+        """
+        import numpy as np
+        from moviepy import VideoClip
+
+        canvas_w = max(clip.w for clip in fragment_clips)
+        canvas_h = max(clip.h for clip in fragment_clips)
+
+        def on_canvas(array, channels):
+            height, width = array.shape[:2]
+            if (width, height) == (canvas_w, canvas_h):
+                return array
+            canvas = np.zeros((canvas_h, canvas_w) + channels, dtype=array.dtype)
+            top, left = (canvas_h - height) // 2, (canvas_w - width) // 2
+            canvas[top:top + height, left:left + width] = array
+            return canvas
+
+        frames, masks, end_times = [], [], []
+        current_end = 0.0
+        for clip in fragment_clips:
+            frame = clip.get_frame(0)
+            frames.append(on_canvas(frame, frame.shape[2:]))
+            mask = clip.mask.get_frame(0) if clip.mask is not None else np.ones(frame.shape[:2])
+            masks.append(on_canvas(mask, ()))
+            current_end += clip.duration
+            end_times.append(current_end)
+        last_index = len(frames) - 1
+
+        def fragment_index(t):
+            return min(bisect.bisect_right(end_times, t), last_index)
+
+        mask_clip = VideoClip(frame_function=lambda t: masks[fragment_index(t)], is_mask=True, duration=duration)
+        table_clip = VideoClip(frame_function=lambda t: frames[fragment_index(t)], duration=duration)
+        return table_clip.with_mask(mask_clip)
+
     def _apply_fade_effect(self, text_clip: TextClip, duration: int) -> TextClip:
         logger.debug(f"Применение эффекта 'появление/исчезание' к тексту '{str(text_clip.text)[:20]}...'")
         try:
@@ -405,68 +744,127 @@ class TextEffectsEngine:
             if hasattr(text_clip, 'fadein') and hasattr(text_clip, 'fadeout'):
                 return text_clip.with_duration(duration).fadein(fade_duration).fadeout(fade_duration)
             else:
-                # Альтернативный способ для MoviePy 2.x
-                logger.warning("Методы fadein/fadeout недоступны, используем альтернативный способ")
-                
-                # Используем crossfade эффект через opacity
-                clip_with_duration = text_clip.with_duration(duration)
-                
-                # Создаем функцию изменения прозрачности
-                def make_opacity_func(total_duration, fade_dur):
-                    def opacity_func(get_frame, t):
-                        frame = get_frame(t)
-                        if t < fade_dur:
-                            # Появление
-                            alpha = t / fade_dur
-                        elif t > total_duration - fade_dur:
-                            # Исчезание
-                            alpha = (total_duration - t) / fade_dur
-                        else:
-                            # Полная видимость
-                            alpha = 1.0
-                        
-                        # Применяем альфа-канал
-                        if len(frame.shape) == 3 and frame.shape[2] == 3:
-                            # RGB -> RGBA
-                            import numpy as np
-                            alpha_channel = (alpha * 255).astype(frame.dtype)
-                            alpha_array = np.full((frame.shape[0], frame.shape[1], 1), alpha_channel)
-                            frame = np.concatenate([frame, alpha_array], axis=2)
-                        elif len(frame.shape) == 3 and frame.shape[2] == 4:
-                            # Уже RGBA
-                            frame[:, :, 3] = (frame[:, :, 3] * alpha).astype(frame.dtype)
-                        
-                        return frame
-                    return opacity_func
-                
-                # Применяем эффект прозрачности
-                faded_clip = clip_with_duration.with_updated_frame_function(
-                    make_opacity_func(duration, fade_duration)
-                )
-                
-                logger.debug("Альтернативный fade эффект применен через изменение прозрачности")
-                return faded_clip
+                # MoviePy 2.x: прозрачность меняется через маску клипа, без покадрового Python-обработчика.
+                # CrossFade, а не FadeIn/FadeOut: текст накладывается в CompositeVideoClip и должен
+                # становиться прозрачным, а не уходить в черный
+                from moviepy.video.fx import CrossFadeIn, CrossFadeOut
+                return text_clip.with_duration(duration).with_effects(
+                    [CrossFadeIn(fade_duration), CrossFadeOut(fade_duration)])
                 
         except Exception as e:
             logger.error(f"Ошибка применения fade эффекта: {e}", exc_info=True)
             return text_clip.with_duration(duration)
     
     def hex_to_rgb(self, hex_color: str) -> Tuple[int, int, int]:
-        try:
-            hex_color = hex_color.lstrip('#')
-            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        except Exception as e:
-            logger.warning(f"Ошибка конвертации HEX '{hex_color}' в RGB: {e}.", exc_info=True)
-            return (255, 255, 255)
+        return _hex_to_rgb(hex_color)
     
     def validate_color(self, color: str) -> bool:
-        try:
-            if not color.startswith('#') or len(color) != 7:
-                return False
-            int(color[1:], 16)
-            return True
-        except Exception:
-            return False
+        return validate_color(color)
+
+def _flatten_static_layers(layers: List[Any], resolution: Tuple[int, int], duration: float) -> ImageClip:
+    """Сводит статичные слои (фон и текст без эффектов) в один кадр и возвращает его как ImageClip"""
+    flat_frame = CompositeVideoClip(layers, size=resolution).get_frame(0)
+    logger.debug(f"Статичные слои ({len(layers)}) сведены в один кадр {resolution}.")
+    return ImageClip(flat_frame, duration=duration)
+
+def _composite_into_buffer(background: Any, overlays: List[Any], resolution: Tuple[int, int], duration: float) -> Any:
+    """
+    Собирает кадр из фона и текстовых слоев в один заранее выделенный буфер uint8.
+    CompositeVideoClip на каждом кадре создает несколько полноразмерных изображений
+    (RGBA-конвертация, холст, alpha_composite); здесь фон копируется в буфер,
+    а текст смешивается на месте только в своей области. Буфер переиспользуется
+    между кадрами: FFmpeg-писатель копирует кадр в канал сразу (tobytes()).
+    """
+    import numpy as np
+    from moviepy import VideoClip
+    from moviepy.video.VideoClip import compute_position
+
+    width, height = resolution
+    frame_buf = np.empty((height, width, 3), dtype=np.uint8)
+
+    def frame_function(t):
+        bg_frame = background.get_frame(t - background.start)
+        if bg_frame.shape[:2] == frame_buf.shape[:2]:
+            np.copyto(frame_buf, bg_frame[:, :, :3], casting='unsafe')
+        else:
+            frame_buf.fill(0)
+            h, w = min(height, bg_frame.shape[0]), min(width, bg_frame.shape[1])
+            np.copyto(frame_buf[:h, :w], bg_frame[:h, :w, :3], casting='unsafe')
+
+        for clip in overlays:
+            if t < clip.start or (clip.end is not None and t >= clip.end):
+                continue
+            ct = t - clip.start
+            clip_frame = clip.get_frame(ct)
+            clip_h, clip_w = clip_frame.shape[:2]
+            x, y = compute_position((clip_w, clip_h), resolution, clip.pos(ct), clip.relative_pos)
+
+            # Пересечение слоя с кадром
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + clip_w, width), min(y + clip_h, height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            fg = clip_frame[y0 - y:y1 - y, x0 - x:x1 - x, :3]
+            region = frame_buf[y0:y1, x0:x1]
+
+            if clip.mask is None:
+                np.copyto(region, fg, casting='unsafe')
+                continue
+            # Целочисленное смешивание как в Image.alpha_composite над непрозрачным фоном,
+            # маска переводится в 0..255 так же, как в compose_on - кадр совпадает с CompositeVideoClip
+            alpha = (clip.mask.get_frame(ct)[y0 - y:y1 - y, x0 - x:x1 - x, np.newaxis] * 255).astype(np.uint8)
+            alpha = alpha.astype(np.uint32)
+            blended = (fg.astype(np.uint32) * alpha + region * (255 - alpha) + 128) << 7
+            np.copyto(region, (((blended >> 8) + blended) >> 8) >> 7, casting='unsafe')
+        return frame_buf
+
+    return VideoClip(frame_function=frame_function, duration=duration)
+
+# Параметры аудио write_videofile и соответствующие им параметры write_audiofile
+_AUDIO_WRITE_PARAMS = {
+    "audio_fps": "fps", "audio_nbytes": "nbytes", "audio_bufsize": "buffersize",
+    "audio_codec": "codec", "audio_bitrate": "bitrate",
+}
+# Параметры временного аудиофайла write_videofile: при отдельной записи аудио не используются
+_AUDIO_TEMP_PARAMS = ("audio", "temp_audiofile", "temp_audiofile_path", "remove_temp")
+
+def _write_video_with_parallel_audio(
+    video_clip: Any, audio_clip: Any, output_path: str, temp_audio_path: str, write_params: Dict[str, Any]
+) -> None:
+    """
+    Записывает видео, кодируя аудиодорожку параллельно с видеорядом.
+    write_videofile сначала целиком кодирует аудио во временный файл и только потом начинает видео;
+    здесь оба кодирования идут одновременно в разных процессах FFmpeg, а затем дорожки
+    объединяются копированием потоков (без перекодирования).
+    """
+    from moviepy.config import FFMPEG_BINARY
+
+    root, ext = os.path.splitext(output_path)
+    temp_video_path = f"{root}_temp_video{ext or '.mp4'}"
+    # Умолчания write_videofile для MP4 (44100 Гц, AAC), поверх них - переданные audio_* параметры
+    audio_params = {"fps": 44100, "codec": "aac"}
+    audio_params.update(
+        (_AUDIO_WRITE_PARAMS[key], value) for key, value in write_params.items() if key in _AUDIO_WRITE_PARAMS)
+    video_params = {
+        key: value for key, value in write_params.items()
+        if key not in _AUDIO_WRITE_PARAMS and key not in _AUDIO_TEMP_PARAMS}
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            audio_future = executor.submit(audio_clip.write_audiofile, temp_audio_path, logger=None, **audio_params)
+            video_clip.write_videofile(temp_video_path, audio=False, **video_params)
+            audio_future.result()
+        subprocess.run(
+            [FFMPEG_BINARY, "-y", "-loglevel", "error",
+             "-i", temp_video_path, "-i", temp_audio_path,
+             "-map", "0:v:0", "-map", "1:a:0", "-c", "copy", output_path],
+            check=True, capture_output=True)
+        logger.debug(f"Видео и аудио записаны параллельно и объединены в {output_path}")
+    finally:
+        for temp_path in (temp_video_path, temp_audio_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
 
 def create_enhanced_video(
     image_paths: List[str],
@@ -501,12 +899,63 @@ def create_enhanced_video(
 
     try:
         effects_engine = TextEffectsEngine()
-        if not effects_engine.validate_color(text_color):
+        if not validate_color(text_color):
             text_color = "#ffffff"
-        if not effects_engine.validate_color(stroke_color):
+        if not validate_color(stroke_color):
             stroke_color = "#000000"
         
-        video_clips_instances = create_image_clips(image_paths, resolution, duration, fps)
+        # ====== ВКЛЮЧАЕМ АУДИО ОБРАТНО ======
+        logger.info("✅ Аудио включено обратно!")
+        clean_audio_tracks = []
+        if audio_tracks_info:
+            logger.info(f"Создание аудиодорожки из информации: {len(audio_tracks_info)} треков")
+            for track in audio_tracks_info:
+                clean_track = {k: v for k, v in track.items() if k != "item"}
+                clean_audio_tracks.append(clean_track)
+        else:
+            logger.info("Информация об аудиодорожках отсутствует, аудио не будет добавлено.")
+
+        # Шрифт определяется один раз в этом потоке, до запуска рабочих потоков:
+        # проба шрифтов и запись font.json не выполняются параллельно
+        font_to_use = effects_engine._resolve_font_cached(font_path, effects_engine.system_font)
+        text_is_static = not (effects or {}).get('typewriter', False) and not (effects or {}).get('fade', False)
+        box_width = TextEffectsEngine._text_box_width(resolution)
+        text_jobs = ((title_text, title_size), (subtitle_text, subtitle_size))
+
+        # Параллельно с подготовкой изображений и аудио идет только растеризация статичного текста в PIL.
+        # Один рабочий поток: объекты шрифтов PIL не используются одновременно. Все клипы MoviePy
+        # (изображения, текст, аудио) создаются в этом потоке
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            frame_futures = [
+                executor.submit(
+                    effects_engine._render_text_frame, text, font_to_use, size,
+                    text_color, stroke_color, stroke_width, box_width)
+                if text_is_static and text.strip() else None
+                for text, size in text_jobs
+            ]
+            try:
+                video_clips_instances = create_image_clips(image_paths, resolution, duration, fps)
+                audio_clip_resource = create_audio_track(clean_audio_tracks, float(duration)) if clean_audio_tracks else None
+            except BaseException:
+                for future in frame_futures:
+                    if future:
+                        future.cancel()
+                raise
+            text_frames: List[Optional[Any]] = []
+            for future in frame_futures:
+                try:
+                    text_frames.append(future.result() if future else None)
+                except Exception as e:
+                    logger.warning(f"Не удалось отрисовать текст через PIL в рабочем потоке ({e})")
+                    text_frames.append(None)
+
+        title_clip = effects_engine.create_enhanced_title_clip(
+            title_text, resolution, duration, text_color, stroke_color, stroke_width,
+            title_size, font_path, effects, fps, text_frame=text_frames[0]) if title_text.strip() else None
+        subtitle_clip = effects_engine.create_enhanced_subtitle_clip(
+            subtitle_text, resolution, duration, text_color, stroke_color, stroke_width,
+            subtitle_size, font_path, effects, fps, text_frame=text_frames[1]) if subtitle_text.strip() else None
+
         if not video_clips_instances:
             raise ValueError("Не удалось создать видеоклипы из изображений.")
         
@@ -519,47 +968,28 @@ def create_enhanced_video(
                     pass
             raise ValueError("Не удалось создать основной видеоряд.")
         
-        text_clips_list_temp: List[Optional[TextClip]] = []
-        if title_text.strip():
-            title_clip = effects_engine.create_enhanced_title_clip(
-                title_text, resolution, duration, text_color, stroke_color,
-                stroke_width, title_size, font_path, effects, fps)
-            if title_clip:
-                text_clips_list_temp.append(title_clip)
-        if subtitle_text.strip():
-            subtitle_clip = effects_engine.create_enhanced_subtitle_clip(
-                subtitle_text, resolution, duration, text_color, stroke_color,
-                stroke_width, subtitle_size, font_path, effects, fps)
-            if subtitle_clip:
-                text_clips_list_temp.append(subtitle_clip)
-        
+        text_clips_list_temp: List[Optional[TextClip]] = [title_clip, subtitle_clip]
         valid_text_clips_instances = [clip for clip in text_clips_list_temp if clip is not None]
         
         all_clips_for_composite_list: List[Any] = [main_clip_instance] + valid_text_clips_instances
-        final_video_instance = CompositeVideoClip(all_clips_for_composite_list, size=resolution)
+        if valid_text_clips_instances and text_is_static and len(video_clips_instances) == 1:
+            # Одно изображение и текст без эффектов: кадр не меняется, наложение делаем один раз, а не в каждом кадре
+            final_video_instance = _flatten_static_layers(all_clips_for_composite_list, resolution, duration)
+        elif valid_text_clips_instances:
+            final_video_instance = _composite_into_buffer(
+                main_clip_instance, valid_text_clips_instances, resolution, duration)
+        else:
+            final_video_instance = CompositeVideoClip(all_clips_for_composite_list, size=resolution)
         final_video_instance.fps = fps
         logger.info("Видеоряд и текстовые клипы скомпонованы.")
         
-        # ====== ВКЛЮЧАЕМ АУДИО ОБРАТНО ======
-        logger.info("✅ Аудио включено обратно!")
-        
-        if audio_tracks_info:
-            logger.info(f"Создание аудиодорожки из информации: {len(audio_tracks_info)} треков")
-            clean_audio_tracks = []
-            for track in audio_tracks_info:
-                clean_track = {k: v for k, v in track.items() if k != "item"}
-                clean_audio_tracks.append(clean_track)
-            
-            audio_clip_resource = create_audio_track(clean_audio_tracks, float(duration))
-            if audio_clip_resource:
-                logger.debug("Добавление аудио к final_video_instance с помощью with_audio().")
-                final_video_with_audio = final_video_instance.with_audio(audio_clip_resource)
-                final_video_instance = final_video_with_audio
-                logger.info("Аудиодорожка успешно добавлена к видео.")
-            else:
-                logger.warning("Не удалось создать или добавить аудиодорожку (audio_clip_resource is None).")
-        else:
-            logger.info("Информация об аудиодорожках отсутствует, аудио не будет добавлено.")
+        if audio_clip_resource:
+            logger.debug("Добавление аудио к final_video_instance с помощью with_audio().")
+            final_video_with_audio = final_video_instance.with_audio(audio_clip_resource)
+            final_video_instance = final_video_with_audio
+            logger.info("Аудиодорожка успешно добавлена к видео.")
+        elif clean_audio_tracks:
+            logger.warning("Не удалось создать или добавить аудиодорожку (audio_clip_resource is None).")
             
         if not final_video_instance:
             logger.critical("Финальный видеоклип (final_video_instance) не был создан. Невозможно записать видео.")
@@ -592,7 +1022,15 @@ def create_enhanced_video(
             write_params["preset"] = codec_preset
         
         logger.info(f"Начало записи видео С АУДИО в файл: '{output_path}'. Параметры: {write_params}")
-        final_video_instance.write_videofile(str(output_path), **write_params)
+        if audio_clip_resource:
+            try:
+                _write_video_with_parallel_audio(
+                    final_video_instance, audio_clip_resource, str(output_path), temp_audio_path, write_params)
+            except Exception as e_pw:
+                logger.warning(f"Параллельная запись аудио и видео не удалась ({e_pw}), используем write_videofile", exc_info=True)
+                final_video_instance.write_videofile(str(output_path), **write_params)
+        else:
+            final_video_instance.write_videofile(str(output_path), **write_params)
         
         logger.info(f"Видео С АУДИО успешно записано в файл: {output_path}")
         return str(output_path)
@@ -626,72 +1064,118 @@ def create_enhanced_video(
 def get_available_effects() -> Dict[str, str]:
     return {"typewriter": "Печатная машинка", "fade": "Появление/исчезание", "none": "Без эффектов"}
 
+# Допустимые значения настроек
+_VALID_FPS = frozenset((24, 30, 60))
+_VALID_QUALITY = frozenset(("high", "medium", "low"))
+_VALID_CODECS = frozenset(("libx264", "libx265"))
+# Границы размеров: (ключ, минимум, максимум)
+_SIZE_LIMITS = (("stroke_width", 0, 10), ("title_size", 10, 100), ("subtitle_size", 8, 80))
+
+# Настройки по умолчанию; только для чтения - наружу отдаются копии
+_DEFAULT_SETTINGS: Dict[str, Any] = {
+    "text_color": "#ffffff", "stroke_color": "#000000", "stroke_width": 2,
+    "title_size": 40, "subtitle_size": 24,
+    "effects": {"typewriter": False, "fade": False},
+    "fps": 30, "video_quality": "medium",
+    "codec_name": "libx264", 
+    "resolution": [1920, 1080], "duration": 60,
+    "title_text": "", "subtitle_text": "",
+    "font_path": None, "image_paths": [], "audio_tracks_info": []
+}
+
 def get_default_settings() -> Dict[str, Any]:
     logger.debug("Запрос настроек по умолчанию.")
-    return {
-        "text_color": "#ffffff", "stroke_color": "#000000", "stroke_width": 2,
-        "title_size": 40, "subtitle_size": 24,
-        "effects": {"typewriter": False, "fade": False},
-        "fps": 30, "video_quality": "medium",
-        "codec_name": "libx264", 
-        "resolution": [1920, 1080], "duration": 60,
-        "title_text": "", "subtitle_text": "",
-        "font_path": None, "image_paths": [], "audio_tracks_info": []
-    }
+    return copy.deepcopy(_DEFAULT_SETTINGS)
+
+def _normalize_audio_track(track_info_or_path: Any) -> Optional[Dict[str, Any]]:
+    """Элемент audio_tracks_info в виде {"path", "start_time"} или None, если формат некорректен"""
+    # Обычный случай - словарь {"path": str, "start_time": число}: проверяется первым, точным сравнением типа;
+    # isinstance - для подклассов (OrderedDict), которые принимает и схема msgspec
+    track_type = type(track_info_or_path)
+    if track_type is dict or isinstance(track_info_or_path, dict):
+        track_path = track_info_or_path.get("path")
+        if type(track_path) is not str and not isinstance(track_path, str):
+            return None
+        try:
+            start_time = float(track_info_or_path.get("start_time", 0))
+        except (TypeError, ValueError):
+            start_time = 0.0
+        # Для NaN сравнение >= 0 ложно, поэтому он тоже заменяется нулем
+        return {"path": track_path, "start_time": start_time if start_time >= 0 else 0.0}
+    if track_type is str or isinstance(track_info_or_path, str):
+        return {"path": track_info_or_path, "start_time": 0.0}
+    return None
 
 def validate_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
     logger.debug(f"Валидация общих настроек: {settings}")
-    defaults = get_default_settings()
+    if MSGSPEC_AVAILABLE:
+        # Корректные настройки (обычный случай - сохраненные самим приложением) проверяются
+        # одним проходом msgspec; при любой ошибке - поэлементная проверка с подстановкой умолчаний
+        try:
+            checked = msgspec.convert(settings, _SettingsSchema)
+            validated_settings = settings.copy()
+            validated_settings.update(msgspec.to_builtins(checked))
+            return validated_settings
+        except msgspec.ValidationError as e:
+            logger.debug(f"Настройки не прошли схему ({e}), проверяем по полям.")
+
+    # Словарь умолчаний не строится заново на каждый вызов; изменяемые значения ниже копируются
+    defaults = _DEFAULT_SETTINGS
     validated_settings = settings.copy()
     
-    if not TextEffectsEngine().validate_color(validated_settings.get("text_color", "")):
+    if not validate_color(validated_settings.get("text_color", "")):
         validated_settings["text_color"] = defaults["text_color"]
-    if not TextEffectsEngine().validate_color(validated_settings.get("stroke_color", "")):
+    if not validate_color(validated_settings.get("stroke_color", "")):
         validated_settings["stroke_color"] = defaults["stroke_color"]
-    validated_settings["stroke_width"] = max(0, min(10, validated_settings.get("stroke_width", defaults["stroke_width"])))
-    validated_settings["title_size"] = max(10, min(100, validated_settings.get("title_size", defaults["title_size"])))
-    validated_settings["subtitle_size"] = max(8, min(80, validated_settings.get("subtitle_size", defaults["subtitle_size"])))
+    for key, low, high in _SIZE_LIMITS:
+        value = validated_settings.get(key)
+        value_type = type(value)
+        # Нечисловое значение (в том числе bool) заменяется умолчанием, а не роняет сравнение
+        if value_type is int or value_type is float:
+            # value <= high, а не value > high: NaN, как и раньше с max/min, становится верхней границей
+            validated_settings[key] = low if value < low else value if value <= high else high
+        else:
+            validated_settings[key] = defaults[key]
     
     current_effects = validated_settings.get("effects")
     if not isinstance(current_effects, dict):
         validated_settings["effects"] = defaults["effects"].copy()
     else:
-        validated_effects_dict = defaults["effects"].copy()
-        validated_effects_dict["typewriter"] = bool(current_effects.get("typewriter", defaults["effects"]["typewriter"]))
-        validated_effects_dict["fade"] = bool(current_effects.get("fade", defaults["effects"]["fade"]))
-        validated_settings["effects"] = validated_effects_dict
+        default_effects = defaults["effects"]
+        validated_settings["effects"] = {
+            "typewriter": bool(current_effects.get("typewriter", default_effects["typewriter"])),
+            "fade": bool(current_effects.get("fade", default_effects["fade"])),
+        }
     
     loaded_fps = validated_settings.get("fps", defaults["fps"])
-    if not isinstance(loaded_fps, int) or loaded_fps not in [24, 30, 60]:
+    # Точная проверка типа: bool (подкласс int) как fps не принимается
+    if type(loaded_fps) is not int or loaded_fps not in _VALID_FPS:
         validated_settings["fps"] = defaults["fps"]
     
     loaded_quality = validated_settings.get("video_quality", defaults["video_quality"])
-    if not isinstance(loaded_quality, str) or loaded_quality not in ["high", "medium", "low"]:
+    if type(loaded_quality) is not str or loaded_quality not in _VALID_QUALITY:
         validated_settings["video_quality"] = defaults["video_quality"]
     
     loaded_codec = validated_settings.get("codec_name", defaults["codec_name"])
-    valid_codecs = ["libx264", "libx265"]
-    if not isinstance(loaded_codec, str) or loaded_codec.lower() not in valid_codecs:
+    low_codec = loaded_codec.lower() if type(loaded_codec) is str else None
+    if low_codec not in _VALID_CODECS:
         validated_settings["codec_name"] = defaults["codec_name"]
     else:
-        validated_settings["codec_name"] = loaded_codec.lower()
+        validated_settings["codec_name"] = low_codec
     
     loaded_audio_data = validated_settings.get("audio_tracks_info", defaults["audio_tracks_info"])
     if isinstance(loaded_audio_data, list):
-        valid_audio_tracks = []
-        for i, track_info_or_path in enumerate(loaded_audio_data):
-            if isinstance(track_info_or_path, dict) and "path" in track_info_or_path and isinstance(track_info_or_path["path"], str):
-                track_path = track_info_or_path["path"]
-                start_time = track_info_or_path.get("start_time", 0)
-                if not (isinstance(start_time, (int, float)) and start_time >=0):
-                    start_time = 0.0
-                valid_audio_tracks.append({"path": track_path, "start_time": float(start_time)})
-            elif isinstance(track_info_or_path, str):
-                valid_audio_tracks.append({"path": track_info_or_path, "start_time": 0.0})
-            else:
-                logger.warning(f"Некорректный формат элемента #{i} в 'audio_tracks_info': {track_info_or_path}.")
+        valid_audio_tracks = [
+            track for track_info_or_path in loaded_audio_data
+            if (track := _normalize_audio_track(track_info_or_path)) is not None
+        ]
+        if len(valid_audio_tracks) != len(loaded_audio_data):
+            # Номера некорректных элементов нужны только для лога - ищем их лишь при наличии ошибок
+            for i, track_info_or_path in enumerate(loaded_audio_data):
+                if _normalize_audio_track(track_info_or_path) is None:
+                    logger.warning(f"Некорректный формат элемента #{i} в 'audio_tracks_info': {track_info_or_path}.")
         validated_settings["audio_tracks_info"] = valid_audio_tracks
     else:
-        validated_settings["audio_tracks_info"] = defaults["audio_tracks_info"].copy()
+        validated_settings["audio_tracks_info"] = []
     
     return validated_settings
\ No newline at end of file
@@ -30,7 +30,7 @@ from PyQt6.QtGui import (
 
 from typing import List, Optional, Dict, Any, Tuple
 
-from logger_setup import logger
+from logger_setup import logger, install_excepthook
 
 try:
     from google_sheets_manager import GoogleSheetsManager, ProjectDataManager, get_available_themes
@@ -41,6 +41,7 @@ except ImportError as e:
 
 try:
     from text_effects_engine import create_enhanced_video, get_default_settings, validate_settings
+    from media_engine import load_waveform_amplitudes
     import template_manager
     from moviepy import AudioFileClip
 except ImportError as e:
@@ -118,7 +119,11 @@ class AudioTrackItem(QGraphicsItemGroup):
         waveform_points: список кортежей (x1, y1_top, x2, y1_bottom) для каждой вертикальной линии.
                          y1_top и y1_bottom относительно центральной линии блока.
         """
+        # Новый путь на каждый вызов: QPainterPath разделяет данные с элементом после setPath,
+        # и clear() старого пути сначала скопировал бы их целиком
         path = QPainterPath()
+        # По два элемента (moveTo + lineTo) на линию: память выделяется один раз, а не по мере роста
+        path.reserve(2 * len(waveform_points))
         center_y = self.rect_item.boundingRect().height() / 2
         for x, y_top_rel, _, y_bottom_rel in waveform_points: # x2 и y2_top пока не используем для простых линий
             path.moveTo(x, center_y - y_top_rel)
@@ -853,15 +858,9 @@ class VideoCreatorApp(QMainWindow):
             return waveform_points
 
         try:
-            waveform_sample_rate = 4000 # Например, 4kHz
+            amplitudes = load_waveform_amplitudes(audio_path)
             
-            with AudioFileClip(audio_path) as audio_clip:
-                sound_array = audio_clip.to_soundarray(fps=waveform_sample_rate)
-
-            if sound_array.ndim == 2: # Стерео -> Моно (берем среднее или один канал)
-                sound_array = sound_array.mean(axis=1)
-            
-            num_frames = len(sound_array)
+            num_frames = len(amplitudes)
             if num_frames == 0: return waveform_points
 
             # Сколько аудиокадров приходится на один горизонтальный пиксель нашего блока
@@ -872,27 +871,24 @@ class VideoCreatorApp(QMainWindow):
             drawable_height = target_item_height * 0.8 # 80% высоты трека для волны
             half_drawable_height = drawable_height / 2
 
-            for i in range(int(target_item_width)):
-                start_frame = int(i * frames_per_pixel)
-                end_frame = int((i + 1) * frames_per_pixel)
-                if start_frame >= num_frames: break
-                end_frame = min(end_frame, num_frames)
-                
-                if start_frame == end_frame: # Если сегмент пуст или слишком мал
-                    if start_frame < num_frames:
-                        peak_amplitude = abs(sound_array[start_frame])
-                    else: continue
-                else:
-                    segment = sound_array[start_frame:end_frame]
-                    peak_amplitude = np.max(np.abs(segment)) if len(segment) > 0 else 0
-                
-                # Масштабируем амплитуду к высоте отрисовки
-                # Амплитуды в sound_array обычно в диапазоне [-1.0, 1.0]
-                line_height = peak_amplitude * half_drawable_height
-                
-                # Координаты для вертикальной линии (относительно 0,0 элемента AudioTrackItem)
-                # x, y_top_relative_to_center, x, y_bottom_relative_to_center
-                waveform_points.append((float(i), line_height, float(i), line_height))
+            # Пик каждого пикселя - максимум |амплитуды| на его отрезке кадров; считаем все пиксели
+            # одним проходом maximum.reduceat вместо цикла по пикселям. Для пустого отрезка
+            # (кадров меньше, чем пикселей) reduceat берет один кадр в начале отрезка
+            pixel_indices = np.arange(int(target_item_width))
+            start_frames = (pixel_indices * frames_per_pixel).astype(np.intp)
+            pixel_indices = pixel_indices[start_frames < num_frames]
+            start_frames = start_frames[:len(pixel_indices)]
+            if len(start_frames) == 0: return waveform_points
+            last_end_frame = min(int(len(pixel_indices) * frames_per_pixel), num_frames)
+            peak_amplitudes = np.maximum.reduceat(amplitudes[:max(last_end_frame, start_frames[-1] + 1)], start_frames)
+
+            # Масштабируем амплитуду к высоте отрисовки
+            # Амплитуды аудио обычно в диапазоне [-1.0, 1.0]
+            line_heights = (peak_amplitudes.astype(np.float32) * half_drawable_height).tolist()
+
+            # Координаты для вертикальной линии (относительно 0,0 элемента AudioTrackItem)
+            # x, y_top_relative_to_center, x, y_bottom_relative_to_center
+            waveform_points = [(x, h, x, h) for x, h in zip(pixel_indices.astype(float).tolist(), line_heights)]
             
             logger.debug(f"Сгенерировано {len(waveform_points)} точек для волны '{Path(audio_path).name}'.")
 
@@ -1489,6 +1485,8 @@ class VideoCreatorApp(QMainWindow):
 
 
 def main():
+    install_excepthook(logger)
+    
     # Исправление для macOS
     if sys.platform == 'darwin':
         os.environ['QT_MAC_WANTS_LAYER'] = '1'